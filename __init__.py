@@ -4,6 +4,26 @@
 
 
 from .client import Client
+from .async_client import AsyncClient
+from .audience import Audience, AudienceError, IdSet
+from .cache import ResponseCache
+from .codec import JSONCodec, StdlibCodec, OrjsonCodec, MsgspecCodec
+from .bulk import BulkSender, BulkResult, TokenBucket
+from .health import HealthMonitor, SessionHealth
+from .media import MediaReadError
+from .metrics import Metrics
+from .models import Model, Chat, Contact, Group, Message, Participant
+from .outbox import Outbox, INTERACTIVE, TRANSACTIONAL, BULK
+from .pool import SessionPool
+from .presence import PresenceCoalescer
+from .resilience import RetryPolicy, CircuitBreaker, CircuitOpenError, DEFAULT_POLICIES
+from .stream import StreamError
+from .templates import MessageTemplate, MediaCache
+from .tokens import TokenStore
+from .sync import MessageStore, MessageSync
+from .verify import NumberVerifier, VerificationStore, normalize_number, read_numbers
+from .transport import Transport, RequestsTransport, HttpxTransport, AsyncHttpxTransport
+from .webhook import WebhookServer, WebhookEvent
 
 
 __version__ = '0.1.0'
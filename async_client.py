@@ -0,0 +1,241 @@
+# Description: asyncio version of the WPPConnect Client.
+
+import asyncio
+from copy import copy
+from .client import Client, _StreamCall
+from .resilience import is_replayable
+from .models import parse_models
+from .templates import SplicedBody
+from .transport import AsyncHttpxTransport, DEFAULT_POOL_SIZE, DEFAULT_TIMEOUT
+
+
+class AsyncClient(Client):
+    """
+    Client whose endpoint methods are awaitables.
+
+    Every method of Client is available with the same arguments, e.g.
+    ``await client.send_message(phone, "Hi")``; the ``iter_*`` methods are async
+    generators (``async for chat in client.iter_all_chats()``). Cancelling the awaiting task cancels
+    the request. Many AsyncClient instances (one per session) can share one
+    AsyncHttpxTransport, so they all run on a single connection pool.
+    """
+
+
+    def __init__(self, api_url: str, secretKey: str, session: str, transport=None, timeout=DEFAULT_TIMEOUT, pool_size=DEFAULT_POOL_SIZE, http2=False, cache=None, codec=None, metrics=None, policies=None, breaker=None, tokens=None):
+        """
+        Creates a new instance of the asyncio WPPConnect Client.
+
+        :Args:
+            - api_url (str) - URL of the WPPConnect API. Example: http://localhost:8080/api
+            - secretKey (str) - Secret key of the WPPConnect API.
+            - session (str) - Session name to use in the WPPConnect API.
+            - transport (AsyncHttpxTransport) - Shared async transport. A shared transport is not closed by the Client.
+            - timeout (float|tuple) - (connect, read) timeout in seconds of the default transport.
+            - pool_size (int) - Keep-alive connections per host of the default transport.
+            - http2 (bool) - Use HTTP/2 in the default transport (requires httpx[http2]).
+            - cache (ResponseCache) - Cache of the GET endpoints, invalidated by the write endpoints.
+            - codec (JSONCodec) - JSON codec of the requests and responses. Defaults to the fastest one installed.
+            - metrics (Metrics) - Collector of the request metrics, can be shared by many Clients.
+            - policies (dict) - RetryPolicy by endpoint name, with "GET" and "POST" keys as the defaults
+                                of each method. resilience.DEFAULT_POLICIES holds recommended ones.
+            - breaker (CircuitBreaker) - Circuit breaker of the session, or of its node when shared.
+            - tokens (TokenStore) - Store of the session tokens, shared by processes: the token is loaded on
+                                    the first request and refreshed once, with the request replayed, on HTTP 401.
+        """
+        owns_transport = transport is None
+        if owns_transport:
+            transport = AsyncHttpxTransport(pool_size=pool_size, timeout=timeout, http2=http2)
+
+        super().__init__(api_url, secretKey, session, transport=transport, cache=cache, codec=codec, metrics=metrics, policies=policies, breaker=breaker, tokens=tokens)
+        self._owns_transport = owns_transport
+        self._timeout = None
+
+
+    async def __aenter__(self):
+        return self
+
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+
+    def __enter__(self):
+        raise TypeError("Use 'async with' with AsyncClient")
+
+
+    async def close(self):
+        """
+        Close the connection pool of the transport, if it is owned by this Client.
+        """
+        if self._owns_transport:
+            await self.transport.close()
+
+
+    def with_timeout(self, timeout):
+        """
+        Returns a view of this Client that applies a per-call timeout.
+
+        The view shares the transport and headers (token) of this Client.
+        Example: ``await client.with_timeout(5).all_chats()``
+
+        :Args:
+            - timeout (float|tuple) - (connect, read) timeout in seconds.
+        """
+        view = copy(self)
+        view._owns_transport = False
+        view._timeout = timeout
+        return view
+
+
+    async def _attempt(self, endpoint, method, url, headers, data, timeout=None):
+        metrics = self.metrics
+        state = metrics.before(self, endpoint, method, url, data) if metrics is not None else None
+        if data is not None and not isinstance(data, (bytes, bytearray, str)):
+            # httpx.AsyncClient only takes async iterables as streamed content; the parts of a
+            # SplicedBody are in memory, other bodies (Base64Body) may read a file on each chunk
+            data = _aiter(data) if isinstance(data, SplicedBody) else _aiter_in_thread(data)
+        timeout = self._timeout or timeout
+
+        if state is None:
+            return await self.transport.request(method, url, headers=headers, data=data, timeout=timeout)
+        try:
+            resp = await self.transport.request(method, url, headers=headers, data=data, timeout=timeout)
+        except BaseException as e:
+            metrics.after(state, None, 0, e)
+            raise
+        metrics.after(state, resp.status_code, len(resp.content))
+        return resp
+
+
+    async def _send(self, endpoint, method, url, headers, data):
+        tokens = self.tokens
+        if tokens is None or endpoint == "generate-token":
+            return await self._deliver(endpoint, method, url, headers, data)
+
+        if "Authorization" not in self.headers:
+            self._use_token(await tokens.atoken(self))
+            headers = dict(headers, **self._auth_header())
+        resp = await self._deliver(endpoint, method, url, headers, data)
+        if not self._refreshes(resp, data):
+            return resp
+
+        if not self._use_token(await tokens.arefresh(self, self._stale_token(headers))):
+            return resp
+        return await self._deliver(endpoint, method, url, dict(headers, **self._auth_header()), data)
+
+
+    async def _deliver(self, endpoint, method, url, headers, data):
+        policy = self._delivery_policy(endpoint)
+        if policy is None:
+            return await self._attempt(endpoint, method, url, headers, data)
+
+        replayable = is_replayable(data)
+        attempt = 0
+        while True:
+            attempt += 1
+            if self.breaker is not None:
+                self._check_breaker(endpoint)
+            try:
+                if policy.hedge is not None and replayable:
+                    resp = await self.__hedged(endpoint, method, url, headers, data, policy)
+                else:
+                    resp = await self._attempt(endpoint, method, url, headers, data, policy.timeout)
+            except BaseException as e:
+                if not self._retries_error(e, attempt, policy, replayable, method, url):
+                    raise
+            else:
+                if not self._retries_response(resp, attempt, policy, replayable, method, url):
+                    return resp
+            await asyncio.sleep(policy.delay(attempt))
+
+
+    async def __hedged(self, endpoint, method, url, headers, data, policy):
+        first = asyncio.ensure_future(self._attempt(endpoint, method, url, headers, data, policy.timeout))
+        pending = {first}
+        try:
+            done, _ = await asyncio.wait(pending, timeout=policy.hedge)
+            if done:
+                return first.result()
+
+            pending.add(asyncio.ensure_future(self._attempt(endpoint, method, url, headers, data, policy.timeout)))
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None and not policy.retry_status(task.result().status_code):
+                        return task.result()
+                if not pending:
+                    return done.pop().result()
+        finally:
+            # the slower request is cancelled, or both when the caller is
+            for task in pending:
+                task.cancel()
+
+
+    async def _request_api(self, endpoint, payload=None, arg=None):
+        method, url = self._url(endpoint, arg)
+        content = self._cached(method, endpoint, url)
+        if content is not None:
+            return self.codec.loads(content)
+
+        resp = await self._send(endpoint, method, url, self.headers, self._encode_payload(method, payload))
+        return self._handle_response(method, endpoint, url, payload, resp)
+
+
+    async def _request_body(self, endpoint, body, payload=None):
+        method, url = self._endpoints[endpoint]
+        headers, body = self._body_headers(body)
+        resp = await self._send(endpoint, method, url, headers, body)
+        return self._handle_response(method, endpoint, url, payload, resp)
+
+
+    async def _request_models(self, endpoint, model, arg=None):
+        method, url = self._url(endpoint, arg)
+        content = self._cached(method, endpoint, url)
+        if content is None:
+            resp = await self._send(endpoint, method, url, self.headers, None)
+            content = self._cache_response(method, endpoint, url, resp)
+        return parse_models(content, model, self.codec)
+
+
+    async def _stream_api(self, endpoint, payload=None, arg=None, model=None):
+        method, url = self._url(endpoint, arg)
+        tokens = self.tokens
+        if tokens is not None and "Authorization" not in self.headers:
+            self._use_token(await tokens.atoken(self))
+
+        data = self._encode_payload(method, payload)
+        call = _StreamCall(self, endpoint, method, url, data, model)
+        try:
+            async with self.transport.stream(method, url, headers=self.headers, data=data, timeout=self._timeout or self._stream_timeout(endpoint)) as (status, chunks):
+                if call.opened(status):
+                    self._use_token(await tokens.arefresh(self, self._stale_token(self.headers)))
+                async for chunk in chunks:
+                    for item in call.feed(chunk):
+                        yield item
+            for item in call.close():
+                yield item
+        except GeneratorExit:
+            raise
+        except BaseException as e:
+            call.failed(e)
+            raise
+        finally:
+            call.finished()
+
+
+_END = object()
+
+
+async def _aiter(iterable):
+    for chunk in iterable:
+        yield chunk
+
+
+async def _aiter_in_thread(iterable):
+    # each chunk is read in a thread, off the event loop
+    iterator = iter(iterable)
+    while True:
+        chunk = await asyncio.to_thread(next, iterator, _END)
+        if chunk is _END:
+            return
+        yield chunk
@@ -0,0 +1,439 @@
+# Description: Resolves audiences (unions, intersections and exclusions of groups, broadcast lists,
+#              contacts and the blocklist) into compact sets of recipients.
+
+import asyncio
+from array import array
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from heapq import merge
+from sys import intern
+from .async_client import AsyncClient
+from .bulk import BulkSender
+from .utils import serialized_id, is_success
+
+
+# Servers of the ids that are plain phone numbers, stored as integers.
+PHONE_SERVERS = ("c.us", "s.whatsapp.net")
+# Sets up to this size are turned into a hash set for intersections and exclusions; larger
+# ones are merged as sorted arrays, which needs no memory beyond the result.
+SMALL_SET = 65536
+
+
+class AudienceError(Exception):
+    """
+    Raised when a source of an audience cannot be fetched. An audience is never resolved
+    from partial data: a failed blocklist must not turn into an empty exclusion.
+    """
+
+
+    def __init__(self, message, response=None):
+        super().__init__(message)
+        self.response = response
+
+
+def encode_id(value):
+    """
+    :Returns:
+        - The phone number of a contact id as an int (e.g. "5511999999999@c.us" -> 5511999999999),
+          or the interned serialized id for the others (e.g. "...@lid").
+    """
+    serialized = serialized_id(value)
+    if not isinstance(serialized, str):
+        serialized = str(serialized)
+    user, _, server = serialized.partition("@")
+    if user.isdigit() and (not server or server in PHONE_SERVERS):
+        return int(user)
+    return intern(serialized)
+
+
+class IdSet:
+
+
+    def __init__(self, numbers=None, others=frozenset()):
+        """
+        Immutable set of recipients: phone numbers in a sorted array of unsigned 64-bit
+        integers (8 bytes each, a million recipients fit in 8 MB) and the few ids that
+        are not phone numbers in a frozenset.
+
+        Iterating yields the recipients in the form the send methods take: the phone
+        number as a string, or the serialized id.
+
+        :Args:
+            - numbers (array) - Sorted, deduplicated array('Q').
+            - others (frozenset) - Serialized ids that are not phone numbers.
+        """
+        self.numbers = numbers if numbers is not None else array("Q")
+        self.others = others
+
+
+    @classmethod
+    def from_ids(cls, ids):
+        """
+        Builds an IdSet from ids in any form: "5511...@c.us", "5511...", {"_serialized": ...} or ints.
+        """
+        numbers = []
+        others = set()
+        for value in ids:
+            value = value if isinstance(value, int) else encode_id(value)
+            if isinstance(value, int):
+                numbers.append(value)
+            else:
+                others.add(value)
+        numbers.sort()
+        return cls(array("Q", _unique(numbers)), frozenset(others))
+
+
+    def __len__(self):
+        return len(self.numbers) + len(self.others)
+
+
+    def __iter__(self):
+        for number in self.numbers:
+            yield str(number)
+        yield from self.others
+
+
+    def __contains__(self, value):
+        value = value if isinstance(value, int) else encode_id(value)
+        if isinstance(value, int):
+            return _contains(self.numbers, value)
+        return value in self.others
+
+
+    def __or__(self, other):
+        return IdSet.union(self, other)
+
+
+    def __and__(self, other):
+        small, large = (self.numbers, other.numbers) if len(self.numbers) <= len(other.numbers) else (other.numbers, self.numbers)
+        if len(small) <= SMALL_SET:
+            # scan the large set once against a hash set of the small one
+            lookup = frozenset(small).__contains__
+            numbers = array("Q", (number for number in large if lookup(number)))
+        else:
+            numbers = array("Q", _common(small, large))
+        return IdSet(numbers, self.others & other.others)
+
+
+    def __sub__(self, other):
+        if len(other.numbers) <= SMALL_SET:
+            lookup = frozenset(other.numbers).__contains__
+            numbers = array("Q", (number for number in self.numbers if not lookup(number)))
+        else:
+            # the numbers seen once when merging with the common ones are only in self
+            numbers = array("Q", _singles(merge(self.numbers, array("Q", _common(self.numbers, other.numbers)))))
+        return IdSet(numbers, self.others - other.others)
+
+
+    @staticmethod
+    def union(*sets):
+        """
+        Union of any number of IdSet, merged in one pass without an intermediate set.
+        """
+        numbers = array("Q", _unique(merge(*(s.numbers for s in sets))))
+        return IdSet(numbers, frozenset().union(*(s.others for s in sets)))
+
+
+    def nbytes(self):
+        """
+        :Returns:
+            - Approximate memory used by the numbers, in bytes.
+        """
+        return self.numbers.itemsize * len(self.numbers)
+
+
+def _unique(sorted_values):
+    last = None
+    for value in sorted_values:
+        if value != last:
+            yield value
+            last = value
+
+
+def _common(a, b):
+    # both arrays are deduplicated, so a value seen twice in a row is in both
+    last = None
+    for value in merge(a, b):
+        if value == last:
+            yield value
+        last = value
+
+
+def _singles(sorted_values):
+    last, count = None, 0
+    for value in sorted_values:
+        if value == last:
+            count += 1
+        else:
+            if count == 1:
+                yield last
+            last, count = value, 1
+    if count == 1:
+        yield last
+
+
+def _contains(numbers, value):
+    index = bisect_left(numbers, value)
+    return index < len(numbers) and numbers[index] == value
+
+
+class Expression:
+    """
+    Audience expression, combined with ``|`` (union), ``&`` (intersection) and ``-`` (exclusion).
+    """
+
+
+    def __or__(self, other):
+        return Operation("|", self, other)
+
+
+    def __and__(self, other):
+        return Operation("&", self, other)
+
+
+    def __sub__(self, other):
+        return Operation("-", self, other)
+
+
+    def sources(self):
+        raise NotImplementedError
+
+
+    def evaluate(self, resolved):
+        raise NotImplementedError
+
+
+class Operation(Expression):
+
+
+    def __init__(self, operator, left, right):
+        self.operator = operator
+        self.left = left
+        self.right = right
+
+
+    def sources(self):
+        return self.left.sources() + self.right.sources()
+
+
+    def evaluate(self, resolved):
+        left, right = self.left.evaluate(resolved), self.right.evaluate(resolved)
+        if self.operator == "|":
+            return left | right
+        if self.operator == "&":
+            return left & right
+        return left - right
+
+
+    def __repr__(self):
+        return "(%r %s %r)" % (self.left, self.operator, self.right)
+
+
+class Source(Expression):
+
+
+    def __init__(self, kind, arg=None, request=None, ids=None):
+        """
+        Leaf of an expression. ``request`` is the (Client method, argument) fetched for it;
+        sources sharing a request (e.g. two broadcast lists) are fetched once.
+        """
+        self.kind = kind
+        self.arg = arg
+        self.request = request
+        self.ids = ids
+
+
+    def sources(self):
+        return [self]
+
+
+    def evaluate(self, resolved):
+        return resolved[self]
+
+
+    def extract(self, response):
+        """
+        :Returns:
+            - The ids of the source in the response of its request.
+        """
+        if not is_success(response):
+            raise AudienceError("Cannot fetch the %s %s" % (self.kind, self.arg or ""), response)
+        items = response.get("response") if isinstance(response, dict) else response
+        if not isinstance(items, list):
+            raise AudienceError("Unexpected response for the %s %s" % (self.kind, self.arg or ""), response)
+
+        if self.kind == "contacts":
+            return (item.get("id") for item in items if item.get("isMyContact", True) and not item.get("isGroup"))
+        if self.kind == "broadcast":
+            ids = []
+            for item in items:
+                if self.arg is None or serialized_id(item.get("id")) == self.arg:
+                    ids.extend(_members(item))
+            return ids
+        # group members and blocklist: lists of ids
+        return items
+
+
+    def __hash__(self):
+        return id(self)
+
+
+    def __repr__(self):
+        return "%s(%s)" % (self.kind, self.arg or "")
+
+
+def _members(item):
+    for key in ("recipients", "participants", "members"):
+        members = item.get(key)
+        if isinstance(members, list):
+            return [member.get("id", member) if isinstance(member, dict) and "id" in member else member for member in members]
+    return []
+
+
+class Audience:
+
+
+    def __init__(self, client, concurrency=8):
+        """
+        Builds and resolves audiences of a session.
+
+        Example::
+
+            audience = Audience(client)
+            everyone = audience.groups(a, b, c) - audience.blocklist()
+            for result in audience.send(everyone, "send_message", message="Hi"):
+                ...
+
+        Sources are fetched concurrently, once each, and every response is reduced to an
+        IdSet as soon as it arrives, so no list of dicts outlives its response.
+
+        :Args:
+            - client (Client|AsyncClient) - Client of the session. With an AsyncClient, use
+              ``aresolve`` and ``asend``.
+            - concurrency (int) - Sources fetched at the same time.
+        """
+        self.client = client
+        self.concurrency = concurrency
+
+
+    @staticmethod
+    def group(group_id):
+        return Source("group", group_id, ("group_members_ids", group_id))
+
+
+    def groups(self, *group_ids):
+        """
+        Union of the members of the groups.
+        """
+        expression = self.group(group_ids[0])
+        for group_id in group_ids[1:]:
+            expression = expression | self.group(group_id)
+        return expression
+
+
+    @staticmethod
+    def broadcast_list(list_id=None):
+        """
+        Recipients of a broadcast list, or of every broadcast list when list_id is None.
+        """
+        return Source("broadcast", list_id, ("all_broadcast_list", None))
+
+
+    @staticmethod
+    def contacts():
+        """
+        Saved contacts of the session.
+        """
+        return Source("contacts", None, ("all_contacts", None))
+
+
+    @staticmethod
+    def blocklist():
+        return Source("blocklist", None, ("blocklist", None))
+
+
+    @staticmethod
+    def ids(ids):
+        """
+        Literal recipients, e.g. numbers read from a file.
+        """
+        return Source("ids", None, ids=IdSet.from_ids(ids))
+
+
+    def resolve(self, expression) -> IdSet:
+        """
+        Fetch the sources of the expression with the Client and compute its recipients.
+        """
+        resolved, requests = self.__plan(expression)
+        if requests:
+            with ThreadPoolExecutor(max_workers=min(self.concurrency, len(requests))) as executor:
+                futures = {executor.submit(self.__call, request): request for request in requests}
+                for future in as_completed(futures):
+                    self.__reduce(requests[futures[future]], future.result(), resolved)
+        return expression.evaluate(resolved)
+
+
+    async def aresolve(self, expression) -> IdSet:
+        """
+        asyncio version of ``resolve`` for AsyncClient.
+        """
+        resolved, requests = self.__plan(expression)
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def fetch(request):
+            async with semaphore:
+                response = await self.__call(request)
+            self.__reduce(requests[request], response, resolved)
+
+        await asyncio.gather(*(fetch(request) for request in requests))
+        return expression.evaluate(resolved)
+
+
+    def send(self, expression, method, concurrency=8, rate=None, **kwargs):
+        """
+        Resolve the expression and send to every recipient with a BulkSender.
+
+        :Returns:
+            - Generator of BulkResult, in completion order.
+        """
+        if isinstance(self.client, AsyncClient):
+            raise TypeError("Use Audience.asend with an AsyncClient")
+        return BulkSender(self.client, concurrency, rate).send(method, self.resolve(expression), **kwargs)
+
+
+    async def asend(self, expression, method, concurrency=8, rate=None, **kwargs):
+        """
+        asyncio version of ``send`` for AsyncClient.
+
+        :Returns:
+            - Async generator of BulkResult, in completion order.
+        """
+        recipients = await self.aresolve(expression)
+        async for result in BulkSender(self.client, concurrency, rate).asend(method, recipients, **kwargs):
+            yield result
+
+
+    @staticmethod
+    def __plan(expression):
+        # literal sources are resolved already, the others are grouped by request
+        resolved = {}
+        requests = {}
+        for source in expression.sources():
+            if source.ids is not None:
+                resolved[source] = source.ids
+            else:
+                requests.setdefault(source.request, []).append(source)
+        return resolved, requests
+
+
+    def __call(self, request):
+        method, arg = request
+        func = getattr(self.client, method)
+        return func(arg) if arg is not None else func()
+
+
+    @staticmethod
+    def __reduce(sources, response, resolved):
+        # the response (a list of dicts) is dropped as soon as its sources are reduced
+        for source in sources:
+            resolved[source] = IdSet.from_ids(source.extract(response))
@@ -0,0 +1,2 @@
+# Description: Benchmarks of the WPPConnect Client. Run them as modules of the package,
+#              e.g. python -m wppconnect.benchmarks.dispatch from the parent directory.
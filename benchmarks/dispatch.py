@@ -0,0 +1,64 @@
+# Description: Microbenchmark of the per-call overhead of the endpoint dispatch.
+
+from timeit import repeat
+from ..client import Client, ENDPOINTS
+from ..transport import Transport
+
+
+class NullResponse:
+    status_code = 200
+    content = b'{"status":"success","response":true}'
+
+
+class NullTransport(Transport):
+    """
+    Answers every request in-process, so only the Client overhead is measured.
+    """
+
+
+    def request(self, method, url, headers=None, data=None, timeout=None):
+        return NullResponse
+
+
+def legacy_url(client, name, arg=None):
+    """
+    URL building of the Client before the endpoints were compiled: one concatenation
+    and two ENDPOINTS lookups per call.
+    """
+    url = client.api["URL"] + "/" + client.session + "/" + ENDPOINTS[name]["url"]
+    if arg is not None:
+        url = url % arg
+    return ENDPOINTS[name]["method"], url
+
+
+def compiled_url(client, name, arg=None):
+    method, url = client._endpoints[name]
+    if arg is not None:
+        url = url % (arg,)
+    return method, url
+
+
+def best(stmt, number):
+    return min(repeat(stmt, number=number, repeat=5)) / number * 1e9
+
+
+def main(number=200000):
+    client = Client("http://localhost:21465/api", "secret", "benchmark", transport=NullTransport())
+    phone = "5511999999999@c.us"
+
+    rows = [
+        ("url: legacy send-message", best(lambda: legacy_url(client, "send-message"), number)),
+        ("url: compiled send-message", best(lambda: compiled_url(client, "send-message"), number)),
+        ("url: legacy chat-by-id", best(lambda: legacy_url(client, "chat-by-id", phone), number)),
+        ("url: compiled chat-by-id", best(lambda: compiled_url(client, "chat-by-id", phone), number)),
+        ("call: send_message", best(lambda: client.send_message(phone, "Hello"), number // 4)),
+        ("call: chat_by_id", best(lambda: client.chat_by_id(phone), number // 4)),
+        ("call: status_session", best(client.status_session, number // 4)),
+    ]
+
+    for name, ns in rows:
+        print("%-32s %8.0f ns/call" % (name, ns))
+
+
+if __name__ == "__main__":
+    main()
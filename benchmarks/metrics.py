@@ -0,0 +1,26 @@
+# Description: Overhead of the request metrics, measured on in-process calls.
+
+from ..client import Client
+from ..metrics import Metrics
+from .dispatch import NullTransport, best
+
+
+def main(number=50000):
+    phone = "5511999999999@c.us"
+    plain = Client("http://localhost:21465/api", "secret", "benchmark", transport=NullTransport())
+    metrics = Metrics()
+    instrumented = Client("http://localhost:21465/api", "secret", "benchmark", transport=NullTransport(), metrics=metrics)
+    traced = Client("http://localhost:21465/api", "secret", "benchmark", transport=NullTransport(), metrics=Metrics())
+    traced.metrics.add_hook(before=lambda event: None, after=lambda event: None)
+
+    for name, client in (("without metrics", plain), ("with metrics", instrumented), ("with metrics and hooks", traced)):
+        ns = best(lambda: client.send_message(phone, "Hello"), number)
+        print("send_message %-24s %8.0f ns/call" % (name, ns))
+
+    lines = metrics.render().count("\n")
+    ns = best(metrics.render, 100)
+    print("render (%d lines) %22.0f ns" % (lines, ns))
+
+
+if __name__ == "__main__":
+    main()
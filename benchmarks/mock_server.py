@@ -0,0 +1,249 @@
+# Description: Local stand-in for WPPConnect server, implementing the routes of ENDPOINTS
+#              with configurable latency, payload sizes and error rate.
+
+import json
+import re
+from argparse import ArgumentParser
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from random import Random
+from threading import Thread, Lock
+from time import sleep
+from ..client import ENDPOINTS
+
+
+def compile_routes():
+    """
+    :Returns:
+        - List of (regex, endpoint name, HTTP method) matching the paths of ENDPOINTS.
+    """
+    routes = []
+    for name, endpoint in ENDPOINTS.items():
+        if name == "generate-token":
+            pattern = r"/(?P<session>[^/]+)/[^/]+/generate-token"
+        else:
+            pattern = r"/(?P<session>[^/]+)/" + re.escape(endpoint["url"]).replace(re.escape("%s"), r"(?P<arg>[^/]+)")
+        routes.append((re.compile(pattern + "$"), name, endpoint["method"]))
+    return routes
+
+
+def fake_chat(i):
+    return {
+        "id": {"server": "c.us", "user": "5511%09d" % i, "_serialized": "5511%09d@c.us" % i},
+        "name": "Contact %d" % i,
+        "t": 1650000000 + i,
+        "unreadCount": i % 5,
+        "isGroup": False,
+        "archive": False,
+        "pin": 0,
+        "muteExpiration": 0,
+    }
+
+
+def fake_message(i, size):
+    return {
+        "id": "true_5511999999999@c.us_3EB0%016X" % i,
+        "body": "x" * size,
+        "type": "chat",
+        "t": 1650000000 + i,
+        "from": "5511999999999@c.us",
+        "to": "5511888888888@c.us",
+        "ack": 1,
+    }
+
+
+def fake_participant(i):
+    return {"id": {"server": "c.us", "user": "5521%09d" % i, "_serialized": "5521%09d@c.us" % i}, "isAdmin": i == 0, "isSuperAdmin": i == 0}
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    # read by server_activate() when the server is created: a backlog of 5 overflows under the concurrent benchmarks
+    request_queue_size = 1024
+    daemon_threads = True
+
+
+class MockServer:
+
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, jitter=0.0, error_rate=0.0, chats=1000, messages=1000, message_size=64, members=256, seed=0):
+        """
+        Threaded HTTP/1.1 keep-alive server answering every route of ENDPOINTS with
+        WPPConnect-shaped responses. Large listings are encoded once and reused.
+
+        :Args:
+            - host (str) - Address to listen on.
+            - port (int) - Port to listen on, 0 for a free one.
+            - latency (float) - Seconds added to every response.
+            - jitter (float) - Random extra seconds, uniform in [0, jitter].
+            - error_rate (float) - Fraction of the requests answered with HTTP 500.
+            - chats (int) - Chats returned by all-chats and all-chats-with-messages.
+            - messages (int) - Messages returned by all-messages-in-chat and the unread endpoints.
+            - message_size (int) - Length of the body of every message.
+            - members (int) - Participants returned by the group endpoints.
+            - seed (int) - Seed of the latency and error randomness.
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.routes = compile_routes()
+        self.random = Random(seed)
+        self.random_lock = Lock()
+        self.requests = 0
+
+        chat_list = [fake_chat(i) for i in range(chats)]
+        message_list = [fake_message(i, message_size) for i in range(messages)]
+        member_list = [fake_participant(i) for i in range(members)]
+        self.bodies = {
+            "all-chats": self.encode(chat_list),
+            "all-chats-with-messages": self.encode([dict(chat, msgs=message_list[:10]) for chat in chat_list]),
+            "all-messages-in-chat": self.encode(message_list),
+            "all-unread-messages": self.encode(message_list),
+            "unread-messages": self.encode(message_list),
+            "all-new-messages": self.encode(message_list[:10]),
+            "all-contacts": self.encode(chat_list),
+            "all-groups": self.encode([dict(fake_chat(i), isGroup=True) for i in range(min(chats, 1000))]),
+            "group-members": self.encode(member_list),
+            "group-members-ids": self.encode([member["id"] for member in member_list]),
+            "group-admins": self.encode([member_list[0]["id"]] if member_list else []),
+            "blocklist": self.encode([]),
+            "check-number-status": self.encode({"numberExists": True, "canReceiveMessage": True}),
+            "status-session": json.dumps({"status": "CONNECTED", "qrcode": None}).encode(),
+            "generate-token": json.dumps({"status": "success", "session": "mock", "token": "mock-token", "full": "mock:mock-token"}).encode(),
+        }
+        self.sent = self.encode([{"id": "true_5511999999999@c.us_3EB0MOCK", "ack": 0}])
+        self.default = self.encode(True)
+
+        self.server = _HTTPServer((host, port), self.__handler())
+        self.thread = None
+
+
+    @staticmethod
+    def encode(response):
+        return json.dumps({"status": "success", "response": response}, separators=(",", ":")).encode()
+
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return "http://%s:%d/api" % (host, port)
+
+
+    def start(self):
+        self.thread = Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+    def __enter__(self):
+        return self.start()
+
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+    def respond(self, method, path):
+        """
+        :Returns:
+            - (status, body) of a request.
+        """
+        self.requests += 1
+        if path.startswith("/api"):
+            path = path[4:]
+        path = path.split("?", 1)[0]
+
+        for regex, name, route_method in self.routes:
+            if regex.match(path):
+                break
+        else:
+            return 404, b'{"status":"error","message":"Not found"}'
+        if method != route_method:
+            return 404, b'{"status":"error","message":"Not found"}'
+
+        with self.random_lock:
+            delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0)
+            failed = self.error_rate and self.random.random() < self.error_rate
+        if delay:
+            sleep(delay)
+        if failed:
+            return 500, b'{"status":"error","message":"Mock error"}'
+
+        if name in self.bodies:
+            return 200, self.bodies[name]
+        if name.startswith("send-") or name in ("forwardMessages", "contact-vcard"):
+            return 201, self.sent
+        return 200, self.default
+
+
+    def __handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # headers and body are separate writes; with Nagle every response would wait for a delayed ACK
+            disable_nagle_algorithm = True
+
+            def read_body(self):
+                if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+                    while True:
+                        size = int(self.rfile.readline().split(b";", 1)[0], 16)
+                        if not size:
+                            self.rfile.readline()
+                            break
+                        # the body is discarded chunk by chunk, large uploads are not buffered
+                        while size:
+                            size -= len(self.rfile.read(min(size, 1 << 20)))
+                        self.rfile.readline()
+                else:
+                    length = int(self.headers.get("Content-Length") or 0)
+                    while length:
+                        length -= len(self.rfile.read(min(length, 1 << 20)))
+
+            def reply(self):
+                self.read_body()
+                status, body = mock.respond(self.command, self.path)
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                try:
+                    self.wfile.write(body)
+                except ConnectionError:
+                    # the client gave up on the request, e.g. the loser of a hedged pair
+                    self.close_connection = True
+
+            do_GET = do_POST = reply
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = ArgumentParser(description="Local stand-in for WPPConnect server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=21465)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--chats", type=int, default=1000)
+    parser.add_argument("--messages", type=int, default=1000)
+    parser.add_argument("--message-size", type=int, default=64)
+    parser.add_argument("--members", type=int, default=256)
+    args = parser.parse_args()
+
+    server = MockServer(args.host, args.port, args.latency, args.jitter, args.error_rate, args.chats, args.messages, args.message_size, args.members)
+    print("Mock WPPConnect server on %s" % server.url)
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
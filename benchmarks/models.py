@@ -0,0 +1,96 @@
+# Description: Memory and access time of the lazy result models compared with dict results.
+
+import gc
+import json
+import tracemalloc
+from argparse import ArgumentParser
+from time import perf_counter
+from ..codec import default_codec
+from ..models import Chat, parse_models
+from .mock_server import fake_chat
+
+
+def full_chat(i):
+    """
+    A chat shaped like the ones of WPPConnect server, with the nested contact and message key.
+    """
+    chat = fake_chat(i)
+    chat.update({
+        "kind": "chat",
+        "isReadOnly": False,
+        "modifyTag": 0,
+        "notSpam": True,
+        "ephemeralDuration": 0,
+        "lastReceivedKey": {"fromMe": False, "remote": chat["id"]["_serialized"], "id": "3EB0%016X" % i, "_serialized": "false_%s_3EB0%016X" % (chat["id"]["_serialized"], i)},
+        "contact": {
+            "id": chat["id"],
+            "name": chat["name"],
+            "pushname": "Push %d" % i,
+            "type": "in",
+            "isBusiness": False,
+            "isEnterprise": False,
+            "isMe": False,
+            "isMyContact": True,
+            "isPSA": False,
+            "isUser": True,
+            "isWAContact": True,
+            "profilePicThumbObj": {"eurl": "https://pps.whatsapp.net/v/t61/%d.jpg" % i, "id": chat["id"], "tag": str(i)},
+            "msgs": None,
+        },
+        "presence": {"id": chat["id"], "chatstates": []},
+    })
+    return chat
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    started = perf_counter()
+    result = build()
+    elapsed = perf_counter() - started
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, elapsed, size
+
+
+def timed(call):
+    started = perf_counter()
+    call()
+    return perf_counter() - started
+
+
+def main():
+    parser = ArgumentParser(description="Lazy models compared with dict results.")
+    parser.add_argument("--chats", type=int, default=100000)
+    args = parser.parse_args()
+
+    codec = default_codec()
+    body = json.dumps({"status": "success", "response": [full_chat(i) for i in range(args.chats)]}).encode()
+    print("%d chats, %.1f MB of JSON, codec %s" % (args.chats, len(body) / 1e6, codec.name))
+
+    dicts, dicts_time, dicts_size = measure(lambda: codec.loads(body)["response"])
+    del dicts
+    models, models_time, models_size = measure(lambda: parse_models(body, Chat)["response"])
+    del models
+    print("%-28s %10s %12s" % ("", "seconds", "MB retained"))
+    print("%-28s %10.3f %12.1f" % ("decode as dicts", dicts_time, dicts_size / 1e6))
+    print("%-28s %10.3f %12.1f" % ("split as Chat models", models_time, models_size / 1e6))
+
+    dicts = codec.loads(body)["response"]
+    models = parse_models(body, Chat)["response"]
+    print("%-28s %10.3f" % ("dicts: read id and name", timed(lambda: [(chat["id"]["_serialized"], chat["name"]) for chat in dicts])))
+    print("%-28s %10.3f" % ("models: first read", timed(lambda: [(chat.id, chat.name) for chat in models])))
+    print("%-28s %10.3f" % ("models: next reads", timed(lambda: [(chat.id, chat.name) for chat in models])))
+
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    models = parse_models(body, Chat)["response"]
+    for chat in models:
+        chat.id
+    print("%-28s %10s %12.1f" % ("models after reading", "", (tracemalloc.get_traced_memory()[0] - baseline) / 1e6))
+    tracemalloc.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+# Description: Throughput, latency and memory benchmarks of the Client against the mock server.
+#
+# Usage (from the directory containing the package):
+#     python -m wppconnect.benchmarks.run --output results.json
+#     python -m wppconnect.benchmarks.run --compare results.json
+#
+# The mock server runs in-process by default; start it separately with
+# python -m wppconnect.benchmarks.mock_server and pass --url for numbers free of its CPU use.
+
+import asyncio
+import json
+import os
+import platform
+import sys
+import tempfile
+import tracemalloc
+from argparse import ArgumentParser
+from base64 import b64encode
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter, time
+from .. import __version__
+from ..async_client import AsyncClient
+from ..client import Client
+from ..templates import MessageTemplate
+from .mock_server import MockServer
+
+
+PHONE = "5511999999999"
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def timed(call):
+    started = perf_counter()
+    try:
+        result = call()
+    except Exception as e:
+        # counted as an error, the run goes on
+        result = e
+    return perf_counter() - started, result
+
+
+def summarize(name, mode, latencies, elapsed, errors, peak):
+    return {
+        "name": name,
+        "mode": mode,
+        "calls": len(latencies),
+        "seconds": elapsed,
+        "calls_per_sec": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "errors": errors,
+        "peak_bytes": peak,
+    }
+
+
+def is_error(result):
+    return result is False or isinstance(result, Exception) or (isinstance(result, dict) and result.get("status") == "error")
+
+
+def peak_memory(call):
+    """
+    Runs the call once under tracemalloc and returns the peak of Python allocations in bytes.
+    """
+    tracemalloc.start()
+    try:
+        timed(call)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_sequential(name, call, calls):
+    latencies, errors = [], 0
+    started = perf_counter()
+    for _ in range(calls):
+        latency, result = timed(call)
+        latencies.append(latency)
+        errors += is_error(result)
+    return summarize(name, "sequential", latencies, perf_counter() - started, errors, peak_memory(call))
+
+
+def run_threaded(name, call, calls, concurrency):
+    started = perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda _: timed(call), range(calls)))
+    elapsed = perf_counter() - started
+    latencies = [latency for latency, _ in results]
+    errors = sum(is_error(result) for _, result in results)
+    return summarize(name, "threaded-%d" % concurrency, latencies, elapsed, errors, peak_memory(call))
+
+
+def run_async(name, url, method, args, calls, concurrency):
+    async def main():
+        async with AsyncClient(url, "secret", "benchmark", pool_size=concurrency) as client:
+            semaphore = asyncio.Semaphore(concurrency)
+            call = getattr(client, method)
+
+            async def one():
+                async with semaphore:
+                    started = perf_counter()
+                    try:
+                        result = await call(*args)
+                    except Exception as e:
+                        result = e
+                    return perf_counter() - started, result
+
+            started = perf_counter()
+            results = await asyncio.gather(*(one() for _ in range(calls)))
+            return results, perf_counter() - started
+
+    results, elapsed = asyncio.run(main())
+    latencies = [latency for latency, _ in results]
+    errors = sum(is_error(result) for _, result in results)
+    return summarize(name, "async-%d" % concurrency, latencies, elapsed, errors, None)
+
+
+def scenarios(args, url, media_path):
+    client = Client(url, "secret", "benchmark", pool_size=args.concurrency)
+    media_base64 = "data:video/mp4;base64," + b64encode(os.urandom(args.media_size)).decode()
+    calls, big = args.calls, max(1, args.calls // 50)
+
+    yield run_sequential("send_message", lambda: client.send_message(PHONE, "Hello"), calls)
+    yield run_threaded("send_message", lambda: client.send_message(PHONE, "Hello"), calls, args.concurrency)
+    yield run_async("send_message", url, "send_message", (PHONE, "Hello"), calls, args.concurrency)
+
+    yield run_sequential("group_members", lambda: client.group_members("123456789@g.us"), calls)
+    yield run_threaded("group_members", lambda: client.group_members("123456789@g.us"), calls, args.concurrency)
+
+    yield run_sequential("send_file_base64", lambda: client.send_file_base64(PHONE, media_base64, "media"), big)
+    yield run_sequential("send_file", lambda: client.send_file(PHONE, media_path, message="media"), big)
+    template = MessageTemplate.file(media_path, "media")
+    yield run_sequential("send_template", lambda: client.send_template(PHONE, template), big)
+
+    yield run_sequential("all_chats", client.all_chats, max(1, big // 2))
+    yield run_sequential("iter_all_chats", lambda: sum(1 for _ in client.iter_all_chats()), max(1, big // 2))
+
+    client.close()
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = {(row["name"], row["mode"]): row for row in json.load(f)["results"]}
+
+    print("\n%-20s %-12s %12s %12s %12s" % ("benchmark", "mode", "calls/s", "p99 ms", "peak"))
+    for row in results:
+        old = baseline.get((row["name"], row["mode"]))
+        if old is None:
+            continue
+
+        def delta(key):
+            if not old.get(key) or row.get(key) is None:
+                return "n/a"
+            return "%+.1f%%" % ((row[key] - old[key]) / old[key] * 100)
+
+        print("%-20s %-12s %12s %12s %12s" % (row["name"], row["mode"], delta("calls_per_sec"), delta("p99_ms"), delta("peak_bytes")))
+
+
+def main():
+    parser = ArgumentParser(description="Benchmarks of the WPPConnect Client.")
+    parser.add_argument("--url", help="URL of a running mock server. Default: start one in-process.")
+    parser.add_argument("--calls", type=int, default=2000, help="Calls of the small benchmarks.")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.0, help="Latency of the in-process mock server.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Error rate of the in-process mock server.")
+    parser.add_argument("--chats", type=int, default=100000, help="Chats returned by all-chats.")
+    parser.add_argument("--members", type=int, default=256, help="Participants returned by group-members.")
+    parser.add_argument("--media-size", type=int, default=16 * 1024 * 1024, help="Bytes of the media sent by send_file_base64/send_file.")
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    parser.add_argument("--compare", help="Compare with the results of a previous --output file.")
+    args = parser.parse_args()
+
+    server = None
+    url = args.url
+    if url is None:
+        server = MockServer(latency=args.latency, error_rate=args.error_rate, chats=args.chats, members=args.members).start()
+        url = server.url
+
+    media = tempfile.NamedTemporaryFile(suffix=".mp4", delete=False)
+    try:
+        media.write(os.urandom(args.media_size))
+        media.close()
+
+        results = []
+        print("%-20s %-12s %8s %12s %10s %10s %12s %7s" % ("benchmark", "mode", "calls", "calls/s", "p50 ms", "p99 ms", "peak bytes", "errors"))
+        for row in scenarios(args, url, media.name):
+            results.append(row)
+            print("%-20s %-12s %8d %12.1f %10.2f %10.2f %12s %7d" % (
+                row["name"], row["mode"], row["calls"], row["calls_per_sec"], row["p50_ms"], row["p99_ms"],
+                row["peak_bytes"] if row["peak_bytes"] is not None else "-", row["errors"],
+            ))
+        errors = sum(row["errors"] for row in results)
+        if errors:
+            print("\n%d calls failed (error responses and exceptions), see the errors column" % errors)
+    finally:
+        os.unlink(media.name)
+        if server is not None:
+            server.stop()
+
+    report = {
+        "version": __version__,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "timestamp": time(),
+        "config": vars(args),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+# Description: Bulk sending with bounded concurrency and per-session rate limiting.
+
+import asyncio
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from threading import Lock
+from time import monotonic, sleep
+from .utils import is_success
+
+
+BulkResult = namedtuple("BulkResult", ["recipient", "ok", "response", "error"])
+
+
+class TokenBucket:
+
+
+    def __init__(self, rate: float, burst: float = None):
+        """
+        Thread-safe token bucket.
+
+        Tokens are reserved in order, so callers are served first come, first served
+        and the long-term rate never exceeds ``rate``.
+
+        :Args:
+            - rate (float) - Tokens added per second.
+            - burst (float) - Bucket capacity. Defaults to ``rate`` (one second of burst).
+        """
+        self.rate = float(rate)
+        self.capacity = float(burst if burst is not None else max(rate, 1))
+        self.tokens = self.capacity
+        self.updated = monotonic()
+        self.lock = Lock()
+
+
+    def reserve(self, tokens=1):
+        """
+        Reserves tokens and returns how many seconds the caller must wait before using them.
+        """
+        with self.lock:
+            now = monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= tokens
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+
+    def set_rate(self, rate: float, burst: float = None):
+        """
+        Changes the rate (and capacity) in place, keeping the tokens already earned or reserved.
+        """
+        with self.lock:
+            now = monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.rate = float(rate)
+            self.capacity = float(burst if burst is not None else max(rate, 1))
+            self.tokens = min(self.tokens, self.capacity)
+
+
+    def acquire(self, tokens=1):
+        delay = self.reserve(tokens)
+        if delay:
+            sleep(delay)
+
+
+    async def acquire_async(self, tokens=1):
+        delay = self.reserve(tokens)
+        if delay:
+            await asyncio.sleep(delay)
+
+
+_buckets = {}
+_buckets_lock = Lock()
+
+
+def session_bucket(client, rate, burst=None):
+    """
+    Returns the token bucket of the client's session, shared by every BulkSender,
+    NumberVerifier and Outbox worker of this process. A session has a single bucket:
+    it is created on first use, and a different rate (or burst) given later changes
+    the rate of that bucket for all of its users.
+    """
+    key = (client.api["URL"], client.session)
+    with _buckets_lock:
+        bucket = _buckets.get(key)
+        if bucket is None:
+            bucket = _buckets[key] = TokenBucket(rate, burst)
+        elif bucket.rate != rate or (burst is not None and bucket.capacity != burst):
+            bucket.set_rate(rate, burst)
+        return bucket
+
+
+def _split_job(job):
+    if isinstance(job, tuple):
+        return job[0], job[1]
+    return job, {}
+
+
+class BulkSender:
+
+
+    def __init__(self, client, concurrency=8, rate=None, burst=None):
+        """
+        Sends one request per recipient with bounded concurrency.
+
+        Works with Client (threads) through ``send`` and with AsyncClient through ``asend``.
+        Only ``concurrency`` jobs are read from the input ahead of their results,
+        so memory stays flat however long the input is.
+
+        :Args:
+            - client (Client|AsyncClient) - Client of the session to send with.
+            - concurrency (int) - Maximum number of requests in flight.
+            - rate (float) - Maximum messages per second of the session, None for no limit.
+            - burst (float) - Bucket capacity of the session rate limit.
+        """
+        self.client = client
+        self.concurrency = concurrency
+        self.bucket = session_bucket(client, rate, burst) if rate else None
+
+
+    def send(self, method, jobs, **kwargs):
+        """
+        Calls ``client.<method>`` for every job and yields a BulkResult as each one completes.
+
+        :Args:
+            - method (str) - Client method to call. Example: "send_message"
+            - jobs (iterable) - Recipients (phone) or (phone, kwargs) tuples. Can be a generator.
+            - kwargs - Arguments shared by every call. Example: message="Hello"
+
+        :Returns:
+            - Generator of BulkResult(recipient, ok, response, error), in completion order.
+        """
+        func = getattr(self.client, method)
+        jobs = iter(jobs)
+        pending = set()
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            while True:
+                for job in jobs:
+                    recipient, extra = _split_job(job)
+                    if self.bucket:
+                        self.bucket.acquire()
+                    pending.add(executor.submit(self._call, func, recipient, {**kwargs, **extra}))
+                    if len(pending) >= self.concurrency:
+                        break
+
+                if not pending:
+                    return
+
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+
+
+    async def asend(self, method, jobs, **kwargs):
+        """
+        asyncio version of ``send`` for AsyncClient. ``jobs`` can be an iterable or an async iterable.
+
+        :Returns:
+            - Async generator of BulkResult(recipient, ok, response, error), in completion order.
+        """
+        func = getattr(self.client, method)
+        if hasattr(jobs, "__aiter__"):
+            jobs = jobs.__aiter__()
+            next_job = jobs.__anext__
+        else:
+            jobs = iter(jobs)
+
+            async def next_job():
+                try:
+                    return next(jobs)
+                except StopIteration:
+                    raise StopAsyncIteration
+
+        pending = set()
+        exhausted = False
+        try:
+            while True:
+                while not exhausted and len(pending) < self.concurrency:
+                    try:
+                        job = await next_job()
+                    except StopAsyncIteration:
+                        exhausted = True
+                        break
+                    recipient, extra = _split_job(job)
+                    if self.bucket:
+                        await self.bucket.acquire_async()
+                    pending.add(asyncio.ensure_future(self._acall(func, recipient, {**kwargs, **extra})))
+
+                if not pending:
+                    return
+
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+
+    @staticmethod
+    def _call(func, recipient, kwargs):
+        try:
+            response = func(recipient, **kwargs)
+        except Exception as e:
+            return BulkResult(recipient, False, None, e)
+        return BulkResult(recipient, is_success(response), response, None)
+
+
+    @staticmethod
+    async def _acall(func, recipient, kwargs):
+        try:
+            response = await func(recipient, **kwargs)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            return BulkResult(recipient, False, None, e)
+        return BulkResult(recipient, is_success(response), response, None)
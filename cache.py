@@ -0,0 +1,266 @@
+# Description: TTL/LRU cache of the read endpoints, invalidated by the write endpoints.
+
+import sqlite3
+from collections import OrderedDict
+from threading import Lock
+from time import time
+
+
+# Seconds a response of each read endpoint stays valid.
+DEFAULT_TTLS = {
+    "all-contacts": 300,
+    "contact": 600,
+    "profile": 600,
+    "profile-pic": 3600,
+    "profile-status": 600,
+    "check-number-status": 86400,
+    "all-groups": 300,
+    "all-broadcast-list": 300,
+    "group-members": 120,
+    "group-members-ids": 120,
+    "group-admins": 120,
+    "group-invite-link": 300,
+    "blocklist": 300,
+}
+
+
+# Read endpoints invalidated by each write endpoint, and the payload key that
+# holds the argument of the read endpoint (None clears every entry of the endpoint).
+INVALIDATIONS = {
+    "add-participant-group": (("group-members", "groupId"), ("group-members-ids", "groupId"), ("group-admins", "groupId")),
+    "remove-participant-group": (("group-members", "groupId"), ("group-members-ids", "groupId"), ("group-admins", "groupId")),
+    "promote-participant-group": (("group-members", "groupId"), ("group-admins", "groupId")),
+    "demote-participant-group": (("group-members", "groupId"), ("group-admins", "groupId")),
+    "leave-group": (("group-members", "groupId"), ("group-members-ids", "groupId"), ("group-admins", "groupId"), ("all-groups", None)),
+    "create-group": (("all-groups", None),),
+    "join-code": (("all-groups", None),),
+    "group-subject": (("all-groups", None),),
+    "group-description": (("all-groups", None),),
+    "group-property": (("all-groups", None),),
+    "messages-admins-only": (("all-groups", None),),
+    "block-contact": (("blocklist", None),),
+    "unblock-contact": (("blocklist", None),),
+    # the own number is not in the payload: every entry of the session is cleared
+    "change-profile-image": (("profile-pic", None),),
+    "change-profile-status": (("profile-status", None),),
+    "change-username": (("profile", None),),
+}
+
+
+# Approximate bookkeeping cost of one entry, added to the size of its body.
+ENTRY_OVERHEAD = 200
+
+# Seconds between two purges of the expired rows of the SQLite store.
+PURGE_INTERVAL = 60
+
+
+class ResponseCache:
+
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, ttls=None, path=None, max_disk_bytes=None):
+        """
+        Opt-in cache of the GET endpoints of a Client.
+
+        Entries are the raw response bodies, evicted least recently used first once
+        ``max_bytes`` is reached; a body larger than the budget is not cached. Write
+        endpoints listed in INVALIDATIONS clear the related entries of their session.
+        One cache can be shared by many Clients.
+
+        :Args:
+            - max_bytes (int) - Memory budget of the cached bodies.
+            - ttls (dict) - Endpoint name to TTL in seconds, merged over DEFAULT_TTLS. A TTL of 0 disables caching of the endpoint.
+            - path (str) - SQLite file to persist the entries to, so they survive restarts.
+            - max_disk_bytes (int) - Budget of the SQLite file entries, defaults to ``max_bytes``. Expired rows are
+                                     purged every PURGE_INTERVAL seconds, then the rows closest to expiry.
+        """
+        self.max_bytes = max_bytes
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.entries = OrderedDict()
+        self.index = {}
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.lock = Lock()
+        self.db = None
+        self.max_disk_bytes = max_disk_bytes or max_bytes
+        self.disk_size = 0
+        self.purged = 0
+
+        if path:
+            self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("CREATE TABLE IF NOT EXISTS cache (url TEXT PRIMARY KEY, prefix TEXT, endpoint TEXT, expires REAL, body BLOB)")
+            self.__trim_disk()
+
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+
+    def get(self, endpoint, url):
+        """
+        :Returns:
+            - The cached body of the url, or None.
+        """
+        if not self.ttls.get(endpoint):
+            return None
+
+        with self.lock:
+            entry = self.entries.get(url)
+            if entry is not None:
+                if entry[2] > time():
+                    self.entries.move_to_end(url)
+                    self.hits += 1
+                    return entry[3]
+                self.__remove(url)
+
+            if self.db is not None:
+                row = self.db.execute("SELECT prefix, expires, body FROM cache WHERE url = ?", (url,)).fetchone()
+                if row is not None and row[1] > time():
+                    self.__add(url, row[0], endpoint, row[1], row[2])
+                    self.hits += 1
+                    return row[2]
+
+            self.misses += 1
+            return None
+
+
+    def put(self, prefix, endpoint, url, body):
+        """
+        Cache the body of a successful GET of the endpoint.
+        """
+        ttl = self.ttls.get(endpoint)
+        if not ttl:
+            return
+
+        now = time()
+        expires = now + ttl
+        cost = len(body) + len(url) + ENTRY_OVERHEAD
+        with self.lock:
+            if url in self.entries:
+                self.__remove(url)
+            self.__add(url, prefix, endpoint, expires, body)
+
+            if self.db is not None:
+                # the disk store does not keep a previous body of the url either
+                self.db.execute("DELETE FROM cache WHERE url = ?", (url,))
+                if cost <= self.max_disk_bytes:
+                    self.db.execute("INSERT INTO cache VALUES (?, ?, ?, ?, ?)", (url, prefix, endpoint, expires, body))
+                    self.disk_size += cost
+                if self.disk_size > self.max_disk_bytes or now - self.purged >= PURGE_INTERVAL:
+                    self.__trim_disk()
+
+
+    def update(self, prefix, method, endpoint, url, payload, resp):
+        """
+        Called by the Client after every request: stores GET responses and
+        applies the invalidations of write endpoints.
+        """
+        if method == "GET":
+            if resp.status_code == 200:
+                self.put(prefix, endpoint, url, resp.content)
+        elif endpoint in INVALIDATIONS:
+            for target, key in INVALIDATIONS[endpoint]:
+                self.invalidate(prefix, target, payload.get(key) if key else None)
+
+
+    def invalidate(self, prefix, endpoint, argument=None):
+        """
+        Remove the entries of an endpoint of a session.
+
+        :Args:
+            - prefix (str) - URL prefix of the session. Example: http://localhost:8080/api/mySession/
+            - endpoint (str) - Endpoint name. Example: group-members
+            - argument (str) - Only remove the entries for this argument (e.g. a groupId).
+        """
+        if isinstance(argument, (list, tuple)):
+            for item in argument:
+                self.invalidate(prefix, endpoint, item)
+            return
+
+        suffix = "/" + str(argument) if argument is not None else None
+        with self.lock:
+            urls = self.index.get((prefix, endpoint), ())
+            for url in [url for url in urls if suffix is None or url.endswith(suffix)]:
+                self.__remove(url)
+                self.invalidations += 1
+
+            if self.db is not None:
+                if suffix is None:
+                    self.db.execute("DELETE FROM cache WHERE prefix = ? AND endpoint = ?", (prefix, endpoint))
+                else:
+                    self.db.execute("DELETE FROM cache WHERE prefix = ? AND endpoint = ? AND substr(url, -?) = ?", (prefix, endpoint, len(suffix), suffix))
+
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.index.clear()
+            self.size = 0
+            if self.db is not None:
+                self.db.execute("DELETE FROM cache")
+                self.disk_size = 0
+
+
+    def stats(self):
+        """
+        :Returns:
+            - dict with the hits, misses, evictions, invalidations, entries and bytes of the cache.
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "entries": len(self.entries),
+            "bytes": self.size,
+        }
+
+
+    def __add(self, url, prefix, endpoint, expires, body):
+        if len(body) + len(url) + ENTRY_OVERHEAD > self.max_bytes:
+            # would evict the whole cache, itself included
+            return
+        self.entries[url] = (prefix, endpoint, expires, body)
+        self.index.setdefault((prefix, endpoint), set()).add(url)
+        self.size += len(body) + len(url) + ENTRY_OVERHEAD
+
+        while self.size > self.max_bytes and self.entries:
+            self.__remove(next(iter(self.entries)))
+            self.evictions += 1
+
+
+    def __remove(self, url):
+        prefix, endpoint, expires, body = self.entries.pop(url)
+        self.size -= len(body) + len(url) + ENTRY_OVERHEAD
+        urls = self.index[(prefix, endpoint)]
+        urls.discard(url)
+        if not urls:
+            del self.index[(prefix, endpoint)]
+
+
+    def __trim_disk(self):
+        """
+        Purge the expired rows of the SQLite store, then the rows closest to expiry
+        until it fits in ``max_disk_bytes``.
+        """
+        now = time()
+        self.purged = now
+        self.db.execute("DELETE FROM cache WHERE expires < ?", (now,))
+        count, size = self.db.execute("SELECT COUNT(*), COALESCE(SUM(length(body) + length(url)), 0) FROM cache").fetchone()
+        self.disk_size = size + count * ENTRY_OVERHEAD
+        if self.disk_size <= self.max_disk_bytes:
+            return
+
+        evicted = []
+        for url, cost in self.db.execute("SELECT url, length(body) + length(url) FROM cache ORDER BY expires"):
+            evicted.append((url,))
+            self.disk_size -= cost + ENTRY_OVERHEAD
+            if self.disk_size <= self.max_disk_bytes:
+                break
+        self.db.executemany("DELETE FROM cache WHERE url = ?", evicted)
+        self.evictions += len(evicted)
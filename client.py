@@ -4,8 +4,16 @@
 # Description: This is a simple lib to communicate Python with WPPConnect server - https://github.com/wppconnect-team/wppconnect-server
 # Based on: https://github.com/wppconnect-team/wppconnect-server/blob/main/src/routes/index.js
 
-from json import loads as json_loads, dumps as json_dumps
-from requests import request as send_request
+import logging
+from collections import namedtuple
+from concurrent.futures import wait, FIRST_COMPLETED
+from time import sleep
+from .codec import default_codec
+from .media import Base64Body
+from .models import Chat, Contact, Group, Message, Participant, parse_models
+from .resilience import CircuitOpenError, compile_policies, hedge_executor, is_replayable, SINGLE_ATTEMPT
+from .stream import JSONArrayStream
+from .transport import default_transport, is_transient_error, DEFAULT_POOL_SIZE, DEFAULT_TIMEOUT
 
 
 ENDPOINTS = {
@@ -28,7 +36,7 @@ ENDPOINTS = {
     "all-new-messages": {"method": "GET", "url": "all-new-messages"},
     "unread-messages": {"method": "GET", "url": "unread-messages"},
     "all-unread-messages": {"method": "GET", "url": "all-unread-messages"},
-    "last-seen": {"method": "GET", "url": "last-seen"},
+    "last-seen": {"method": "GET", "url": "last-seen/%s"},
     "list-mutes": {"method": "GET", "url": "list-mutes"},
     "archive-chat": {"method": "POST", "url": "archive-chat"},
     "clear-chat": {"method": "POST", "url": "clear-chat"},
@@ -106,10 +114,103 @@ ENDPOINTS = {
 }
 
 
+logger = logging.getLogger(__name__)
+
+
+# An endpoint compiled for one session: HTTP method and full URL (or URL template).
+Endpoint = namedtuple("Endpoint", ["method", "url"])
+
+
+def compile_endpoints(api_url, secretKey, session):
+    """
+    Builds the Endpoint of every entry of ENDPOINTS for a session, so the URLs are
+    concatenated once per session instead of once per call.
+
+    :Returns:
+        - dict of endpoint name to Endpoint.
+    """
+    prefix = api_url + "/" + session + "/"
+    endpoints = {name: Endpoint(endpoint["method"], prefix + endpoint["url"]) for name, endpoint in ENDPOINTS.items()}
+    endpoints["generate-token"] = Endpoint(ENDPOINTS["generate-token"]["method"], api_url + "/" + ENDPOINTS["generate-token"]["url"] % (session, secretKey))
+    return endpoints
+
+
+class _StreamCall:
+    """
+    Bookkeeping of one streamed request (parser, circuit breaker and metrics), shared by
+    Client._stream_api and AsyncClient._stream_api so that only their I/O differs.
+    """
+
+    __slots__ = ("client", "model", "parser", "breaker", "metrics", "state", "status", "size")
+
+
+    def __init__(self, client, endpoint, method, url, data, model):
+        self.client = client
+        self.model = model
+        self.parser = JSONArrayStream("response", raw=model is not None)
+        self.breaker = client.breaker
+        if self.breaker is not None:
+            client._check_breaker(endpoint)
+        self.metrics = client.metrics
+        self.state = self.metrics.before(client, endpoint, method, url, data) if self.metrics is not None else None
+        self.status = None
+        self.size = 0
+
+
+    def opened(self, status):
+        """
+        :Returns:
+            - True if the token of the client was rejected and is to be refreshed.
+        """
+        self.status = status
+        if self.breaker is not None:
+            self.breaker.record(status)
+            self.breaker = None
+        return status == 401 and self.client.tokens is not None
+
+
+    def feed(self, chunk):
+        """
+        :Returns:
+            - The items completed by a chunk of the body.
+        """
+        self.size += len(chunk)
+        return self.__wrap(self.parser.feed(chunk))
+
+
+    def close(self):
+        return self.__wrap(self.parser.close())
+
+
+    def failed(self, error):
+        if self.breaker is not None:
+            if is_transient_error(error):
+                self.breaker.failure()
+            else:
+                self.breaker.release()
+        if self.state is not None:
+            self.metrics.after(self.state, self.status, self.size, error)
+            self.state = None
+
+
+    def finished(self):
+        if self.state is not None:
+            self.metrics.after(self.state, self.status, self.size)
+            self.state = None
+
+
+    def __wrap(self, items):
+        model = self.model
+        if model is None:
+            return items
+        codec = self.client.codec
+        return [model(item.encode(), codec) for item in items]
+
+
 class Client:
 
 
-    def __init__(self, api_url: str, secretKey: str, session: str):
+    def __init__(self, api_url: str, secretKey: str, session: str, transport=None, timeout=DEFAULT_TIMEOUT, pool_size=DEFAULT_POOL_SIZE, http2=False, cache=None, codec=None, metrics=None, policies=None, breaker=None, tokens=None):
         """
         Creates a new instance of the WPPConnect Client.
 
@@ -117,22 +218,364 @@ class Client:
             - api_url (str) - URL of the WPPConnect API. Example: http://localhost:8080/api
             - secretKey (str) - Secret key of the WPPConnect API.
             - session (str) - Session name to use in the WPPConnect API.
+            - transport (Transport) - Transport to send the requests with. A shared transport is not closed by the Client.
+            - timeout (float|tuple) - (connect, read) timeout in seconds of the default transport.
+            - pool_size (int) - Keep-alive connections per host of the default transport.
+            - http2 (bool) - Use HTTP/2 in the default transport (requires httpx[http2]).
+            - cache (ResponseCache) - Cache of the GET endpoints, invalidated by the write endpoints.
+            - codec (JSONCodec) - JSON codec of the requests and responses. Defaults to the fastest one installed.
+            - metrics (Metrics) - Collector of the request metrics, can be shared by many Clients.
+            - policies (dict) - RetryPolicy by endpoint name, with "GET" and "POST" keys as the defaults
+                                of each method. resilience.DEFAULT_POLICIES holds recommended ones.
+            - breaker (CircuitBreaker) - Circuit breaker of the session, or of its node when shared.
+            - tokens (TokenStore) - Store of the session tokens, shared by processes: the token is loaded on
+                                    the first request and refreshed once, with the request replayed, on HTTP 401.
         """
         self.api = {"URL": api_url, "secretKey": secretKey}
         self.session = session
         self.headers = {"Content-Type": "application/json"}
+        self._owns_transport = transport is None
+        self.transport = transport or default_transport(pool_size=pool_size, timeout=timeout, http2=http2)
+        self.cache = cache
+        self.codec = codec or default_codec()
+        self.metrics = metrics
+        self.breaker = breaker
+        self.tokens = tokens
+        self.policies = policies
+
+
+    @property
+    def policies(self):
+        return self._policies_source
+
+
+    @policies.setter
+    def policies(self, policies):
+        self._policies_source = policies
+        self._policies = compile_policies(policies, self._endpoints)
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+    def close(self):
+        """
+        Close the connection pool of the transport, if it is owned by this Client.
+        """
+        if self._owns_transport:
+            self.transport.close()
+
+
+    @property
+    def session(self):
+        return self._session
+
+
+    @session.setter
+    def session(self, session):
+        self._session = session
+        self._prefix = self.api["URL"] + "/" + session + "/"
+        self._endpoints = compile_endpoints(self.api["URL"], self.api["secretKey"], session)
 
 
     def __add_header(self, key, value):
         self.headers[key] = value
 
 
-    def __request_api(self, method, url, payload={}):
-        resp = send_request(method, url, headers=self.headers, data=json_dumps(payload))
+    def _encode_payload(self, method, payload):
+        # GET requests have no body
+        if method == "GET":
+            return None
+        return self.codec.dumps(payload if payload is not None else {})
+
+
+    def _attempt(self, endpoint, method, url, headers, data, timeout=None):
+        """
+        Sends one request through the transport, recording it in the metrics.
+        """
+        metrics = self.metrics
+        if metrics is None:
+            return self.transport.request(method, url, headers=headers, data=data, timeout=timeout)
+
+        state = metrics.before(self, endpoint, method, url, data)
         try:
-            return json_loads(resp.content.decode())
+            resp = self.transport.request(method, url, headers=headers, data=data, timeout=timeout)
+        except BaseException as e:
+            metrics.after(state, None, 0, e)
+            raise
+        metrics.after(state, resp.status_code, len(resp.content))
+        return resp
+
+
+    def _send(self, endpoint, method, url, headers, data):
+        """
+        Sends a request with the session token of the token store, refreshing it once on HTTP 401.
+        """
+        tokens = self.tokens
+        if tokens is None or endpoint == "generate-token":
+            return self._deliver(endpoint, method, url, headers, data)
+
+        if "Authorization" not in self.headers:
+            self._use_token(tokens.token(self))
+            headers = dict(headers, **self._auth_header())
+        resp = self._deliver(endpoint, method, url, headers, data)
+        if not self._refreshes(resp, data):
+            return resp
+
+        if not self._use_token(tokens.refresh(self, self._stale_token(headers))):
+            return resp
+        return self._deliver(endpoint, method, url, dict(headers, **self._auth_header()), data)
+
+
+    @staticmethod
+    def _refreshes(resp, data):
+        # a rejected token is refreshed when the request can be sent again
+        return resp.status_code == 401 and is_replayable(data)
+
+
+    def _use_token(self, token):
+        if token:
+            self.set_token(token)
+        return token
+
+
+    def _auth_header(self):
+        return {"Authorization": self.headers["Authorization"]} if "Authorization" in self.headers else {}
+
+
+    @staticmethod
+    def _stale_token(headers):
+        authorization = headers.get("Authorization", "")
+        return authorization[7:] if authorization.startswith("Bearer ") else None
+
+
+    def _deliver(self, endpoint, method, url, headers, data):
+        """
+        Sends a request with the retry policy of the endpoint and the circuit breaker.
+        """
+        policy = self._delivery_policy(endpoint)
+        if policy is None:
+            return self._attempt(endpoint, method, url, headers, data)
+
+        replayable = is_replayable(data)
+        attempt = 0
+        while True:
+            attempt += 1
+            if self.breaker is not None:
+                self._check_breaker(endpoint)
+            try:
+                if policy.hedge is not None and replayable:
+                    resp = self.__hedged(endpoint, method, url, headers, data, policy)
+                else:
+                    resp = self._attempt(endpoint, method, url, headers, data, policy.timeout)
+            except BaseException as e:
+                if not self._retries_error(e, attempt, policy, replayable, method, url):
+                    raise
+            else:
+                if not self._retries_response(resp, attempt, policy, replayable, method, url):
+                    return resp
+            sleep(policy.delay(attempt))
+
+
+    def _delivery_policy(self, endpoint):
+        """
+        :Returns:
+            - RetryPolicy of the endpoint, SINGLE_ATTEMPT when only the circuit breaker
+              applies, or None for a plain attempt.
+        """
+        policy = self._policies.get(endpoint)
+        if policy is None and self.breaker is not None:
+            return SINGLE_ATTEMPT
+        return policy
+
+
+    def _retries_error(self, error, attempt, policy, replayable, method, url):
+        """
+        Records a failed attempt in the circuit breaker.
+
+        :Returns:
+            - True if the request is to be tried again.
+        """
+        breaker = self.breaker
+        if breaker is not None:
+            if is_transient_error(error):
+                breaker.failure()
+            else:
+                breaker.release()
+        if attempt >= policy.attempts or not policy.retry_error(error, replayable):
+            return False
+        logger.info("%s %s failed (%r), attempt %d of %d", method, url, error, attempt, policy.attempts)
+        return True
+
+
+    def _retries_response(self, resp, attempt, policy, replayable, method, url):
+        """
+        Records an answered attempt in the circuit breaker.
+
+        :Returns:
+            - True if the request is to be tried again.
+        """
+        if self.breaker is not None:
+            self.breaker.record(resp.status_code)
+        if attempt >= policy.attempts or not policy.retry_status(resp.status_code) or not replayable:
+            return False
+        logger.info("%s %s returned HTTP %s, attempt %d of %d", method, url, resp.status_code, attempt, policy.attempts)
+        return True
+
+
+    def _check_breaker(self, endpoint):
+        try:
+            self.breaker.before()
+        except CircuitOpenError:
+            if self.metrics is not None:
+                self.metrics.error(self, endpoint, "circuit_open")
+            raise
+
+
+    def __hedged(self, endpoint, method, url, headers, data, policy):
+        # the first request runs in the pool too, so both can be waited on; the slower one is not
+        # cancelled (the sync transports cannot) but its response is dropped
+        executor = hedge_executor()
+        first = executor.submit(self._attempt, endpoint, method, url, headers, data, policy.timeout)
+        if wait((first,), timeout=policy.hedge)[0]:
+            return first.result()
+
+        pending = {first, executor.submit(self._attempt, endpoint, method, url, headers, data, policy.timeout)}
+        while True:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None and not policy.retry_status(future.result().status_code):
+                    return future.result()
+            if not pending:
+                return done.pop().result()
+
+
+    def _request_api(self, endpoint, payload=None, arg=None):
+        method, url = self._url(endpoint, arg)
+        content = self._cached(method, endpoint, url)
+        if content is not None:
+            return self.codec.loads(content)
+
+        resp = self._send(endpoint, method, url, self.headers, self._encode_payload(method, payload))
+        return self._handle_response(method, endpoint, url, payload, resp)
+
+
+    def _request_body(self, endpoint, body, payload=None):
+        """
+        Sends an already encoded body: bytes or an iterable of bytes such as Base64Body.
+        Iterables with a ``length`` (None when unknown) are sent with a Content-Length.
+        ``payload`` holds the plain fields of the body, used for cache invalidation.
+        """
+        method, url = self._endpoints[endpoint]
+        headers, body = self._body_headers(body)
+        resp = self._send(endpoint, method, url, headers, body)
+        return self._handle_response(method, endpoint, url, payload, resp)
+
+
+    def _body_headers(self, body):
+        """
+        :Returns:
+            - (headers, body) of a request sending an already encoded body.
+        """
+        if isinstance(body, (bytes, bytearray)):
+            return self.headers, body
+        length = getattr(body, "length", None)
+        if length is None:
+            # sent chunked
+            return self.headers, iter(body)
+        return dict(self.headers, **{"Content-Length": str(length)}), body
+
+
+    def _stream_api(self, endpoint, payload=None, arg=None, model=None):
+        """
+        Yields the items of the "response" array of the endpoint as they are downloaded,
+        decoded or wrapped in ``model``. Raises StreamError if the response has no such array.
+        """
+        method, url = self._url(endpoint, arg)
+        # streams are not retried, items may already have been consumed; the breaker still applies
+        # and a 401 refreshes the token for the next calls
+        tokens = self.tokens
+        if tokens is not None and "Authorization" not in self.headers:
+            self._use_token(tokens.token(self))
+
+        data = self._encode_payload(method, payload)
+        call = _StreamCall(self, endpoint, method, url, data, model)
+        try:
+            with self.transport.stream(method, url, headers=self.headers, data=data, timeout=self._stream_timeout(endpoint)) as (status, chunks):
+                if call.opened(status):
+                    self._use_token(tokens.refresh(self, self._stale_token(self.headers)))
+                for chunk in chunks:
+                    yield from call.feed(chunk)
+            yield from call.close()
+        except GeneratorExit:
+            raise
+        except BaseException as e:
+            call.failed(e)
+            raise
+        finally:
+            call.finished()
+
+
+    def _stream_timeout(self, endpoint):
+        policy = self._policies.get(endpoint)
+        return policy.timeout if policy is not None else None
+
+
+    def _request_models(self, endpoint, model, arg=None):
+        """
+        Like _request_api for the GET endpoints returning an array, with its items wrapped
+        in ``model``: only their JSON text is kept until a field is read.
+        """
+        method, url = self._url(endpoint, arg)
+        content = self._cached(method, endpoint, url)
+        if content is None:
+            resp = self._send(endpoint, method, url, self.headers, None)
+            content = self._cache_response(method, endpoint, url, resp)
+        return parse_models(content, model, self.codec)
+
+
+    def _url(self, endpoint, arg=None):
+        """
+        :Returns:
+            - (method, url) of the endpoint, with its argument.
+        """
+        method, url = self._endpoints[endpoint]
+        if arg is not None:
+            url = url % (arg,)
+        return method, url
+
+
+    def _cached(self, method, endpoint, url):
+        """
+        :Returns:
+            - The cached body of a GET, or None.
+        """
+        if self.cache is None or method != "GET":
+            return None
+        return self.cache.get(endpoint, url)
+
+
+    def _cache_response(self, method, endpoint, url, resp):
+        if self.cache is not None:
+            self.cache.update(self._prefix, method, endpoint, url, {}, resp)
+        return resp.content
+
+
+    def _handle_response(self, method, endpoint, url, payload, resp):
+        if self.cache is not None:
+            self.cache.update(self._prefix, method, endpoint, url, payload or {}, resp)
+
+        try:
+            return self.codec.loads(resp.content)
         except:
-            print(resp.content)
+            logger.warning("%s %s: undecodable response (HTTP %s): %r", method, url, resp.status_code, resp.content[:1000])
+            if self.metrics is not None:
+                self.metrics.error(self, endpoint, "decode")
             return False
 
 
@@ -143,8 +586,7 @@ class Client:
         :Returns:
             - JSON object with the token in the "token" key.
         """
-        url = self.api["URL"] + "/" +  ENDPOINTS["generate-token"]["url"] % (self.session, self.api["secretKey"])
-        return self.__request_api(ENDPOINTS["generate-token"]["method"], url)
+        return self._request_api("generate-token")
 
 
     def set_token(self, token: str):
@@ -167,13 +609,12 @@ class Client:
         :Returns:
             - JSON object with the session status and the QR Code if exists.
         """
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["start-session"]["url"]
         payload = {}
 
         if webhook:
             payload["webhook"] = webhook
 
-        return self.__request_api(ENDPOINTS["start-session"]["method"], url, payload)
+        return self._request_api("start-session", payload)
 
 
     def status_session(self):
@@ -181,8 +622,7 @@ class Client:
         :Returns:
             - JSON object with the session status and the QR Code if exists.
         """
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["status-session"]["url"]
-        return self.__request_api(ENDPOINTS["status-session"]["method"], url)
+        return self._request_api("status-session")
 
 
     def qrcode_session(self):
@@ -190,8 +630,7 @@ class Client:
         :Returns:
             - The QR Code via Stream.
         """
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["qrcode-session"]["url"]
-        return self.__request_api(ENDPOINTS["qrcode-session"]["method"], url)
+        return self._request_api("qrcode-session")
 
 
     def check_connection_session(self):
@@ -199,8 +638,7 @@ class Client:
         :Returns:
             - Connection status
         """
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["check-connection-session"]["url"]
-        return self.__request_api(ENDPOINTS["check-connection-session"]["method"], url)
+        return self._request_api("check-connection-session")
 
 
     def close_session(self):
@@ -208,147 +646,238 @@ class Client:
         :Returns:
             - Close the session.
         """
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["close-session"]["url"]
-        return self.__request_api(ENDPOINTS["close-session"]["method"], url)
+        return self._request_api("close-session")
 
 
-    def all_chats(self):
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["all-chats"]["url"]
-        return self.__request_api(ENDPOINTS["all-chats"]["method"], url)
+    def all_chats(self, models=False):
+        """
+        :Args:
+            - models (bool) - Return the chats as lazy Chat models instead of dicts.
+        """
+        if models:
+            return self._request_models("all-chats", Chat)
+        return self._request_api("all-chats")
+
+
+    def iter_all_chats(self, models=False):
+        """
+        Streaming version of all_chats.
+
+        :Returns:
+            - Generator of chats (Chat models if ``models``), yielded while the response is downloaded.
+        """
+        return self._stream_api("all-chats", model=Chat if models else None)
 
 
     def chat_by_id(self, phone):
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["chat-by-id"]["url"] % phone
-        return self.__request_api(ENDPOINTS["chat-by-id"]["method"], url)
+        return self._request_api("chat-by-id", arg=phone)
 
     def message_by_id(self, messageId):
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["message-by-id"]["url"] % messageId
-        return self.__request_api(ENDPOINTS["message-by-id"]["method"], url)
+        return self._request_api("message-by-id", arg=messageId)
 
 
     def chat_is_online(self, phone):
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["chat-is-online"]["url"] % phone
-        return self.__request_api(ENDPOINTS["chat-is-online"]["method"], url)
+        return self._request_api("chat-is-online", arg=phone)
+
+
+    def all_chats_with_messages(self):
+        return self._request_api("all-chats-with-messages")
+
 
+    def iter_all_chats_with_messages(self):
+        """
+        Streaming version of all_chats_with_messages.
+
+        :Returns:
+            - Generator of chats with their messages, yielded while the response is downloaded.
+        """
+        return self._stream_api("all-chats-with-messages")
 
-    def all_messages_in_chat(self, phone):
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["all-messages-in-chat"]["url"] % phone
-        return self.__request_api(ENDPOINTS["all-messages-in-chat"]["method"], url)
+
+    def all_messages_in_chat(self, phone, models=False):
+        """
+        :Args:
+            - models (bool) - Return the messages as lazy Message models instead of dicts.
+        """
+        if models:
+            return self._request_models("all-messages-in-chat", Message, phone)
+        return self._request_api("all-messages-in-chat", arg=phone)
+
+
+    def iter_all_messages_in_chat(self, phone, models=False):
+        """
+        Streaming version of all_messages_in_chat.
+
+        :Returns:
+            - Generator of messages (Message models if ``models``), yielded while the response is downloaded.
+        """
+        return self._stream_api("all-messages-in-chat", arg=phone, model=Message if models else None)
 
 
     def all_new_messages(self):
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["all-new-messages"]["url"]
-        return self.__request_api(ENDPOINTS["all-new-messages"]["method"], url)
+        return self._request_api("all-new-messages")
 
 
     def unread_messages(self):
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["unread-messages"]["url"]
-        return self.__request_api(ENDPOINTS["unread-messages"]["method"], url)
+        return self._request_api("unread-messages")
 
 
     def all_unread_messages(self):
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["all-unread-messages"]["url"]
-        return self.__request_api(ENDPOINTS["all-unread-messages"]["method"], url)
+        return self._request_api("all-unread-messages")
+
+
+    def iter_all_unread_messages(self):
+        """
+        Streaming version of all_unread_messages.
+
+        :Returns:
+            - Generator of messages, yielded while the response is downloaded.
+        """
+        return self._stream_api("all-unread-messages")
 
 
     def last_seen(self, phone):
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["last-seen"]["url"] % phone
-        return self.__request_api(ENDPOINTS["last-seen"]["method"], url)
+        return self._request_api("last-seen", arg=phone)
 
 
     def list_mutes(self):
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["list-mutes"]["url"]
-        return self.__request_api(ENDPOINTS["list-mutes"]["method"], url)
+        return self._request_api("list-mutes")
 
 
     def archive_chat(self, phone):
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["archive-chat"]["url"]
-        return self.__request_api(ENDPOINTS["archive-chat"]["method"], url, {"phone": phone})
+        return self._request_api("archive-chat", {"phone": phone})
 
 
     def clear_chat(self, phone):
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["clear-chat"]["url"]
-        return self.__request_api(ENDPOINTS["clear-chat"]["method"], url, {"phone": phone})
+        return self._request_api("clear-chat", {"phone": phone})
 
 
     def delete_chat(self, phone):
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["delete-chat"]["url"]
-        return self.__request_api(ENDPOINTS["delete-chat"]["method"], url, {"phone": phone})
+        return self._request_api("delete-chat", {"phone": phone})
 
 
     def delete_message(self, phone, messageId):
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["delete-message"]["url"]
-        return self.__request_api(ENDPOINTS["delete-message"]["method"], url, {"phone": phone, "messageId": messageId})
+        return self._request_api("delete-message", {"phone": phone, "messageId": messageId})
 
 
     def mark_unseen(self, phone):
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["mark-unseen"]["url"]
-        return self.__request_api(ENDPOINTS["mark-unseen"]["method"], url, {"phone": phone})
+        return self._request_api("mark-unseen", {"phone": phone})
 
 
     def pin_chat(self, phone):
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["pin-chat"]["url"]
-        return self.__request_api(ENDPOINTS["pin-chat"]["method"], url, {"phone": phone})
+        return self._request_api("pin-chat", {"phone": phone})
 
 
     def send_mute(self, phone, time, type):
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["send-mute"]["url"]
-        return self.__request_api(ENDPOINTS["send-mute"]["method"], url, {"phone": phone, "time": time, "type": type})
+        return self._request_api("send-mute", {"phone": phone, "time": time, "type": type})
 
 
     def chat_state(self, phone, chatstate):
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["chat-state"]["url"]
-        return self.__request_api(ENDPOINTS["chat-state"]["method"], url, {"phone": phone, "chatstate": chatstate})
+        return self._request_api("chat-state", {"phone": phone, "chatstate": chatstate})
 
 
     def send_seen(self, phone):
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["send-seen"]["url"]
-        return self.__request_api(ENDPOINTS["send-seen"]["method"], url, {"phone": phone})
+        return self._request_api("send-seen", {"phone": phone})
 
 
     def temporary_messages(self, phone, value):
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["temporary-messages"]["url"]
-        return self.__request_api(ENDPOINTS["temporary-messages"]["method"], url, {"phone": phone, "value": value})
+        return self._request_api("temporary-messages", {"phone": phone, "value": value})
 
 
     def typing(self, phone, value, isGroup):
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["typing"]["url"]
-        return self.__request_api(ENDPOINTS["typing"]["method"], url, {"phone": phone, "value": value, "isGroup": isGroup})
+        return self._request_api("typing", {"phone": phone, "value": value, "isGroup": isGroup})
 
 
     def send_file_base64(self, phone, base64, message=False, isGroup=False):
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["send-file-base64"]["url"]
         payload = {"phone": phone, "base64": base64, "isGroup": isGroup}
 
         if message:
             payload["message"] = message
 
-        return self.__request_api(ENDPOINTS["send-file-base64"]["method"], url, payload)
+        return self._request_api("send-file-base64", payload)
+
+
+    def send_file(self, phone, file, filename=None, message=False, isGroup=False, mimetype=None):
+        """
+        Send a file from disk or from a binary file object. The file is base64 encoded
+        while it is uploaded, in chunks, so it is never held in memory.
+
+        :Args:
+            - phone (str) - Phone number or group id.
+            - file (str|PathLike|file object) - Path or binary file object of the file.
+            - filename (str) - Name of the file shown in WhatsApp.
+            - message (str) - Caption of the file.
+            - isGroup (bool) - True if phone is a group id.
+            - mimetype (str) - Mimetype of the file. Guessed from its name if not set.
+        """
+        payload = {"phone": phone, "isGroup": isGroup}
+
+        if message:
+            payload["message"] = message
+        if filename:
+            payload["filename"] = filename
+
+        return self._request_body("send-file-base64", Base64Body(payload, "base64", file, mimetype), payload)
+
+
+    def send_template(self, phone, template, isGroup=False, **fields):
+        """
+        Send a MessageTemplate: only the recipient fields are encoded, the rest of the
+        body (caption, media...) was encoded once when the template was created.
+
+        Example: ``client.send_template(phone, MessageTemplate.file("catalog.pdf", "Our catalog"))``
+
+        :Args:
+            - phone (str) - Phone number or group id.
+            - template (MessageTemplate) - The message.
+            - isGroup (bool) - True if phone is a group id.
+            - fields - Other fields of the recipient. Example: mentioned=["5511..."]
+        """
+        recipient = {"phone": phone, "isGroup": isGroup, **fields, **template.recipient_fields}
+        return self._request_body(template.endpoint, template.body(recipient), recipient)
 
 
     def send_image(self, phone, path, caption=False, isGroup=False):
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["send-image"]["url"]
         payload = {"phone": phone, "path": path, "isGroup": isGroup}
 
         if caption:
             payload["caption"] = caption
 
-        return self.__request_api(ENDPOINTS["send-image"]["method"], url, payload)
+        return self._request_api("send-image", payload)
+
+
+    def send_image_file(self, phone, file, caption=False, isGroup=False, mimetype=None):
+        """
+        Send an image from disk or from a binary file object, streamed like send_file.
+        Without a mimetype or a file name to guess it from, the image format is detected
+        from the file content (PNG, JPEG, GIF, WebP), ValueError if it is none of them.
+        """
+        payload = {"phone": phone, "isGroup": isGroup}
+
+        if caption:
+            payload["caption"] = caption
+
+        return self._request_body("send-image", Base64Body(payload, "path", file, mimetype, image=True), payload)
 
 
     def send_voice(self, phone, base64Ptt, isGroup):
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["send-voice-base64"]["url"]
-        return self.__request_api(ENDPOINTS["send-voice-base64"]["method"], url, {"phone": phone, "base64Ptt": base64Ptt, "isGroup": isGroup})
+        return self._request_api("send-voice-base64", {"phone": phone, "base64Ptt": base64Ptt, "isGroup": isGroup})
+
+
+    def send_voice_file(self, phone, file, isGroup=False, mimetype=None):
+        """
+        Send a voice message (ptt) from disk or from a binary file object, streamed like send_file.
+        """
+        payload = {"phone": phone, "isGroup": isGroup}
+        return self._request_body("send-voice-base64", Base64Body(payload, "base64Ptt", file, mimetype), payload)
 
 
     def send_reply(self, phone, message, messageId, isGroup):
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["send-reply"]["url"]
-        return self.__request_api(ENDPOINTS["send-reply"]["method"], url, {"phone": phone, "message": message, "messageId": messageId, "isGroup": isGroup})
+        return self._request_api("send-reply", {"phone": phone, "message": message, "messageId": messageId, "isGroup": isGroup})
 
 
     def send_message(self, phone, message, isGroup=False):
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["send-message"]["url"]
-        return self.__request_api(ENDPOINTS["send-message"]["method"], url, {"phone": phone, "message": message, "isGroup": isGroup})
+        return self._request_api("send-message", {"phone": phone, "message": message, "isGroup": isGroup})
 
 
     def send_buttons(self, phone, message, buttons, title=False, footer=False):
@@ -360,7 +889,6 @@ class Client:
         :param title: Title of the message
         :param footer: Footer of the message
         """
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["send-buttons"]["url"]
         payload = {"phone": phone, "message": message}
         payload["options"] = {"useTemplateButtons": "true", "buttons": buttons}
 
@@ -369,194 +897,209 @@ class Client:
         if footer:
             payload["options"]["footer"] = footer
 
-        return self.__request_api(ENDPOINTS["send-buttons"]["method"], url, payload)
+        return self._request_api("send-buttons", payload)
 
 
     def foward_messages(self, phone, messageId):
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["forwardMessages"]["url"]
-        return self.__request_api(ENDPOINTS["forwardMessages"]["method"], url, {"phone": phone, "messageId": messageId})
+        return self._request_api("forwardMessages", {"phone": phone, "messageId": messageId})
 
 
     def contact_vcard(self, phone, contactsId, name, isGroup):
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["contact-vcard"]["url"]
-        return self.__request_api(ENDPOINTS["contact-vcard"]["method"], url, {"phone": phone, "contactsId": contactsId, "name": name, "isGroup": isGroup})
+        return self._request_api("contact-vcard", {"phone": phone, "contactsId": contactsId, "name": name, "isGroup": isGroup})
 
 
     def send_link_preview(self, phone, url, caption):
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["send-link-preview"]["url"]
-        return self.__request_api(ENDPOINTS["send-link-preview"]["method"], url, {"phone": phone, "url": url, "caption": caption})
+        return self._request_api("send-link-preview", {"phone": phone, "url": url, "caption": caption})
 
 
     def send_location(self, phone, lat, lng, title):
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["send-location"]["url"]
-        return self.__request_api(ENDPOINTS["send-location"]["method"], url, {"phone": phone, "lat": lat, "lng": lng, "title": title})
+        return self._request_api("send-location", {"phone": phone, "lat": lat, "lng": lng, "title": title})
 
 
     def send_mentioned(self, phone, message, mentioned):
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["send-mentioned"]["url"]
-        return self.__request_api(ENDPOINTS["send-mentioned"]["method"], url, {"phone": phone, "message": message, "mentioned": mentioned, "isGroup": True})
+        return self._request_api("send-mentioned", {"phone": phone, "message": message, "mentioned": mentioned, "isGroup": True})
 
 
     def send_sticker(self, phone, path, isGroup):
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["send-sticker"]["url"]
-        return self.__request_api(ENDPOINTS["send-sticker"]["method"], url, {"phone": phone, "path": path, "isGroup": isGroup})
+        return self._request_api("send-sticker", {"phone": phone, "path": path, "isGroup": isGroup})
+
+
+    def send_sticker_file(self, phone, file, isGroup=False, mimetype=None):
+        """
+        Send a sticker from disk or from a binary file object, streamed like send_image_file.
+        """
+        payload = {"phone": phone, "isGroup": isGroup}
+        return self._request_body("send-sticker", Base64Body(payload, "path", file, mimetype, image=True), payload)
 
 
     def send_sticker_gif(self, phone, path, isGroup):
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["send-sticker-gif"]["url"]
-        return self.__request_api(ENDPOINTS["send-sticker-gif"]["method"], url, {"phone": phone, "path": path, "isGroup": isGroup})
+        return self._request_api("send-sticker-gif", {"phone": phone, "path": path, "isGroup": isGroup})
 
 
     def change_username(self, name):
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["change-username"]["url"]
-        return self.__request_api(ENDPOINTS["change-username"]["method"], url, {"name": name})
+        return self._request_api("change-username", {"name": name})
 
 
     def change_profile_image(self, path):
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["change-profile-image"]["url"]
-        return self.__request_api(ENDPOINTS["change-profile-image"]["method"], url, {"path": path})
+        return self._request_api("change-profile-image", {"path": path})
+
+
+    def change_profile_image_file(self, file, mimetype=None):
+        """
+        Change the profile image from disk or from a binary file object, streamed like send_image_file.
+        """
+        return self._request_body("change-profile-image", Base64Body({}, "path", file, mimetype, image=True))
 
 
     def change_profile_status(self, status):
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["change-profile-status"]["url"]
-        return self.__request_api(ENDPOINTS["change-profile-status"]["method"], url, {"status": status})
+        return self._request_api("change-profile-status", {"status": status})
 
 
     def check_number_status(self, phone):
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["check-number-status"]["url"] + "/" + phone
-        return self.__request_api(ENDPOINTS["check-number-status"]["method"], url)
+        return self._request_api("check-number-status", arg=phone)
 
 
-    def all_contacts(self):
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["all-contacts"]["url"]
-        return self.__request_api(ENDPOINTS["all-contacts"]["method"], url)
+    def all_contacts(self, models=False):
+        """
+        :Args:
+            - models (bool) - Return the contacts as lazy Contact models instead of dicts.
+        """
+        if models:
+            return self._request_models("all-contacts", Contact)
+        return self._request_api("all-contacts")
+
+
+    def iter_all_contacts(self, models=False):
+        """
+        Streaming version of all_contacts.
+
+        :Returns:
+            - Generator of contacts (Contact models if ``models``), yielded while the response is downloaded.
+        """
+        return self._stream_api("all-contacts", model=Contact if models else None)
 
 
     def contact(self, phone):
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["contact"]["url"] + "/" + phone
-        return self.__request_api(ENDPOINTS["contact"]["method"], url)
+        return self._request_api("contact", arg=phone)
 
 
     def profile(self, phone):
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["profile"]["url"] + "/" + phone
-        return self.__request_api(ENDPOINTS["profile"]["method"], url)
+        return self._request_api("profile", arg=phone)
 
 
     def profile_pic(self, phone):
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["profile-pic"]["url"] + "/" + phone
-        return self.__request_api(ENDPOINTS["profile-pic"]["method"], url)
+        return self._request_api("profile-pic", arg=phone)
 
 
     def profile_status(self, phone):
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["profile-status"]["url"] + "/" + phone
-        return self.__request_api(ENDPOINTS["profile-status"]["method"], url)
+        return self._request_api("profile-status", arg=phone)
 
 
     def create_group(self, groupname, phone):
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["create-group"]["url"]
-        return self.__request_api(ENDPOINTS["create-group"]["method"], url, {"groupname": groupname, "phone": phone})
+        return self._request_api("create-group", {"groupname": groupname, "phone": phone})
 
 
     def join_code(self, inviteCode):
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["join-code"]["url"]
-        return self.__request_api(ENDPOINTS["join-code"]["method"], url, {"inviteCode": inviteCode})
+        return self._request_api("join-code", {"inviteCode": inviteCode})
 
 
     def add_participant_group(self, groupId, phone):
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["add-participant-group"]["url"]
-        return self.__request_api(ENDPOINTS["add-participant-group"]["method"], url, {"groupId": groupId, "phone": phone})
+        return self._request_api("add-participant-group", {"groupId": groupId, "phone": phone})
 
 
     def demote_participant_group(self, groupId, phone):
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["demote-participant-group"]["url"]
-        return self.__request_api(ENDPOINTS["demote-participant-group"]["method"], url, {"groupId": groupId, "phone": phone})
+        return self._request_api("demote-participant-group", {"groupId": groupId, "phone": phone})
 
 
     def promote_participant_group(self, groupId, phone):
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["promote-participant-group"]["url"]
-        return self.__request_api(ENDPOINTS["promote-participant-group"]["method"], url, {"groupId": groupId, "phone": phone})
+        return self._request_api("promote-participant-group", {"groupId": groupId, "phone": phone})
 
 
     def all_broadcast_list(self):
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["all-broadcast-list"]["url"]
-        return self.__request_api(ENDPOINTS["all-broadcast-list"]["method"], url)
+        return self._request_api("all-broadcast-list")
 
 
-    def all_groups(self):
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["all-groups"]["url"]
-        return self.__request_api(ENDPOINTS["all-groups"]["method"], url)
+    def all_groups(self, models=False):
+        """
+        :Args:
+            - models (bool) - Return the groups as lazy Group models instead of dicts.
+        """
+        if models:
+            return self._request_models("all-groups", Group)
+        return self._request_api("all-groups")
+
+
+    def iter_all_groups(self, models=False):
+        """
+        Streaming version of all_groups.
+
+        :Returns:
+            - Generator of groups (Group models if ``models``), yielded while the response is downloaded.
+        """
+        return self._stream_api("all-groups", model=Group if models else None)
 
 
     def group_admins(self, groupId):
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["group-admins"]["url"] % groupId
-        return self.__request_api(ENDPOINTS["group-admins"]["method"], url)
+        return self._request_api("group-admins", arg=groupId)
 
 
     def group_info_from_invite_link(self, invitecode):
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["group-info-from-invite-link"]["url"]
-        return self.__request_api(ENDPOINTS["group-info-from-invite-link"]["method"], url, {"invitecode": invitecode})
+        return self._request_api("group-info-from-invite-link", {"invitecode": invitecode})
 
 
     def group_invite_link(self, groupId):
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["group-invite-link"]["url"] + "/" + groupId
-        return self.__request_api(ENDPOINTS["group-invite-link"]["method"], url)
+        return self._request_api("group-invite-link", arg=groupId)
 
 
     def group_members_ids(self, groupId):
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["group-members-ids"]["url"] + "/" + groupId
-        return self.__request_api(ENDPOINTS["group-members-ids"]["method"], url)
+        return self._request_api("group-members-ids", arg=groupId)
 
 
-    def group_members(self, groupId):
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["group-members"]["url"] + "/" + groupId
-        return self.__request_api(ENDPOINTS["group-members"]["method"], url)
+    def group_members(self, groupId, models=False):
+        """
+        :Args:
+            - models (bool) - Return the members as lazy Participant models instead of dicts.
+        """
+        if models:
+            return self._request_models("group-members", Participant, groupId)
+        return self._request_api("group-members", arg=groupId)
 
 
     def leave_group(self, groupId):
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["leave-group"]["url"]
-        return self.__request_api(ENDPOINTS["leave-group"]["method"], url, {"groupId": groupId})
+        return self._request_api("leave-group", {"groupId": groupId})
 
 
     def remove_participant_group(self, groupId, phone):
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["remove-participant-group"]["url"]
-        return self.__request_api(ENDPOINTS["remove-participant-group"]["method"], url, {"groupId": groupId, "phone": phone})
+        return self._request_api("remove-participant-group", {"groupId": groupId, "phone": phone})
 
 
     def group_description(self, groupId, description):
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["group-description"]["url"]
-        return self.__request_api(ENDPOINTS["group-description"]["method"], url, {"groupId": groupId, "description": description})
+        return self._request_api("group-description", {"groupId": groupId, "description": description})
 
 
     def group_property(self, groupId, property, value):
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["group-property"]["url"]
-        return self.__request_api(ENDPOINTS["group-property"]["method"], url, {"groupId": groupId, "property": property, "value": value})
+        return self._request_api("group-property", {"groupId": groupId, "property": property, "value": value})
 
 
     def group_subject(self, groupId, title):
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["group-subject"]["url"]
-        return self.__request_api(ENDPOINTS["group-subject"]["method"], url, {"groupId": groupId, "title": title})
+        return self._request_api("group-subject", {"groupId": groupId, "title": title})
 
 
     def messages_admins_only(self, groupId, value):
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["messages-admins-only"]["url"]
-        return self.__request_api(ENDPOINTS["messages-admins-only"]["method"], url, {"groupId": groupId, "value": value})
+        return self._request_api("messages-admins-only", {"groupId": groupId, "value": value})
 
 
     def get_battery_level(self):
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["get-battery-level"]["url"]
-        return self.__request_api(ENDPOINTS["get-battery-level"]["method"], url)
+        return self._request_api("get-battery-level")
 
 
     def block_contact(self, phone):
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["block-contact"]["url"]
-        return self.__request_api(ENDPOINTS["block-contact"]["method"], url, {"phone": phone})
+        return self._request_api("block-contact", {"phone": phone})
 
 
     def unblock_contact(self, phone):
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["unblock-contact"]["url"]
-        return self.__request_api(ENDPOINTS["unblock-contact"]["method"], url, {"phone": phone})
+        return self._request_api("unblock-contact", {"phone": phone})
 
 
     def blocklist(self):
-        url = self.api["URL"] + "/" + self.session + "/" + ENDPOINTS["blocklist"]["url"]
-        return self.__request_api(ENDPOINTS["blocklist"]["method"], url)
+        return self._request_api("blocklist")
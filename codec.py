@@ -0,0 +1,80 @@
+# Description: JSON codecs working on bytes. The fastest installed library is used by default.
+
+import json
+
+
+class JSONCodec:
+    """
+    Base class of the codecs: ``dumps`` returns bytes and ``loads`` accepts bytes.
+    """
+
+    name = None
+
+
+    def dumps(self, obj) -> bytes:
+        raise NotImplementedError
+
+
+    def loads(self, data: bytes):
+        raise NotImplementedError
+
+
+class StdlibCodec(JSONCodec):
+
+    name = "json"
+
+
+    def dumps(self, obj) -> bytes:
+        return json.dumps(obj, separators=(",", ":")).encode()
+
+
+    def loads(self, data: bytes):
+        # json.loads accepts bytes and detects their encoding, no intermediate str is made by the caller
+        return json.loads(data)
+
+
+class OrjsonCodec(JSONCodec):
+
+    name = "orjson"
+
+
+    def __init__(self):
+        import orjson
+        self.dumps = orjson.dumps
+        self.loads = orjson.loads
+
+
+class MsgspecCodec(JSONCodec):
+
+    name = "msgspec"
+
+
+    def __init__(self):
+        import msgspec
+        self.dumps = msgspec.json.Encoder().encode
+        self.loads = msgspec.json.Decoder().decode
+
+
+CODECS = (OrjsonCodec, MsgspecCodec, StdlibCodec)
+
+
+def default_codec():
+    """
+    Returns the first available codec of CODECS: orjson, then msgspec, then the stdlib json.
+    """
+    for codec in CODECS:
+        try:
+            return codec()
+        except ImportError:
+            continue
+    return StdlibCodec()
+
+
+def get_codec(name):
+    """
+    Returns a codec by name ("orjson", "msgspec" or "json").
+    """
+    for codec in CODECS:
+        if codec.name == name:
+            return codec()
+    raise ValueError("Unknown JSON codec: %s" % name)
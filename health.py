@@ -0,0 +1,377 @@
+# Description: asyncio monitor of the state of many sessions, polled on adaptive intervals.
+
+import asyncio
+import logging
+from heapq import heappop, heappush
+from random import uniform
+from time import monotonic, time
+from .resilience import CircuitOpenError
+from .transport import is_transient_error
+
+
+logger = logging.getLogger(__name__)
+
+
+# States of WPPConnect server (status-session) that are not a failure of the monitor.
+CONNECTED = "CONNECTED"
+QRCODE = "QRCODE"
+# States set by the monitor.
+UNKNOWN = "UNKNOWN"          # not checked yet
+UNREACHABLE = "UNREACHABLE"  # the node did not answer (transport error, circuit open)
+ERROR = "ERROR"              # the node answered without a status (e.g. HTTP 401 or 500)
+
+
+class SessionHealth:
+    """
+    Last known state of a session.
+    """
+
+    __slots__ = ("session", "node", "state", "qrcode", "checked_at", "changed_at", "interval", "checks", "failures", "error")
+
+
+    def __init__(self, session, node):
+        self.session = session
+        self.node = node
+        self.state = UNKNOWN
+        self.qrcode = None
+        self.checked_at = None
+        self.changed_at = None
+        self.interval = None
+        self.checks = 0
+        self.failures = 0
+        self.error = None
+
+
+    @property
+    def connected(self):
+        return self.state == CONNECTED
+
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+    def __repr__(self):
+        return "SessionHealth(%r, %r)" % (self.session, self.state)
+
+
+class _Entry:
+
+    __slots__ = ("client", "health", "seq", "running", "poked", "paced")
+
+
+    def __init__(self, client, health):
+        self.client = client
+        self.health = health
+        self.seq = 0
+        self.running = False
+        self.poked = False
+        self.paced = False
+
+
+class HealthMonitor:
+
+
+    def __init__(self, clients=(), min_interval=5.0, max_interval=300.0, unhealthy_interval=15.0, backoff=2.0, jitter=0.2, node_concurrency=4, node_rate=50.0, on_change=None):
+        """
+        Watches the state of many sessions from one event loop.
+
+        Every session is checked on its own interval: it starts at ``min_interval``, is
+        multiplied by ``backoff`` after every check that finds the same state (up to
+        ``max_interval`` for connected sessions, ``unhealthy_interval`` for the others) and
+        goes back to ``min_interval`` when the state changes. Connected sessions are checked
+        with check-connection-session; status-session, which also returns the QR code, is only
+        called for the others and when the connection check fails.
+
+        Checks are spread: the first one of a session is at a random time of its first interval,
+        every interval gets +/- ``jitter``, and each node runs at most ``node_concurrency`` checks
+        at once and starts at most ``node_rate`` per second.
+
+        ``snapshot()`` returns the last known states without sending requests.
+
+        Example:
+            async with HealthMonitor(clients, on_change=alert) as monitor:
+                ...
+                monitor.snapshot()
+
+        :Args:
+            - clients (iterable) - AsyncClient of every session. Clients of a SessionPool node should have its
+                                   ``node`` attribute; the API URL is the node otherwise.
+            - min_interval (float) - Seconds between two checks right after a change.
+            - max_interval (float) - Maximum seconds between two checks of a connected session.
+            - unhealthy_interval (float) - Maximum seconds between two checks of a session in any other state.
+            - backoff (float) - Factor applied to the interval after a check without change.
+            - jitter (float) - Random fraction added to or removed from every interval.
+            - node_concurrency (int) - Checks in flight per node.
+            - node_rate (float) - Checks started per second per node, None for no limit.
+            - on_change (callable) - Called with (SessionHealth, previous state) when the state of a session
+                                     changes. Can be a function or a coroutine function.
+        """
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.unhealthy_interval = unhealthy_interval
+        self.backoff = backoff
+        self.jitter = jitter
+        self.node_concurrency = node_concurrency
+        self.node_gap = 1.0 / node_rate if node_rate else 0.0
+        self.callbacks = []
+        if on_change is not None:
+            self.callbacks.append(on_change)
+
+        self.entries = {}
+        self.queue = []
+        self.seq = 0
+        self.semaphores = {}
+        self.slots = {}
+        self.tasks = set()
+        self.task = None
+        self.wakeup = None
+        self.checks = 0
+        self.changes = 0
+
+        for client in clients:
+            self.add(client)
+
+
+    async def start(self):
+        if self.task is None:
+            self.wakeup = asyncio.Event()
+            self.task = asyncio.ensure_future(self.__run())
+        return self
+
+
+    async def stop(self):
+        """
+        Stop the monitor. Checks in flight are cancelled.
+        """
+        tasks = list(self.tasks)
+        if self.task is not None:
+            tasks.append(self.task)
+            self.task = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for entry in self.entries.values():
+            if entry.running:
+                entry.running = False
+                self.__schedule(entry, 0)
+
+
+    async def __aenter__(self):
+        return await self.start()
+
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+
+    def on_change(self, callback):
+        """
+        Register a callback of the state changes; usable as a decorator.
+        """
+        self.callbacks.append(callback)
+        return callback
+
+
+    def add(self, client):
+        """
+        Start watching the session of an AsyncClient. A session already watched gets the new client.
+        """
+        entry = self.entries.get(client.session)
+        if entry is not None:
+            entry.client = client
+            entry.health.node = self.__node(client)
+            return entry.health
+
+        entry = self.entries[client.session] = _Entry(client, SessionHealth(client.session, self.__node(client)))
+        entry.health.interval = self.min_interval
+        self.__schedule(entry, uniform(0, self.min_interval))
+        return entry.health
+
+
+    def remove(self, session):
+        """
+        Stop watching a session.
+        """
+        entry = self.entries.pop(session, None)
+        if entry is not None:
+            # its entry in the queue is skipped
+            entry.seq = -1
+
+
+    def notify(self, session):
+        """
+        Check a session as soon as possible and tighten its interval, e.g. on a webhook
+        event that hints at a state change ("status-find", "qrcode").
+        """
+        entry = self.entries.get(session)
+        if entry is None:
+            return
+        entry.health.interval = self.min_interval
+        if entry.running:
+            entry.poked = True
+        else:
+            self.__schedule(entry, 0)
+
+
+    def health(self, session):
+        """
+        :Returns:
+            - The SessionHealth of a session, None if it is not watched.
+        """
+        entry = self.entries.get(session)
+        return entry.health if entry is not None else None
+
+
+    def snapshot(self, node=None):
+        """
+        :Returns:
+            - dict of session to the dict of its SessionHealth, optionally only the sessions of ``node``.
+        """
+        return {
+            session: entry.health.to_dict()
+            for session, entry in self.entries.items()
+            if node is None or entry.health.node == node
+        }
+
+
+    def states(self, node=None):
+        """
+        :Returns:
+            - dict of state to number of sessions.
+        """
+        counts = {}
+        for entry in self.entries.values():
+            if node is None or entry.health.node == node:
+                counts[entry.health.state] = counts.get(entry.health.state, 0) + 1
+        return counts
+
+
+    def stats(self):
+        return {
+            "sessions": len(self.entries),
+            "checks": self.checks,
+            "changes": self.changes,
+            "in_flight": len(self.tasks),
+        }
+
+
+    @staticmethod
+    def __node(client):
+        return getattr(client, "node", None) or client.api["URL"]
+
+
+    def __schedule(self, entry, delay):
+        self.seq += 1
+        entry.seq = self.seq
+        entry.paced = False
+        due = monotonic() + delay
+        wake = not self.queue or due < self.queue[0][0]
+        heappush(self.queue, (due, self.seq, entry.client.session))
+        if wake and self.wakeup is not None:
+            self.wakeup.set()
+
+
+    async def __run(self):
+        queue = self.queue
+        while True:
+            now = monotonic()
+            while queue and queue[0][0] <= now:
+                due, seq, session = heappop(queue)
+                entry = self.entries.get(session)
+                if entry is None or entry.seq != seq:
+                    continue
+
+                # pace the checks of every node: a check due too early is given the next free slot
+                if not entry.paced:
+                    node = entry.health.node
+                    start = max(due, self.slots.get(node, 0.0))
+                    self.slots[node] = start + self.node_gap
+                    if start > now:
+                        entry.paced = True
+                        heappush(queue, (start, seq, session))
+                        continue
+
+                entry.running = True
+                task = asyncio.ensure_future(self.__check(entry))
+                self.tasks.add(task)
+                task.add_done_callback(self.tasks.discard)
+
+            self.wakeup.clear()
+            timeout = queue[0][0] - now if queue else None
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+
+    async def __check(self, entry):
+        health = entry.health
+        semaphore = self.semaphores.get(health.node)
+        if semaphore is None:
+            semaphore = self.semaphores[health.node] = asyncio.Semaphore(self.node_concurrency)
+
+        async with semaphore:
+            try:
+                state, qrcode = await self.__probe(entry.client, health.state)
+                error = None
+            except Exception as e:
+                state = UNREACHABLE if isinstance(e, CircuitOpenError) or is_transient_error(e) else ERROR
+                qrcode = None
+                error = repr(e)
+                if state == ERROR:
+                    logger.warning("Health check of the session %s failed: %r", health.session, e)
+
+        entry.running = False
+        if self.entries.get(health.session) is not entry:
+            return
+
+        self.checks += 1
+        health.checks += 1
+        health.checked_at = time()
+        health.qrcode = qrcode
+        health.error = error
+        health.failures = health.failures + 1 if state in (UNREACHABLE, ERROR) else 0
+
+        previous = health.state
+        if state != previous or entry.poked:
+            health.interval = self.min_interval
+        else:
+            ceiling = self.max_interval if state == CONNECTED else self.unhealthy_interval
+            health.interval = min(health.interval * self.backoff, ceiling)
+        entry.poked = False
+        self.__schedule(entry, health.interval * uniform(1 - self.jitter, 1 + self.jitter))
+
+        if state != previous:
+            health.state = state
+            health.changed_at = health.checked_at
+            self.changes += 1
+            await self.__changed(health, previous)
+
+
+    async def __probe(self, client, state):
+        """
+        :Returns:
+            - (state, qrcode) of the session.
+        """
+        if state == CONNECTED:
+            resp = await client.check_connection_session()
+            if isinstance(resp, dict) and resp.get("status") is True:
+                return CONNECTED, None
+
+        resp = await client.status_session()
+        status = resp.get("status") if isinstance(resp, dict) else None
+        if not isinstance(status, str):
+            return ERROR, None
+        status = status.upper()
+        return status, (resp.get("qrcode") or resp.get("urlcode")) if status == QRCODE else None
+
+
+    async def __changed(self, health, previous):
+        for callback in self.callbacks:
+            try:
+                result = callback(health, previous)
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception:
+                logger.exception("Health callback %r failed on %r", callback, health)
@@ -0,0 +1,198 @@
+# Description: Streams media files as base64 JSON request bodies, without loading them in memory.
+
+from binascii import b2a_base64
+from json import dumps as json_dumps
+from mimetypes import guess_type
+from os import fspath, PathLike, SEEK_END
+
+
+# Raw bytes read per chunk. A multiple of 3, so every chunk encodes to base64 without padding.
+CHUNK_SIZE = 3 * 64 * 1024
+
+
+class MediaReadError(Exception):
+    """
+    The media file of a body could not be read while it was uploaded.
+
+    Not an OSError: the transports would report it as a connection error, while the
+    server is not at fault and sending the request again fails the same way.
+    """
+
+
+    def __init__(self, name, error):
+        super().__init__("Cannot read the media %s: %s" % (name or "file", error))
+        self.name = name
+        self.error = error
+
+
+# Leading bytes of the image formats WhatsApp accepts: (offset, signature, mimetype)
+IMAGE_SIGNATURES = (
+    (0, b"\x89PNG\r\n\x1a\n", "image/png"),
+    (0, b"\xff\xd8\xff", "image/jpeg"),
+    (0, b"GIF87a", "image/gif"),
+    (0, b"GIF89a", "image/gif"),
+    (8, b"WEBP", "image/webp"),
+)
+
+
+def guess_mimetype(name, default="application/octet-stream"):
+    if name:
+        mimetype = guess_type(name)[0]
+        if mimetype:
+            return mimetype
+    return default
+
+
+def sniff_image_mimetype(head):
+    """
+    :Returns:
+        - Mimetype of the image whose first bytes are ``head``, None if not a known image format.
+    """
+    for offset, signature, mimetype in IMAGE_SIGNATURES:
+        if head[offset:offset + len(signature)] == signature:
+            if mimetype == "image/webp" and head[:4] != b"RIFF":
+                continue
+            return mimetype
+    return None
+
+
+class Base64Body:
+
+
+    def __init__(self, fields: dict, field: str, file, mimetype=None, chunk_size=CHUNK_SIZE, image=False):
+        """
+        JSON request body whose ``field`` is the base64 data URI of a file.
+
+        Iterating over it yields the body in chunks: memory use is O(chunk_size) whatever
+        the size of the file. The exact length of the body is known up front for paths
+        and seekable file objects, so it is sent with a Content-Length header.
+
+        :Args:
+            - fields (dict) - The other fields of the body. Example: {"phone": "5511...", "isGroup": False}
+            - field (str) - Name of the field holding the file. Example: base64
+            - file (str|PathLike|file object) - Path or binary file object of the media.
+            - mimetype (str) - Mimetype of the data URI. Guessed from the file name if not set.
+            - chunk_size (int) - Raw bytes read per chunk, rounded down to a multiple of 3.
+            - image (bool) - The file is an image: without a mimetype or a name to guess it from,
+              it is detected from the first bytes of the file (PNG, JPEG, GIF, WebP), ValueError if none.
+        """
+        if isinstance(file, (str, PathLike)):
+            self.path, self.file = fspath(file), None
+            name = self.path
+        else:
+            self.path, self.file = None, file
+            name = getattr(file, "name", None)
+            name = name if isinstance(name, str) else None
+
+        self.name = name
+        self.chunk_size = max(3, chunk_size - chunk_size % 3)
+        if not mimetype:
+            mimetype = guess_mimetype(name, None)
+            if mimetype is None and image:
+                mimetype = self.__sniff_image()
+            mimetype = mimetype or "application/octet-stream"
+
+        # fields go first, the file last: {"phone": ..., "base64": "data:...;base64,<chunks>"}
+        head = json_dumps(fields)[:-1]
+        if fields:
+            head += ", "
+        self.head = (head + json_dumps(field) + ': "data:' + mimetype + ';base64,').encode()
+        self.tail = b'"}'
+        self.size = self.__file_size()
+
+
+    def __sniff_image(self):
+        if self.path is not None:
+            with open(self.path, "rb") as f:
+                head = f.read(12)
+        else:
+            try:
+                start = self.file.tell()
+                head = self.file.read(12)
+                self.file.seek(start)
+            except (AttributeError, OSError, ValueError):
+                raise ValueError("Cannot detect the image format of a non-seekable file, set its mimetype") from None
+        mimetype = sniff_image_mimetype(head)
+        if mimetype is None:
+            raise ValueError("Unknown image format of the media %s, set its mimetype" % (self.name or "file"))
+        return mimetype
+
+
+    def __file_size(self):
+        if self.path is not None:
+            with open(self.path, "rb") as f:
+                return f.seek(0, SEEK_END)
+        try:
+            start = self.file.tell()
+            size = self.file.seek(0, SEEK_END) - start
+            self.file.seek(start)
+            self.start = start
+            return size
+        except (AttributeError, OSError, ValueError):
+            return None
+
+
+    @property
+    def length(self):
+        """
+        :Returns:
+            - Length of the encoded body in bytes, or None for non-seekable file objects.
+        """
+        if self.size is None:
+            return None
+        return len(self.head) + (self.size + 2) // 3 * 4 + len(self.tail)
+
+
+    def __len__(self):
+        # used by requests for the Content-Length; bodies of unknown length are sent as a generator
+        return self.length or 0
+
+
+    def __iter__(self):
+        yield self.head
+
+        if self.path is not None:
+            with self.__read(open, self.path, "rb") as f:
+                yield from self.__encode(f)
+        else:
+            if self.size is not None:
+                self.__read(self.file.seek, self.start)
+            yield from self.__encode(self.file)
+
+        yield self.tail
+
+
+    def __read(self, call, *args):
+        try:
+            return call(*args)
+        except OSError as e:
+            raise MediaReadError(self.name, e) from e
+
+
+    def __encode(self, f):
+        buffer = bytearray(self.chunk_size)
+        view = memoryview(buffer)
+        pending = b""
+        while True:
+            read = self.__read(f.readinto, view) if hasattr(f, "readinto") else None
+            if read is None:
+                data = self.__read(f.read, self.chunk_size)
+                read = len(data)
+                view[:read] = data
+            if not read:
+                break
+
+            chunk = view[:read]
+            if pending:
+                chunk = pending + bytes(chunk)
+                pending = b""
+            # short reads may break the multiple of 3, keep the remainder for the next chunk
+            extra = len(chunk) % 3
+            if extra:
+                pending = bytes(chunk[-extra:])
+                chunk = chunk[:-extra]
+            if chunk:
+                yield b2a_base64(chunk, newline=False)
+
+        if pending:
+            yield b2a_base64(pending, newline=False)
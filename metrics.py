@@ -0,0 +1,217 @@
+# Description: Request metrics of the Client (latency, sizes, status codes, errors, in-flight)
+#              with hooks for tracing and the Prometheus text exposition format.
+
+import logging
+from bisect import bisect_left
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from threading import Lock, Thread
+from time import perf_counter
+
+
+# Upper bounds, in seconds, of the latency histogram buckets.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+logger = logging.getLogger(__name__)
+
+
+def body_size(data):
+    if data is None:
+        return 0
+    if isinstance(data, (bytes, bytearray, str)):
+        return len(data)
+    return getattr(data, "length", None) or 0
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metrics:
+
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, prefix="wppconnect"):
+        """
+        Collects the metrics of every request of the Clients it is given to,
+        labelled by endpoint, session and node (the API URL, or the SessionPool node).
+
+        :Args:
+            - buckets (tuple) - Upper bounds in seconds of the latency histogram.
+            - prefix (str) - Prefix of the exported metric names.
+        """
+        self.buckets = tuple(buckets)
+        self.prefix = prefix
+        self.lock = Lock()
+        # labels -> [count, sum, request bytes, response bytes, bucket counts...]
+        self.requests = {}
+        self.statuses = {}
+        self.errors = {}
+        self.in_flight = {}
+        self.before_hooks = []
+        self.after_hooks = []
+
+
+    def add_hook(self, before=None, after=None):
+        """
+        Register tracing hooks. Both receive the same dict for a request: ``before`` gets
+        endpoint, session, node, method and url; ``after`` also gets status, elapsed
+        (seconds), response_bytes and error. Hooks can keep state (e.g. a span) in the dict.
+        An exception of a hook is logged, it does not fail the request.
+        """
+        if before is not None:
+            self.before_hooks.append(before)
+        if after is not None:
+            self.after_hooks.append(after)
+
+
+    @staticmethod
+    def labels(client, endpoint):
+        return (endpoint, client.session, getattr(client, "node", None) or client.api["URL"])
+
+
+    def before(self, client, endpoint, method, url, data):
+        """
+        Called by the Client before a request. Returns the state given to ``after``.
+        """
+        labels = self.labels(client, endpoint)
+        with self.lock:
+            self.in_flight[labels] = self.in_flight.get(labels, 0) + 1
+
+        event = None
+        if self.before_hooks or self.after_hooks:
+            event = {"endpoint": endpoint, "session": labels[1], "node": labels[2], "method": method, "url": url}
+            self.__run_hooks(self.before_hooks, event)
+        return labels, body_size(data), event, perf_counter()
+
+
+    def after(self, state, status, response_bytes, error=None):
+        """
+        Called by the Client when a request completed or failed.
+        """
+        elapsed = perf_counter() - state[3]
+        labels, request_bytes, event = state[0], state[1], state[2]
+
+        with self.lock:
+            self.in_flight[labels] -= 1
+            entry = self.requests.get(labels)
+            if entry is None:
+                entry = self.requests[labels] = [0, 0.0, 0, 0] + [0] * (len(self.buckets) + 1)
+            entry[0] += 1
+            entry[1] += elapsed
+            entry[2] += request_bytes
+            entry[3] += response_bytes
+            entry[4 + bisect_left(self.buckets, elapsed)] += 1
+            if status is not None:
+                key = labels + (status,)
+                self.statuses[key] = self.statuses.get(key, 0) + 1
+            if error is not None:
+                key = labels + (error if isinstance(error, str) else type(error).__name__,)
+                self.errors[key] = self.errors.get(key, 0) + 1
+
+        if event is not None:
+            event.update(status=status, elapsed=elapsed, response_bytes=response_bytes, error=error)
+            self.__run_hooks(self.after_hooks, event)
+
+
+    @staticmethod
+    def __run_hooks(hooks, event):
+        for hook in hooks:
+            try:
+                hook(event)
+            except Exception:
+                logger.exception("Metrics hook %r failed on %s", hook, event["endpoint"])
+
+
+    def error(self, client, endpoint, error):
+        """
+        Count an error detected after the request completed (e.g. an undecodable body).
+        """
+        key = self.labels(client, endpoint) + (error,)
+        with self.lock:
+            self.errors[key] = self.errors.get(key, 0) + 1
+
+
+    def reset(self):
+        with self.lock:
+            self.requests.clear()
+            self.statuses.clear()
+            self.errors.clear()
+
+
+    def render(self):
+        """
+        :Returns:
+            - The metrics in the Prometheus text exposition format.
+        """
+        with self.lock:
+            requests = {labels: list(entry) for labels, entry in self.requests.items()}
+            statuses = dict(self.statuses)
+            errors = dict(self.errors)
+            in_flight = dict(self.in_flight)
+
+        name = self.prefix
+        lines = []
+
+        def label_text(labels, *extra):
+            pairs = zip(("endpoint", "session", "node") + tuple(key for key, _ in extra), labels + tuple(value for _, value in extra))
+            return "{" + ",".join('%s="%s"' % (key, escape(value)) for key, value in pairs) + "}"
+
+        lines.append("# HELP %s_request_duration_seconds Latency of the requests to WPPConnect server." % name)
+        lines.append("# TYPE %s_request_duration_seconds histogram" % name)
+        for labels, entry in sorted(requests.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), entry[4:]):
+                cumulative += count
+                lines.append("%s_request_duration_seconds_bucket%s %d" % (name, label_text(labels, ("le", bound)), cumulative))
+            lines.append("%s_request_duration_seconds_sum%s %r" % (name, label_text(labels), entry[1]))
+            lines.append("%s_request_duration_seconds_count%s %d" % (name, label_text(labels), entry[0]))
+
+        for metric, index, help in (("request_bytes", 2, "Bytes sent in request bodies."), ("response_bytes", 3, "Bytes received in response bodies.")):
+            lines.append("# HELP %s_%s_total %s" % (name, metric, help))
+            lines.append("# TYPE %s_%s_total counter" % (name, metric))
+            for labels, entry in sorted(requests.items()):
+                lines.append("%s_%s_total%s %d" % (name, metric, label_text(labels), entry[index]))
+
+        lines.append("# HELP %s_responses_total Responses by HTTP status code." % name)
+        lines.append("# TYPE %s_responses_total counter" % name)
+        for key, count in sorted(statuses.items()):
+            lines.append("%s_responses_total%s %d" % (name, label_text(key[:3], ("code", key[3])), count))
+
+        lines.append("# HELP %s_errors_total Failed requests by error type." % name)
+        lines.append("# TYPE %s_errors_total counter" % name)
+        for key, count in sorted(errors.items()):
+            lines.append("%s_errors_total%s %d" % (name, label_text(key[:3], ("error", key[3])), count))
+
+        lines.append("# HELP %s_requests_in_flight Requests waiting for a response." % name)
+        lines.append("# TYPE %s_requests_in_flight gauge" % name)
+        for labels, count in sorted(in_flight.items()):
+            lines.append("%s_requests_in_flight%s %d" % (name, label_text(labels), count))
+
+        return "\n".join(lines) + "\n"
+
+
+    def serve(self, port=9100, host="0.0.0.0"):
+        """
+        Serve ``render()`` over HTTP for Prometheus, from a daemon thread.
+
+        :Returns:
+            - The HTTP server; call its shutdown() method to stop it.
+        """
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                body = metrics.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        Thread(target=server.serve_forever, daemon=True).start()
+        return server
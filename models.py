@@ -0,0 +1,207 @@
+# Description: Memory-compact result models, decoded lazily from the JSON text of every item.
+
+from sys import intern
+from .codec import default_codec
+from .stream import JSONArrayStream, StreamError
+from .utils import serialized_id
+
+
+_codec = default_codec()
+
+
+def interned_id(value):
+    if not value:
+        return None
+    return intern(serialized_id(value))
+
+
+def interned(value):
+    return intern(value) if isinstance(value, str) else value
+
+
+def count(value):
+    return len(value) if isinstance(value, list) else 0
+
+
+class Field:
+    """
+    Attribute of a Model read from the key ``key`` (or a path of keys) of its JSON object.
+    """
+
+    __slots__ = ("path", "convert", "index")
+
+
+    def __init__(self, key, convert=None):
+        self.path = key if isinstance(key, tuple) else (key,)
+        self.convert = convert
+        self.index = None
+
+
+    def read(self, data):
+        for key in self.path:
+            if not isinstance(data, dict):
+                return None
+            data = data.get(key)
+        if self.convert is not None:
+            return self.convert(data)
+        return data
+
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        values = instance._values
+        if values is None:
+            values = instance._load()
+        return values[self.index]
+
+
+class Model:
+    """
+    Result item holding only its JSON text (bytes) until a field is read; the first read
+    decodes the declared fields, all at once, into a tuple and the decoded object is dropped.
+
+    The raw dict stays available: ``item["key"]``, ``item.get("key")`` and ``item.to_dict()``
+    decode the JSON text again on every call. Decoding uses the codec of the Client that
+    received the item.
+    """
+
+    __slots__ = ("_json", "_values", "_codec")
+    _fields = ()
+
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        fields = list(cls._fields)
+        for value in vars(cls).values():
+            if isinstance(value, Field) and value not in fields:
+                value.index = len(fields)
+                fields.append(value)
+        cls._fields = tuple(fields)
+
+
+    def __init__(self, json, codec=None):
+        self._json = json
+        self._values = None
+        self._codec = codec or _codec
+
+
+    def _load(self):
+        data = self._codec.loads(self._json)
+        values = self._values = tuple(field.read(data) for field in self._fields)
+        return values
+
+
+    @property
+    def json(self):
+        """
+        :Returns:
+            - The JSON text of the item, as received.
+        """
+        return self._json
+
+
+    def to_dict(self):
+        return self._codec.loads(self._json)
+
+
+    def __getitem__(self, key):
+        return self.to_dict()[key]
+
+
+    def get(self, key, default=None):
+        return self.to_dict().get(key, default)
+
+
+    def __eq__(self, other):
+        return type(other) is type(self) and other._json == self._json
+
+
+    def __hash__(self):
+        return hash(self._json)
+
+
+    def __repr__(self):
+        return "%s(%r)" % (type(self).__name__, self.id)
+
+
+class Chat(Model):
+
+    __slots__ = ()
+
+    id = Field("id", interned_id)
+    name = Field("name")
+    is_group = Field("isGroup", bool)
+    timestamp = Field("t")
+    unread_count = Field("unreadCount")
+    archived = Field("archive", bool)
+    pinned = Field("pin", bool)
+    mute_expiration = Field("muteExpiration")
+
+
+class Group(Chat):
+
+    __slots__ = ()
+
+    owner = Field(("groupMetadata", "owner"), interned_id)
+    description = Field(("groupMetadata", "desc"))
+    participant_count = Field(("groupMetadata", "participants"), count)
+
+
+class Contact(Model):
+
+    __slots__ = ()
+
+    id = Field("id", interned_id)
+    name = Field("name")
+    push_name = Field("pushname")
+    short_name = Field("shortName")
+    is_my_contact = Field("isMyContact", bool)
+    is_business = Field("isBusiness", bool)
+    is_group = Field("isGroup", bool)
+
+
+class Message(Model):
+
+    __slots__ = ()
+
+    id = Field("id", interned_id)
+    type = Field("type", interned)
+    body = Field("body")
+    timestamp = Field("t")
+    sender = Field("from", interned_id)
+    to = Field("to", interned_id)
+    author = Field("author", interned_id)
+    chat_id = Field("chatId", interned_id)
+    ack = Field("ack")
+    from_me = Field("fromMe", bool)
+    is_group_msg = Field("isGroupMsg", bool)
+
+
+class Participant(Model):
+
+    __slots__ = ()
+
+    id = Field("id", interned_id)
+    is_admin = Field("isAdmin", bool)
+    is_super_admin = Field("isSuperAdmin", bool)
+
+
+def parse_models(content, model, codec=None):
+    """
+    Splits a response body into the JSON text of the items of its "response" array.
+    The models decode their item with ``codec``, the default codec if None.
+
+    :Returns:
+        - The response with its "response" array as a list of ``model``, or the decoded
+          error response (e.g. {"status": "error", "message": ...}) if it has no array.
+    """
+    parser = JSONArrayStream("response", raw=True)
+    try:
+        items = parser.feed(content)
+        items += parser.close()
+    except StreamError as e:
+        return e.envelope or False
+    envelope = parser.envelope
+    envelope["response"] = [model(item.encode(), codec) for item in items]
+    return envelope
@@ -0,0 +1,578 @@
+# Description: Durable outbound queue with priority classes and fair per-chat scheduling.
+
+import logging
+import sqlite3
+from collections import OrderedDict, deque
+from hashlib import sha256
+from json import dumps as json_dumps, loads as json_loads
+from threading import Condition, Event, Lock, Thread
+from time import time
+from weakref import WeakKeyDictionary
+from .bulk import BulkResult, session_bucket, _split_job
+from .utils import is_success
+from .resilience import CircuitOpenError
+from .templates import MessageTemplate
+from .transport import is_transient_error
+
+
+logger = logging.getLogger(__name__)
+
+
+# Priority classes, served strictly in this order.
+INTERACTIVE = 0
+TRANSACTIONAL = 1
+BULK = 2
+PRIORITIES = (INTERACTIVE, TRANSACTIONAL, BULK)
+
+# Job states. In-flight jobs are only tracked in memory: after a restart they are pending again.
+PENDING = 0
+DONE = 1
+FAILED = 2
+
+# Job argument standing for a MessageTemplate stored once in the templates table.
+TEMPLATE_KEY = "$template"
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    chat TEXT NOT NULL,
+    method TEXT NOT NULL,
+    kwargs TEXT NOT NULL,
+    state INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL,
+    updated_at REAL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (session, state, priority, id);
+CREATE INDEX IF NOT EXISTS jobs_chat ON jobs (session, state, priority, chat, id);
+CREATE TABLE IF NOT EXISTS templates (
+    key TEXT PRIMARY KEY,
+    endpoint TEXT NOT NULL,
+    shared INTEGER NOT NULL,
+    body BLOB NOT NULL
+);
+"""
+
+
+class Outbox:
+
+
+    def __init__(self, path, prefetch=1000, chat_prefetch=10):
+        """
+        Outbound queue spooled to SQLite (WAL).
+
+        Jobs are Client calls such as ``send_message(phone, message=...)`` queued for a session
+        with a priority class: INTERACTIVE, TRANSACTIONAL or BULK. A drain worker per session
+        (``start``) sends them, always the highest class first and round-robin across the chats
+        of a class, one job in flight per chat so messages to a chat keep their order.
+        A job leaves the queue only once it was sent, so after a restart the queue resumes
+        where it stopped; a job in flight when the process died is sent again.
+
+        Job arguments are stored as JSON, except MessageTemplate ones: a template is stored once,
+        keyed by the hash of its content, and jobs refer to it, e.g.
+        ``outbox.put_many(session, "send_template", phones, template=MessageTemplate.file(...))``.
+
+        :Args:
+            - path (str) - SQLite database file.
+            - prefetch (int) - Jobs of each class and session held in memory.
+            - chat_prefetch (int) - Jobs of each chat held in memory. The jobs of a chat with more are
+                                    read apart, so a chat with a long backlog does not fill the memory
+                                    window and starve the chats queued after it.
+        """
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        self.lock = Lock()
+        self.prefetch = prefetch
+        self.chat_prefetch = max(1, chat_prefetch)
+        self.templates = {}
+        self.template_keys = WeakKeyDictionary()
+        self.drainers = {}
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+    def close(self):
+        """
+        Stop the drain workers and close the database. Pending jobs stay in the spool.
+        """
+        self.stop()
+        self.db.close()
+
+
+    def put(self, session, method, chat, priority=TRANSACTIONAL, **kwargs):
+        """
+        Queue one call of ``client.<method>(chat, **kwargs)``.
+
+        Example: ``outbox.put("customer-42", "send_message", phone, INTERACTIVE, message="Hi")``
+
+        :Returns:
+            - Id of the job.
+        """
+        if priority not in PRIORITIES:
+            raise ValueError("Unknown priority %r" % (priority,))
+        with self.lock:
+            job_id = self.db.execute(
+                "INSERT INTO jobs (session, priority, chat, method, kwargs, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (session, priority, chat, method, self.__dumps(kwargs), time()),
+            ).lastrowid
+        self.__notify(session, priority)
+        return job_id
+
+
+    def put_many(self, session, method, jobs, priority=BULK, **kwargs):
+        """
+        Queue one call per job in a single transaction, e.g. a broadcast.
+
+        :Args:
+            - jobs (iterable) - Chats (phone) or (phone, kwargs) tuples, like BulkSender.
+            - kwargs - Arguments shared by every call. Example: message="Hello"
+
+        :Returns:
+            - Number of jobs queued.
+        """
+        if priority not in PRIORITIES:
+            raise ValueError("Unknown priority %r" % (priority,))
+        now = time()
+
+        def rows():
+            for job in jobs:
+                chat, extra = _split_job(job)
+                yield session, priority, chat, method, self.__dumps({**shared, **extra}), now
+
+        with self.lock:
+            shared = self.__templates_to_keys(kwargs)
+            before = self.db.total_changes
+            self.db.execute("BEGIN")
+            try:
+                self.db.executemany("INSERT INTO jobs (session, priority, chat, method, kwargs, created_at) VALUES (?, ?, ?, ?, ?, ?)", rows())
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+            count = self.db.total_changes - before
+        self.__notify(session, priority)
+        return count
+
+
+    def start(self, client, concurrency=4, rate=None, on_result=None, retry_delay=5.0, max_attempts=10):
+        """
+        Start the drain worker of the client's session.
+
+        :Args:
+            - client (Client) - Client of the session.
+            - concurrency (int) - Jobs in flight. With more than one, BULK jobs leave one free for the other classes.
+            - rate (float) - Maximum jobs per second of the session, None for no limit.
+            - on_result (callable) - Called with (job id, BulkResult) after every attempt.
+            - retry_delay (float) - Seconds a worker pauses after a transient error (server unreachable, circuit open).
+            - max_attempts (int) - Attempts of a job failing with transport errors before it is marked failed.
+                                   Jobs held back by an open circuit are not sent, so they do not count.
+        """
+        with self.lock:
+            if client.session in self.drainers:
+                raise ValueError("The session %s is already drained" % client.session)
+            drainer = self.drainers[client.session] = _Drainer(self, client, concurrency, rate, on_result, retry_delay, max_attempts)
+        drainer.start()
+        return drainer
+
+
+    def stop(self, session=None):
+        """
+        Stop the drain workers, of one session or of all. Jobs in flight are completed first.
+        """
+        with self.lock:
+            sessions = [session] if session is not None else list(self.drainers)
+            drainers = [self.drainers.pop(name) for name in sessions if name in self.drainers]
+        for drainer in drainers:
+            drainer.stop()
+
+
+    def counts(self, session=None):
+        """
+        :Returns:
+            - dict of (state name, priority) to number of jobs.
+        """
+        names = {PENDING: "pending", DONE: "done", FAILED: "failed"}
+        query = "SELECT state, priority, COUNT(*) FROM jobs"
+        params = ()
+        if session is not None:
+            query += " WHERE session = ?"
+            params = (session,)
+        with self.lock:
+            rows = self.db.execute(query + " GROUP BY state, priority", params).fetchall()
+        return {(names[state], priority): count for state, priority, count in rows}
+
+
+    def failed(self, session=None, limit=100):
+        """
+        :Returns:
+            - List of (id, session, chat, method, kwargs, attempts, error) of the failed jobs.
+        """
+        query = "SELECT id, session, chat, method, kwargs, attempts, error FROM jobs WHERE state = ?"
+        params = [FAILED]
+        if session is not None:
+            query += " AND session = ?"
+            params.append(session)
+        query += " ORDER BY id LIMIT ?"
+        params.append(limit)
+        with self.lock:
+            rows = self.db.execute(query, params).fetchall()
+        return [(row[0], row[1], row[2], row[3], json_loads(row[4]), row[5], row[6]) for row in rows]
+
+
+    def retry_failed(self, session=None):
+        """
+        Queue the failed jobs again, with their attempts counted from zero.
+
+        :Returns:
+            - Number of jobs queued again.
+        """
+        query = "UPDATE jobs SET state = ?, attempts = 0, error = NULL WHERE state = ?"
+        params = [PENDING, FAILED]
+        if session is not None:
+            query += " AND session = ?"
+            params.append(session)
+        with self.lock:
+            count = self.db.execute(query, params).rowcount
+            drainers = list(self.drainers.values()) if session is None else [self.drainers.get(session)]
+        for drainer in drainers:
+            if drainer is not None:
+                drainer.reload()
+        return count
+
+
+    def purge(self, before=None):
+        """
+        Delete the sent jobs, optionally only the ones sent before a timestamp.
+
+        :Returns:
+            - Number of jobs deleted.
+        """
+        query = "DELETE FROM jobs WHERE state = ?"
+        params = [DONE]
+        if before is not None:
+            query += " AND updated_at < ?"
+            params.append(before)
+        with self.lock:
+            count = self.db.execute(query, params).rowcount
+            # templates no job refers to anymore
+            self.db.execute(
+                "DELETE FROM templates WHERE NOT EXISTS (SELECT 1 FROM jobs WHERE instr(jobs.kwargs, templates.key) > 0)"
+            )
+            return count
+
+
+    def _arguments(self, kwargs):
+        """
+        :Returns:
+            - The arguments of a job, its templates loaded.
+        """
+        arguments = json_loads(kwargs)
+        for name, value in arguments.items():
+            if isinstance(value, dict) and TEMPLATE_KEY in value:
+                arguments[name] = self.__template(value[TEMPLATE_KEY])
+        return arguments
+
+
+    def _load(self, session, priority, after, limit):
+        with self.lock:
+            return self.db.execute(
+                "SELECT id, chat, method, kwargs FROM jobs WHERE session = ? AND state = ? AND priority = ? AND id > ? ORDER BY id LIMIT ?",
+                (session, PENDING, priority, after, limit),
+            ).fetchall()
+
+
+    def _load_chat(self, session, priority, chat, after, until, limit):
+        with self.lock:
+            return self.db.execute(
+                "SELECT id, chat, method, kwargs FROM jobs WHERE session = ? AND state = ? AND priority = ? AND chat = ? AND id > ? AND id <= ? "
+                "ORDER BY id LIMIT ?",
+                (session, PENDING, priority, chat, after, until, limit),
+            ).fetchall()
+
+
+    def _postpone(self, job_id, error, max_attempts):
+        """
+        Count a failed attempt of a job that stays pending.
+
+        :Returns:
+            - False, without counting it, if it was the last attempt allowed.
+        """
+        with self.lock:
+            attempts = self.db.execute("SELECT attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]
+            if attempts + 1 >= max_attempts:
+                return False
+            self.db.execute("UPDATE jobs SET attempts = attempts + 1, updated_at = ?, error = ? WHERE id = ?", (time(), error, job_id))
+            return True
+
+
+    def _finish(self, job_id, state, error=None):
+        with self.lock:
+            self.db.execute("UPDATE jobs SET state = ?, attempts = attempts + 1, updated_at = ?, error = ? WHERE id = ?", (state, time(), error, job_id))
+
+
+    def __dumps(self, kwargs):
+        return json_dumps(self.__templates_to_keys(kwargs))
+
+
+    def __templates_to_keys(self, kwargs):
+        """
+        Stores the MessageTemplate arguments and replaces them with their key. Called with the lock held.
+        """
+        if not any(isinstance(value, MessageTemplate) for value in kwargs.values()):
+            return kwargs
+        kwargs = dict(kwargs)
+        for name, value in kwargs.items():
+            if not isinstance(value, MessageTemplate):
+                continue
+            key = self.template_keys.get(value)
+            if key is None:
+                body = value.encoded()
+                key = sha256(b"%s\0%d\0%s" % (value.endpoint.encode(), value.shared, body)).hexdigest()
+                self.db.execute("INSERT OR IGNORE INTO templates VALUES (?, ?, ?, ?)", (key, value.endpoint, int(value.shared), body))
+                self.template_keys[value] = key
+            kwargs[name] = {TEMPLATE_KEY: key}
+        return kwargs
+
+
+    def __template(self, key):
+        template = self.templates.get(key)
+        if template is None:
+            with self.lock:
+                row = self.db.execute("SELECT endpoint, shared, body FROM templates WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                raise LookupError("The template %s of the job is not in the spool" % key)
+            template = self.templates[key] = MessageTemplate.from_encoded(row[0], row[2], bool(row[1]))
+        return template
+
+
+    def __notify(self, session, priority):
+        drainer = self.drainers.get(session)
+        if drainer is not None:
+            drainer.notify(priority)
+
+
+class _Drainer:
+
+
+    def __init__(self, outbox, client, concurrency, rate, on_result, retry_delay, max_attempts):
+        """
+        Drain worker of one session: ``concurrency`` threads sharing an in-memory window
+        of the spool. Every class holds an OrderedDict of chat -> deque of jobs, rotated
+        after each pick for round-robin fairness.
+
+        The window is read from the spool in id order, at most ``chat_prefetch`` jobs per
+        chat. The next jobs of a chat that reached it ("capped") are skipped by that scan
+        and read with a query of their own, from the last one loaded up to the scan cursor.
+        """
+        self.outbox = outbox
+        self.client = client
+        self.session = client.session
+        self.concurrency = concurrency
+        self.bucket = session_bucket(client, rate) if rate else None
+        self.on_result = on_result
+        self.retry_delay = retry_delay
+        self.max_attempts = max_attempts
+        self.condition = Condition()
+        self.stopping = Event()
+        self.threads = []
+        self.busy = set()
+        self.in_flight = {}
+        self.bulk_in_flight = 0
+        self.reload()
+
+
+    def reload(self):
+        """
+        Drop the in-memory window and read the spool again. Jobs in flight are kept and not loaded twice.
+        """
+        with self.condition:
+            self.queues = [OrderedDict() for _ in PRIORITIES]
+            self.sizes = [0 for _ in PRIORITIES]
+            self.loaded = [0 for _ in PRIORITIES]
+            # capped chats -> id of their last job loaded
+            self.capped = [{} for _ in PRIORITIES]
+            self.dirty = [True for _ in PRIORITIES]
+            self.condition.notify_all()
+
+
+    def start(self):
+        for i in range(self.concurrency):
+            thread = Thread(target=self.__run, name="outbox-%s-%d" % (self.session, i), daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+
+    def stop(self):
+        self.stopping.set()
+        with self.condition:
+            self.condition.notify_all()
+        for thread in self.threads:
+            thread.join()
+
+
+    def notify(self, priority):
+        with self.condition:
+            self.dirty[priority] = True
+            self.condition.notify()
+
+
+    def __refill(self, priority):
+        room = self.outbox.prefetch - self.sizes[priority]
+        if room <= 0:
+            return
+        queue = self.queues[priority]
+        capped = self.capped[priority]
+        cap = self.outbox.chat_prefetch
+        added = 0
+
+        # capped chats whose share is half used: their next jobs, up to the scan cursor
+        for chat, after in list(capped.items()):
+            jobs = queue.get(chat)
+            want = min(cap - (len(jobs) if jobs else 0), room - added)
+            if want * 2 < cap:
+                continue
+            rows = self.outbox._load_chat(self.session, priority, chat, after, self.loaded[priority], want)
+            for row in rows:
+                added += self.__push(queue, priority, row)
+            if len(rows) < want:
+                # the rest of the chat is after the cursor, left to the scan
+                del capped[chat]
+            else:
+                capped[chat] = rows[-1][0]
+
+        # the scan, in id order; bounded so a long run of capped chats is skipped over a few refills
+        exhausted = False
+        scanned = 0
+        while added < room and scanned < 10 * self.outbox.prefetch:
+            limit = room - added
+            rows = self.outbox._load(self.session, priority, self.loaded[priority], limit)
+            scanned += len(rows)
+            for row in rows:
+                chat = row[1]
+                if chat in capped:
+                    continue
+                jobs = queue.get(chat)
+                if jobs is not None and len(jobs) >= cap:
+                    capped[chat] = jobs[-1][0]
+                    continue
+                added += self.__push(queue, priority, row)
+            if rows:
+                self.loaded[priority] = rows[-1][0]
+            if len(rows) < limit:
+                exhausted = True
+                break
+
+        self.sizes[priority] += added
+        # more jobs are waiting in the spool
+        self.dirty[priority] = not exhausted or bool(capped)
+
+
+    def __push(self, queue, priority, row):
+        """
+        Appends a job read from the spool to its chat.
+
+        :Returns:
+            - 1, or 0 if the job is in flight (it was read again after a reload).
+        """
+        job_id, chat, method, kwargs = row
+        if job_id in self.in_flight:
+            return 0
+        jobs = queue.get(chat)
+        if jobs is None:
+            jobs = queue[chat] = deque()
+        jobs.append((job_id, priority, chat, method, kwargs))
+        return 1
+
+
+    def __next_job(self):
+        for priority in PRIORITIES:
+            if priority == BULK and self.concurrency > 1 and self.bulk_in_flight >= self.concurrency - 1:
+                continue
+            if self.dirty[priority] and self.sizes[priority] <= self.outbox.prefetch // 2:
+                self.__refill(priority)
+
+            queue = self.queues[priority]
+            for chat, jobs in queue.items():
+                if chat in self.busy:
+                    continue
+                job = jobs.popleft()
+                if jobs:
+                    queue.move_to_end(chat)
+                else:
+                    del queue[chat]
+                self.sizes[priority] -= 1
+                self.busy.add(chat)
+                self.in_flight[job[0]] = job
+                if priority == BULK:
+                    self.bulk_in_flight += 1
+                return job
+        return None
+
+
+    def __release(self, job, requeue=False):
+        job_id, priority, chat = job[0], job[1], job[2]
+        with self.condition:
+            del self.in_flight[job_id]
+            self.busy.discard(chat)
+            if priority == BULK:
+                self.bulk_in_flight -= 1
+            if requeue:
+                queue = self.queues[priority]
+                jobs = queue.get(chat)
+                if jobs is None:
+                    jobs = queue[chat] = deque()
+                jobs.appendleft(job)
+                queue.move_to_end(chat, last=False)
+                self.sizes[priority] += 1
+            self.condition.notify_all()
+
+
+    def __run(self):
+        while not self.stopping.is_set():
+            with self.condition:
+                job = self.__next_job()
+                while job is None and not self.stopping.is_set():
+                    self.condition.wait(1.0)
+                    job = self.__next_job()
+            if job is None:
+                return
+
+            if self.bucket:
+                self.bucket.acquire()
+            job_id, priority, chat, method, kwargs = job
+            try:
+                response = getattr(self.client, method)(chat, **self.outbox._arguments(kwargs))
+            except Exception as e:
+                # the server is unreachable, not the job at fault: keep it first in line and pause.
+                # Any other error (e.g. a missing media file) fails the same way every time.
+                if isinstance(e, CircuitOpenError) or (is_transient_error(e) and self.outbox._postpone(job_id, repr(e)[:1000], self.max_attempts)):
+                    logger.warning("Outbox %s: job %d postponed: %r", self.session, job_id, e)
+                    self.__release(job, requeue=True)
+                    self.stopping.wait(self.retry_delay)
+                    continue
+                result = BulkResult(chat, False, None, e)
+            else:
+                ok = is_success(response)
+                result = BulkResult(chat, ok, response, None if ok else response)
+
+            try:
+                self.outbox._finish(job_id, DONE if result.ok else FAILED, None if result.ok else repr(result.error)[:1000])
+            finally:
+                self.__release(job)
+            if self.on_result is not None:
+                try:
+                    self.on_result(job_id, result)
+                except Exception:
+                    logger.exception("Outbox %s: on_result failed", self.session)
@@ -0,0 +1,240 @@
+# Description: Many sessions spread across many WPPConnect server nodes, with consistent hashing.
+
+from bisect import bisect, insort
+from hashlib import md5
+from threading import RLock
+from .client import Client
+from .resilience import CircuitBreaker
+from .transport import default_transport, DEFAULT_POOL_SIZE, DEFAULT_TIMEOUT
+
+
+class HashRing:
+
+
+    def __init__(self, replicas=128):
+        """
+        Consistent hash ring. Adding or removing a node only moves the keys that
+        hash next to its virtual points, about 1/N of the keys.
+
+        :Args:
+            - replicas (int) - Virtual points per node.
+        """
+        self.replicas = replicas
+        self.points = []
+        self.owners = {}
+
+
+    @staticmethod
+    def hash(key):
+        return int.from_bytes(md5(key.encode()).digest()[:8], "big")
+
+
+    def add(self, node):
+        for i in range(self.replicas):
+            point = self.hash("%s#%d" % (node, i))
+            if point not in self.owners:
+                self.owners[point] = node
+                insort(self.points, point)
+
+
+    def remove(self, node):
+        self.points = [point for point in self.points if self.owners[point] != node]
+        self.owners = {point: owner for point, owner in self.owners.items() if owner != node}
+
+
+    def get(self, key):
+        if not self.points:
+            raise LookupError("The hash ring has no nodes")
+        index = bisect(self.points, self.hash(key)) % len(self.points)
+        return self.owners[self.points[index]]
+
+
+class SessionPool:
+
+
+    def __init__(self, nodes: dict, replicas=128, timeout=DEFAULT_TIMEOUT, pool_size=DEFAULT_POOL_SIZE, http2=False, cache=None, codec=None, metrics=None, policies=None, breaker_failures=None, breaker_reset=30.0, tokens=None):
+        """
+        Manages many sessions across many WPPConnect server nodes.
+
+        Every session is mapped to a node with consistent hashing and every node
+        has one connection pool shared by all of its sessions.
+
+        :Args:
+            - nodes (dict) - Node name to (api_url, secretKey). Example: {"node1": ("http://10.0.0.1:21465/api", "secret")}
+            - replicas (int) - Virtual points per node in the hash ring.
+            - timeout (float|tuple) - (connect, read) timeout in seconds of the node transports.
+            - pool_size (int) - Keep-alive connections of each node.
+            - http2 (bool) - Use HTTP/2 in the node transports.
+            - cache (ResponseCache) - Cache shared by the Clients of every session.
+            - codec (JSONCodec) - JSON codec of the Clients.
+            - metrics (Metrics) - Collector of the request metrics of every session.
+            - policies (dict) - RetryPolicy by endpoint name or HTTP method, applied to every session.
+            - breaker_failures (int) - Consecutive failures that open the circuit breaker of a node,
+                                       failing fast all of its sessions. None to disable the breakers.
+            - breaker_reset (float) - Seconds a node's circuit stays open before a trial request.
+            - tokens (TokenStore) - Store of the session tokens; sessions without a token set with
+                                    set_token load or generate theirs on their first request.
+        """
+        self.ring = HashRing(replicas)
+        self.nodes = {}
+        self.transports = {}
+        self.clients = {}
+        self.tokens = {}
+        self.pins = {}
+        self.cache = cache
+        self.codec = codec
+        self.metrics = metrics
+        self.policies = policies
+        self.token_store = tokens
+        self.breakers = {}
+        self.breaker_options = {"failures": breaker_failures, "reset_timeout": breaker_reset} if breaker_failures else None
+        self.transport_options = {"timeout": timeout, "pool_size": pool_size, "http2": http2}
+        self.lock = RLock()
+
+        for name, (api_url, secretKey) in nodes.items():
+            self.add_node(name, api_url, secretKey)
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+    def close(self):
+        """
+        Close the connection pools of every node.
+        """
+        with self.lock:
+            for transport in self.transports.values():
+                transport.close()
+            self.transports.clear()
+            self.clients.clear()
+
+
+    def add_node(self, name, api_url, secretKey):
+        """
+        Add a node to the pool. Only the sessions that now hash to it are moved.
+        Raises ValueError if a node of this name exists; drain it first to replace it.
+
+        :Returns:
+            - List of the known sessions that moved to the new node.
+        """
+        with self.lock:
+            if name in self.nodes:
+                raise ValueError("The node %s already exists" % name)
+            self.nodes[name] = (api_url, secretKey)
+            self.transports[name] = default_transport(**self.transport_options)
+            if self.breaker_options is not None:
+                self.breakers[name] = CircuitBreaker(name=name, **self.breaker_options)
+            self.ring.add(name)
+            return self.__rebalance()
+
+
+    def drain_node(self, name):
+        """
+        Remove a node from the pool. Only its sessions are moved to other nodes.
+        Raises KeyError for an unknown node and ValueError for the last node, before changing anything.
+
+        :Returns:
+            - List of the known sessions that moved away from the node.
+        """
+        with self.lock:
+            if name not in self.nodes:
+                raise KeyError(name)
+            if len(self.nodes) == 1:
+                raise ValueError("Cannot drain %s, the last node of the pool" % name)
+            self.ring.remove(name)
+            self.pins = {session: node for session, node in self.pins.items() if node != name}
+            moved = self.__rebalance()
+            del self.nodes[name]
+            self.transports.pop(name).close()
+            self.breakers.pop(name, None)
+            return moved
+
+
+    def pin(self, session, node):
+        """
+        Pin a session to a node, overriding the hash ring. Pass node=None to unpin.
+        """
+        with self.lock:
+            if node is None:
+                self.pins.pop(session, None)
+            else:
+                if node not in self.nodes:
+                    raise KeyError(node)
+                self.pins[session] = node
+            self.clients.pop(session, None)
+
+
+    def node_for(self, session):
+        """
+        :Returns:
+            - Name of the node serving the session.
+        """
+        node = self.pins.get(session)
+        if node is not None:
+            return node
+        return self.ring.get(session)
+
+
+    def set_token(self, session, token):
+        """
+        Set the Bearer token of a session. It is kept if the session moves to another node.
+        """
+        with self.lock:
+            self.tokens[session] = token
+            client = self.clients.get(session)
+            if client is not None:
+                client.set_token(token)
+
+
+    def session(self, session) -> Client:
+        """
+        Returns the Client of a session, bound to its node's shared connection pool.
+        Clients are cached, so this is cheap to call for every request.
+
+        Example: ``pool.session("customer-42").send_message(phone, "Hi")``
+        """
+        client = self.clients.get(session)
+        if client is not None:
+            return client
+
+        with self.lock:
+            client = self.clients.get(session)
+            if client is None:
+                node = self.node_for(session)
+                api_url, secretKey = self.nodes[node]
+                client = Client(api_url, secretKey, session, transport=self.transports[node], cache=self.cache, codec=self.codec, metrics=self.metrics,
+                                policies=self.policies, breaker=self.breakers.get(node), tokens=self.token_store)
+                client.node = node
+                token = self.tokens.get(session)
+                if token:
+                    client.set_token(token)
+                self.clients[session] = client
+            return client
+
+
+    __getitem__ = session
+
+
+    def sessions(self, node=None):
+        """
+        :Returns:
+            - List of the known sessions, optionally only the ones served by ``node``.
+        """
+        known = set(self.clients) | set(self.tokens)
+        if node is None:
+            return sorted(known)
+        return sorted(session for session in known if self.node_for(session) == node)
+
+
+    def __rebalance(self):
+        moved = []
+        for session, client in list(self.clients.items()):
+            if self.node_for(session) != client.node:
+                del self.clients[session]
+                moved.append(session)
+        return moved
@@ -0,0 +1,292 @@
+# Description: Debounced and coalesced typing, chat state and seen signals, sent in the background.
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from heapq import heappop, heappush
+from threading import Condition, Thread
+from time import monotonic
+from .utils import is_success
+
+
+logger = logging.getLogger(__name__)
+
+
+class _Chat:
+
+    __slots__ = ("client", "phone", "presence", "presence_due", "sent", "sent_at", "seen", "seen_at", "busy", "seq")
+
+
+    def __init__(self, client, phone):
+        self.client = client
+        self.phone = phone
+        # presence: (method, kwargs) waiting to be sent, and the last one sent
+        self.presence = None
+        self.presence_due = None
+        self.sent = None
+        self.sent_at = None
+        self.seen = False
+        self.seen_at = None
+        self.busy = False
+        self.seq = 0
+
+
+    def due(self, seen_window):
+        due = self.presence_due if self.presence is not None else None
+        if self.seen:
+            seen_due = self.seen_at + seen_window if self.seen_at is not None else 0.0
+            due = seen_due if due is None else min(due, seen_due)
+        return due
+
+
+class PresenceCoalescer:
+
+
+    def __init__(self, delay=0.5, seen_window=3.0, resend_after=20.0, workers=4):
+        """
+        Sends the typing, chat-state and send-seen requests of bots in the background,
+        with as few requests as possible.
+
+        The calls return at once. Per chat (session and phone):
+            - typing and chat_state are one presence: a change is sent ``delay`` seconds after
+              the first change not yet sent, with the last state asked for; states superseded
+              in the meantime are dropped, and a state equal to the last one sent is not sent
+              again before ``resend_after`` seconds (WhatsApp clears a stale typing state).
+            - send_seen is sent at once, then at most once per ``seen_window`` seconds: the calls
+              within the window collapse into one sent at its end.
+
+        Requests go through the Client of the call (and so its shared transport), one at a time
+        per chat to keep their order, on ``workers`` threads. The calls can be made from any
+        thread, or from a coroutine, but need a sync Client.
+
+        Example:
+            presence = PresenceCoalescer()
+            presence.typing(pool.session("bot"), phone, True)
+
+        :Args:
+            - delay (float) - Seconds a presence change waits for the changes that supersede it.
+            - seen_window (float) - Minimum seconds between two send-seen of a chat.
+            - resend_after (float) - Seconds after which a presence equal to the last one sent is sent again.
+            - workers (int) - Requests in flight.
+        """
+        self.delay = delay
+        self.seen_window = seen_window
+        self.resend_after = resend_after
+        self.condition = Condition()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="wppconnect-presence")
+        self.chats = {}
+        self.queue = []
+        self.seq = 0
+        self.in_flight = 0
+        self.running = True
+        self.calls = 0
+        self.sent = 0
+        self.superseded = 0
+        self.collapsed = 0
+        self.errors = 0
+        self.thread = Thread(target=self.__run, name="wppconnect-presence", daemon=True)
+        self.thread.start()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+    def typing(self, client, phone, value, isGroup=False):
+        """
+        Queue ``client.typing(phone, value, isGroup)``.
+        """
+        self.__presence(client, phone, ("typing", {"phone": phone, "value": value, "isGroup": isGroup}))
+
+
+    def chat_state(self, client, phone, chatstate):
+        """
+        Queue ``client.chat_state(phone, chatstate)``.
+        """
+        self.__presence(client, phone, ("chat_state", {"phone": phone, "chatstate": chatstate}))
+
+
+    def send_seen(self, client, phone):
+        """
+        Queue ``client.send_seen(phone)``.
+        """
+        with self.condition:
+            self.calls += 1
+            chat = self.__chat(client, phone)
+            if chat.seen:
+                self.collapsed += 1
+                return
+            chat.seen = True
+            self.__schedule(chat)
+
+
+    def cancel(self, client, phone):
+        """
+        Drop the presence not yet sent of a chat, e.g. right before sending it a message.
+        """
+        with self.condition:
+            chat = self.chats.get((client.session, phone))
+            if chat is not None and chat.presence is not None:
+                chat.presence = None
+                self.superseded += 1
+                self.__schedule(chat)
+
+
+    def flush(self, timeout=None):
+        """
+        Send everything queued now and wait for it.
+
+        :Returns:
+            - True if nothing is left to send, False on timeout.
+        """
+        deadline = monotonic() + timeout if timeout is not None else None
+        with self.condition:
+            for chat in self.chats.values():
+                if chat.presence is not None:
+                    chat.presence_due = 0.0
+                if chat.seen:
+                    chat.seen_at = None
+                self.__schedule(chat)
+            while self.in_flight or any(chat.presence is not None or chat.seen for chat in self.chats.values()):
+                remaining = deadline - monotonic() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.condition.wait(remaining)
+            return True
+
+
+    def close(self, flush=True):
+        """
+        Stop the background sender, after sending what is queued if ``flush``.
+        """
+        if flush:
+            self.flush()
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        self.thread.join()
+        self.executor.shutdown(wait=True)
+
+
+    def stats(self):
+        """
+        :Returns:
+            - dict with the calls received, the requests sent and the requests saved.
+        """
+        with self.condition:
+            return {
+                "calls": self.calls,
+                "sent": self.sent,
+                "saved": self.superseded + self.collapsed,
+                "superseded": self.superseded,
+                "collapsed": self.collapsed,
+                "errors": self.errors,
+                "chats": len(self.chats),
+            }
+
+
+    def __presence(self, client, phone, state):
+        with self.condition:
+            self.calls += 1
+            chat = self.__chat(client, phone)
+            if chat.presence is not None:
+                # the waiting state is replaced, its due time is kept
+                self.superseded += 1
+                chat.presence = state
+                return
+            chat.presence = state
+            chat.presence_due = monotonic() + self.delay
+            self.__schedule(chat)
+
+
+    def __chat(self, client, phone):
+        key = (client.session, phone)
+        chat = self.chats.get(key)
+        if chat is None:
+            chat = self.chats[key] = _Chat(client, phone)
+        else:
+            chat.client = client
+        return chat
+
+
+    def __schedule(self, chat):
+        if chat.busy:
+            # rescheduled when its request completes
+            return
+        self.seq += 1
+        chat.seq = self.seq
+        due = chat.due(self.seen_window)
+        if due is None:
+            due = monotonic() + max(self.resend_after, self.seen_window)
+        heappush(self.queue, (due, self.seq, (chat.client.session, chat.phone)))
+        self.condition.notify_all()
+
+
+    def __take(self, chat, now):
+        """
+        :Returns:
+            - The calls of a chat due at ``now``.
+        """
+        calls = []
+        if chat.seen and (chat.seen_at is None or chat.seen_at + self.seen_window <= now):
+            chat.seen = False
+            chat.seen_at = now
+            calls.append(("send_seen", {"phone": chat.phone}))
+        if chat.presence is not None and chat.presence_due <= now:
+            state, chat.presence = chat.presence, None
+            if state == chat.sent and now - chat.sent_at < self.resend_after:
+                self.superseded += 1
+            else:
+                chat.sent = state
+                chat.sent_at = now
+                calls.append(state)
+        return calls
+
+
+    def __run(self):
+        queue = self.queue
+        with self.condition:
+            while self.running:
+                now = monotonic()
+                while queue and queue[0][0] <= now:
+                    due, seq, key = heappop(queue)
+                    chat = self.chats.get(key)
+                    if chat is None or chat.seq != seq or chat.busy:
+                        continue
+                    calls = self.__take(chat, now)
+                    if calls:
+                        chat.busy = True
+                        self.in_flight += 1
+                        self.executor.submit(self.__send, chat, calls)
+                    elif chat.due(self.seen_window) is None and (chat.sent_at is None or now - chat.sent_at >= self.resend_after):
+                        # idle chat: forget it
+                        del self.chats[key]
+                    else:
+                        self.__schedule(chat)
+                self.condition.wait(queue[0][0] - now if queue else None)
+
+
+    def __send(self, chat, calls):
+        for method, kwargs in calls:
+            try:
+                response = getattr(chat.client, method)(**kwargs)
+                ok = is_success(response)
+                if not ok:
+                    logger.warning("Presence %s %s of %s failed: %r", method, chat.phone, chat.client.session, response)
+            except Exception as e:
+                ok = False
+                logger.warning("Presence %s %s of %s failed: %r", method, chat.phone, chat.client.session, e)
+            with self.condition:
+                self.sent += 1
+                if not ok:
+                    self.errors += 1
+                    if method != "send_seen":
+                        # not known to be delivered: the same state must not be dropped as a repeat
+                        chat.sent = None
+        with self.condition:
+            chat.busy = False
+            self.in_flight -= 1
+            self.__schedule(chat)
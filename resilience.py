@@ -0,0 +1,215 @@
+# Description: Retry, hedging and circuit breaking policies of the Client requests.
+
+from concurrent.futures import ThreadPoolExecutor
+from random import uniform
+from threading import Lock
+from time import monotonic
+from .transport import is_transient_error, is_connect_error
+
+
+# Statuses worth retrying on an idempotent request: the server (or its proxy) failed, not the request.
+RETRY_STATUSES = (500, 502, 503, 504)
+# Statuses counted as failures by the circuit breaker. Plain 500 is left out: WPPConnect server
+# also answers 500 to bad requests (e.g. an invalid number), which says nothing of its health.
+FAILURE_STATUSES = (502, 503, 504)
+
+
+class CircuitOpenError(Exception):
+
+
+    def __init__(self, name, retry_after):
+        super().__init__("Circuit breaker %s is open, retry in %.1fs" % (name, retry_after))
+        self.name = name
+        self.retry_after = retry_after
+
+
+class RetryPolicy:
+
+
+    def __init__(self, attempts=3, timeout=None, backoff=0.2, max_backoff=5.0, hedge=None, idempotent=True, statuses=RETRY_STATUSES):
+        """
+        How the requests of an endpoint are retried.
+
+        Idempotent requests are retried on transport errors and on ``statuses``. Other
+        requests (the sends) are only retried when they failed while connecting, as
+        they may have been delivered otherwise. Bodies that cannot be replayed (streamed
+        from a non-seekable file) are never retried.
+
+        :Args:
+            - attempts (int) - Maximum number of attempts, the first one included.
+            - timeout (float|tuple) - (connect, read) timeout in seconds of every attempt. Defaults to the transport's.
+            - backoff (float) - Base delay in seconds; attempt n waits a random delay up to backoff * 2**n.
+            - max_backoff (float) - Maximum delay in seconds between two attempts.
+            - hedge (float) - Seconds after which an idempotent request still waiting is sent a second time;
+                              the first response wins. None to disable.
+            - idempotent (bool) - If the request can be sent twice without side effects.
+            - statuses (tuple) - HTTP statuses retried on idempotent requests.
+        """
+        self.attempts = max(1, attempts)
+        self.timeout = timeout
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.hedge = hedge if idempotent else None
+        self.idempotent = idempotent
+        self.statuses = frozenset(statuses)
+
+
+    def delay(self, attempt):
+        """
+        :Returns:
+            - Seconds to wait before the attempt after ``attempt`` (counted from 1), with full jitter.
+        """
+        return uniform(0, min(self.max_backoff, self.backoff * 2 ** (attempt - 1)))
+
+
+    def retry_error(self, error, replayable):
+        if not replayable:
+            return False
+        if self.idempotent:
+            return is_transient_error(error)
+        return is_connect_error(error)
+
+
+    def retry_status(self, status):
+        return self.idempotent and status in self.statuses
+
+
+# A single attempt, used when a circuit breaker is set without a policy.
+SINGLE_ATTEMPT = RetryPolicy(attempts=1)
+
+
+# Recommended policies: reads are retried and the small ones get short timeouts,
+# sends are only retried when the server could not be reached.
+DEFAULT_POLICIES = {
+    "GET": RetryPolicy(attempts=3),
+    "POST": RetryPolicy(attempts=3, idempotent=False),
+    "status-session": RetryPolicy(attempts=3, timeout=(3, 10), hedge=1.0),
+    "check-connection-session": RetryPolicy(attempts=3, timeout=(3, 10), hedge=1.0),
+    "chat-is-online": RetryPolicy(attempts=3, timeout=(3, 10), hedge=1.0),
+    "check-number-status": RetryPolicy(attempts=3, timeout=(3, 15), hedge=2.0),
+    "profile-pic": RetryPolicy(attempts=3, timeout=(3, 15), hedge=2.0),
+    "get-battery-level": RetryPolicy(attempts=3, timeout=(3, 10)),
+    "group-info-from-invite-link": RetryPolicy(attempts=3),
+}
+
+
+def compile_policies(policies, endpoints):
+    """
+    Resolves the policy of every endpoint once: its own entry of ``policies``, else the
+    entry of its HTTP method ("GET", "POST").
+
+    :Returns:
+        - dict of endpoint name to RetryPolicy, without the endpoints left to a single attempt.
+    """
+    if not policies:
+        return {}
+    compiled = {}
+    for name, endpoint in endpoints.items():
+        policy = policies.get(name, policies.get(endpoint.method))
+        if policy is not None:
+            compiled[name] = policy
+    return compiled
+
+
+def is_replayable(data):
+    # bodies with a known length (Base64Body of a seekable file, SplicedBody) can be iterated again
+    return data is None or isinstance(data, (bytes, bytearray, str)) or getattr(data, "length", None) is not None
+
+
+class CircuitBreaker:
+
+
+    def __init__(self, failures=5, reset_timeout=30.0, name=None):
+        """
+        Fails fast while a WPPConnect server is down, instead of piling up blocked requests.
+
+        After ``failures`` consecutive failures (transport errors, 502/503/504) the circuit
+        opens and requests raise CircuitOpenError without being sent. After ``reset_timeout``
+        seconds one request is let through: its success closes the circuit, its failure
+        opens it again. Thread-safe; share one per node (SessionPool does).
+
+        :Args:
+            - failures (int) - Consecutive failures that open the circuit.
+            - reset_timeout (float) - Seconds the circuit stays open before a trial request.
+            - name (str) - Name in the error messages, e.g. the node.
+        """
+        self.failures = failures
+        self.reset_timeout = reset_timeout
+        self.name = name
+        self.lock = Lock()
+        self.count = 0
+        self.opened_at = None
+        self.probing = False
+
+
+    @property
+    def state(self):
+        with self.lock:
+            if self.opened_at is None:
+                return "closed"
+            if self.probing or monotonic() - self.opened_at >= self.reset_timeout:
+                return "half-open"
+            return "open"
+
+
+    def before(self):
+        """
+        Called before a request. Raises CircuitOpenError if it must not be sent.
+        """
+        if self.opened_at is None:
+            return
+        with self.lock:
+            if self.opened_at is None:
+                return
+            wait = self.opened_at + self.reset_timeout - monotonic()
+            if wait > 0 or self.probing:
+                raise CircuitOpenError(self.name, max(wait, 0.0))
+            self.probing = True
+
+
+    def record(self, status):
+        if status in FAILURE_STATUSES:
+            self.failure()
+        else:
+            self.success()
+
+
+    def success(self):
+        if self.count or self.opened_at is not None:
+            with self.lock:
+                self.count = 0
+                self.opened_at = None
+                self.probing = False
+
+
+    def failure(self):
+        with self.lock:
+            self.count += 1
+            if self.probing or self.count >= self.failures:
+                self.opened_at = monotonic()
+                self.probing = False
+
+
+    def release(self):
+        """
+        Called when a request ended without a verdict (cancelled, or a programming error).
+        """
+        if self.probing:
+            with self.lock:
+                self.probing = False
+
+
+_hedge_executor = None
+_hedge_lock = Lock()
+
+
+def hedge_executor():
+    """
+    Returns the thread pool running the hedged requests of the sync Clients.
+    """
+    global _hedge_executor
+    if _hedge_executor is None:
+        with _hedge_lock:
+            if _hedge_executor is None:
+                _hedge_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="wppconnect-hedge")
+    return _hedge_executor
@@ -0,0 +1,292 @@
+# Description: Incremental JSON parser that yields the items of a response array as they are downloaded.
+
+import re
+import sys
+from codecs import getincrementaldecoder
+from json import JSONDecoder, JSONDecodeError
+
+
+WHITESPACE = " \t\n\r"
+
+# Characters that matter while looking for the end of a value: outside strings, in strings,
+# and after a number or literal (which only ends on a delimiter, "3." is not a number yet).
+STRUCTURE = re.compile(r'["\[\]{}]')
+STRING = re.compile(r'["\\]')
+SCALAR_END = re.compile(r"[ \t\n\r,\]}:]")
+
+
+def _container_pattern(depth):
+    """
+    Regex matching a whole array or object nested up to ``depth`` levels from its brackets
+    and strings alone. It only finds where the value ends: the scalars are not checked and
+    ``[...}`` is accepted.
+    """
+    # possessive (Python 3.11+): the match never backtracks
+    repeat = "*+" if sys.version_info >= (3, 11) else "*"
+    run = r'[^"\[\]{}]' + repeat
+    string = r'"[^"\\]' + repeat + r'(?:\\.[^"\\]' + repeat + ")" + repeat + '"'
+    # the text between two brackets, strings and the rest alternating: no branch to try per token
+    flat = run + "(?:" + string + run + ")" + repeat
+    pattern = flat
+    for _ in range(depth):
+        pattern = flat + r"(?:[\[{]" + pattern + r"[\]}]" + flat + ")" + repeat
+    return re.compile(r"[\[{]" + pattern + r"[\]}]")
+
+
+# Items of raw streams that end in the chunk and are nested up to 16 levels (the others are
+# scanned by JSONArrayStream.__scan). Matched in C, without building the objects.
+CONTAINER = _container_pattern(15)
+
+
+class StreamError(Exception):
+    """
+    Raised when a streamed response does not contain the expected array.
+    The parsed top-level fields (e.g. "status" and "message") are in ``envelope``.
+    """
+
+
+    def __init__(self, message, envelope=None):
+        super().__init__(message)
+        self.envelope = envelope or {}
+
+
+class JSONArrayStream:
+
+
+    def __init__(self, key="response", raw=False):
+        """
+        Push parser for documents like ``{"status": "success", "response": [...]}``.
+
+        Chunks of bytes are given to ``feed`` as they arrive and the complete items
+        of the array are returned; only the item being parsed is buffered, so memory
+        stays constant however large the document is. A top-level array is also accepted.
+
+        :Args:
+            - key (str) - Key of the top-level object that holds the array.
+            - raw (bool) - Return the JSON text of every item instead of the decoded value. The
+              arrays and objects are then only delimited, not decoded nor validated.
+        """
+        self.key = key
+        self.raw = raw
+        self.decoder = JSONDecoder()
+        self.utf8 = getincrementaldecoder("utf-8")()
+        self.state = "start"
+        self.nested = False
+        self.current_key = None
+        self.found = False
+        self.envelope = {}
+        # value split across chunks: its text so far and how far it was scanned
+        self.parts = None
+        self.scalar = False
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+
+
+    def feed(self, chunk: bytes):
+        """
+        :Returns:
+            - List of the array items completed by this chunk.
+        """
+        return self.__parse(self.utf8.decode(chunk), final=False)
+
+
+    def close(self):
+        """
+        Signals the end of the document.
+
+        :Returns:
+            - List of the remaining items.
+        """
+        items = self.__parse(self.utf8.decode(b"", final=True), final=True)
+        if self.state != "done":
+            raise StreamError("Truncated or invalid JSON document", self.envelope)
+        if not self.found:
+            raise StreamError("The response has no %r array" % self.key, self.envelope)
+        return items
+
+
+    def __scan(self, text, pos, final):
+        """
+        Looks for the end of the value being read, from ``pos``, resuming the state (nesting
+        depth, in a string, after a backslash) left by the previous chunks, so a value is
+        scanned once however many chunks it spans.
+
+        :Returns:
+            - Index in ``text`` just after the value, or None if it goes on in the next chunks.
+        """
+        if self.scalar:
+            # a number or literal ends on a delimiter; at the end of the chunk it may go on
+            match = SCALAR_END.search(text, pos)
+            if match is not None:
+                return match.start()
+            return len(text) if final else None
+
+        size = len(text)
+        if self.escape:
+            if pos >= size:
+                return None
+            self.escape = False
+            pos += 1
+        while True:
+            if self.in_string:
+                match = STRING.search(text, pos)
+                if match is None:
+                    return None
+                pos = match.end()
+                if match.group() == "\\":
+                    if pos >= size:
+                        self.escape = True
+                        return None
+                    pos += 1
+                    continue
+                self.in_string = False
+                if self.depth == 0:
+                    return pos
+            else:
+                match = STRUCTURE.search(text, pos)
+                if match is None:
+                    return None
+                pos = match.end()
+                char = match.group()
+                if char == '"':
+                    self.in_string = True
+                elif char in "[{":
+                    self.depth += 1
+                else:
+                    self.depth -= 1
+                    if self.depth <= 0:
+                        return pos
+
+
+    def __begin(self, text, pos, final):
+        """
+        Starts reading the value at ``pos``.
+
+        :Returns:
+            - Index in ``text`` just after the value, or None if it goes on in the next chunks.
+        """
+        self.scalar = text[pos] not in '"[{'
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        return self.__scan(text, pos, final)
+
+
+    def __complete(self, text, items):
+        if self.raw and self.state == "items" and text[0] in "[{":
+            # delimited by __scan already: raw items are never decoded
+            items.append(text)
+            return
+        try:
+            value, end = self.decoder.raw_decode(text)
+        except JSONDecodeError:
+            raise StreamError("Invalid JSON document", self.envelope)
+        if end != len(text):
+            raise StreamError("Invalid JSON document", self.envelope)
+        self.__accept(value, text, items)
+
+
+    def __accept(self, value, text, items):
+        if self.state == "key":
+            self.current_key = value
+            self.state = "colon"
+        elif self.state == "value":
+            self.envelope[self.current_key] = value
+            self.state = "key"
+        else:
+            items.append(text if self.raw else value)
+
+
+    def __parse(self, buffer, final):
+        items = []
+        pos = 0
+        size = len(buffer)
+
+        if self.parts is not None:
+            # a value started in a previous chunk: only the new text is scanned
+            end = self.__scan(buffer, 0, final)
+            if end is None:
+                self.parts.append(buffer)
+                return items
+            self.parts.append(buffer[:end])
+            text = "".join(self.parts)
+            self.parts = None
+            self.__complete(text, items)
+            pos = end
+
+        while True:
+            while pos < size and buffer[pos] in WHITESPACE:
+                pos += 1
+            if pos >= size or self.state == "done":
+                break
+            char = buffer[pos]
+
+            if self.state == "start":
+                if char == "[":
+                    self.state, self.nested, self.found = "items", False, True
+                elif char == "{":
+                    self.state = "key"
+                else:
+                    raise StreamError("Expected a JSON object or array")
+                pos += 1
+                continue
+
+            if self.state == "colon":
+                if char != ":":
+                    raise StreamError("Expected ':' after key %r" % self.current_key, self.envelope)
+                pos += 1
+                self.state = "value"
+                continue
+
+            if self.state == "key":
+                if char == ",":
+                    pos += 1
+                    continue
+                if char == "}":
+                    self.state = "done"
+                    pos += 1
+                    continue
+            elif self.state == "value":
+                if self.current_key == self.key and char == "[":
+                    self.state, self.nested, self.found = "items", True, True
+                    pos += 1
+                    continue
+            elif self.state == "items":
+                if char == ",":
+                    pos += 1
+                    continue
+                if char == "]":
+                    self.state = "key" if self.nested else "done"
+                    pos += 1
+                    continue
+
+            if self.raw and self.state == "items" and char in "[{":
+                # fast path of raw items: found from their brackets and strings, never decoded
+                match = CONTAINER.match(buffer, pos)
+                if match is not None:
+                    items.append(match.group())
+                    pos = match.end()
+                    continue
+            else:
+                # fast path: the value is complete in this chunk. A number or literal must be
+                # followed by a delimiter, "3." decodes as 3 but may be the start of 3.25
+                try:
+                    value, end = self.decoder.raw_decode(buffer, pos)
+                except JSONDecodeError:
+                    pass
+                else:
+                    if char in '"[{' or (end < size and SCALAR_END.match(buffer, end)) or (end == size and final):
+                        self.__accept(value, buffer[pos:end] if self.raw else None, items)
+                        pos = end
+                        continue
+
+            # the value goes on in the next chunks (or is invalid): scanned once, decoded when complete
+            end = self.__begin(buffer, pos, final)
+            if end is None:
+                self.parts = [buffer[pos:]]
+                break
+            self.__complete(buffer[pos:end], items)
+            pos = end
+
+        return items
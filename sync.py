@@ -0,0 +1,286 @@
+# Description: Incremental sync of chats and messages into a local SQLite mirror.
+
+import logging
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from json import dumps as json_dumps, loads as json_loads
+from threading import Lock
+from time import time, monotonic
+from .utils import serialized_id
+
+
+logger = logging.getLogger(__name__)
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chats (
+    id TEXT PRIMARY KEY,
+    name TEXT,
+    is_group INTEGER,
+    last_activity INTEGER,
+    hwm_ts INTEGER,
+    hwm_id TEXT,
+    synced_at REAL,
+    raw TEXT
+);
+CREATE TABLE IF NOT EXISTS messages (
+    id TEXT PRIMARY KEY,
+    chat_id TEXT NOT NULL,
+    ts INTEGER,
+    sender TEXT,
+    type TEXT,
+    body TEXT,
+    raw TEXT
+);
+CREATE INDEX IF NOT EXISTS messages_chat_ts ON messages (chat_id, ts);
+"""
+
+
+def timestamp(item):
+    return item.get("t") or item.get("timestamp") or 0
+
+
+class MessageStore:
+
+
+    def __init__(self, path):
+        """
+        Local SQLite (WAL) mirror of chats and messages.
+
+        Every chat keeps a high-water mark: the timestamp and id of its newest stored message.
+
+        :Args:
+            - path (str) - SQLite database file.
+        """
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        self.lock = Lock()
+
+
+    def close(self):
+        self.db.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+    def chat_state(self, chat_id):
+        """
+        :Returns:
+            - (last_activity, hwm_ts, hwm_id) of the chat, or None if it was never synced.
+        """
+        with self.lock:
+            return self.db.execute("SELECT last_activity, hwm_ts, hwm_id FROM chats WHERE id = ?", (chat_id,)).fetchone()
+
+
+    def save_chat(self, chat, hwm=None):
+        """
+        Insert or update a chat. ``hwm`` is its new (timestamp, message id) high-water mark.
+        """
+        chat_id = serialized_id(chat.get("id"))
+        with self.lock:
+            self.db.execute(
+                "INSERT INTO chats (id, name, is_group, last_activity, synced_at, raw) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (id) DO UPDATE SET name = excluded.name, is_group = excluded.is_group, "
+                "last_activity = excluded.last_activity, synced_at = excluded.synced_at, raw = excluded.raw",
+                (chat_id, chat.get("name") or chat.get("formattedTitle"), int(bool(chat.get("isGroup"))), timestamp(chat), time(), json_dumps(chat)),
+            )
+            if hwm is not None:
+                self.db.execute("UPDATE chats SET hwm_ts = ?, hwm_id = ? WHERE id = ?", (hwm[0], hwm[1], chat_id))
+
+
+    def add_messages(self, chat_id, messages):
+        """
+        Insert messages, ignoring the ones already stored.
+
+        :Returns:
+            - Number of messages inserted.
+        """
+        rows = [
+            (
+                serialized_id(message.get("id")),
+                chat_id,
+                timestamp(message),
+                serialized_id(message.get("from")),
+                message.get("type"),
+                message.get("body") if isinstance(message.get("body"), str) else None,
+                json_dumps(message),
+            )
+            for message in messages
+        ]
+        with self.lock:
+            before = self.db.total_changes
+            self.db.execute("BEGIN")
+            try:
+                self.db.executemany("INSERT OR IGNORE INTO messages VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+            return self.db.total_changes - before
+
+
+    def chats(self):
+        """
+        :Returns:
+            - List of (id, name, is_group, last_activity, hwm_ts) of the stored chats.
+        """
+        with self.lock:
+            return self.db.execute("SELECT id, name, is_group, last_activity, hwm_ts FROM chats ORDER BY last_activity DESC").fetchall()
+
+
+    def messages(self, chat_id, since=None, until=None, limit=None):
+        """
+        :Returns:
+            - List of the decoded messages of a chat, oldest first, optionally between two timestamps.
+        """
+        query = "SELECT raw FROM messages WHERE chat_id = ?"
+        params = [chat_id]
+        if since is not None:
+            query += " AND ts >= ?"
+            params.append(since)
+        if until is not None:
+            query += " AND ts < ?"
+            params.append(until)
+        query += " ORDER BY ts"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        with self.lock:
+            return [json_loads(row[0]) for row in self.db.execute(query, params)]
+
+
+    def search(self, text, chat_id=None, limit=100):
+        """
+        :Returns:
+            - List of the decoded messages whose body contains ``text``, newest first.
+        """
+        query = "SELECT raw FROM messages WHERE body LIKE ?"
+        params = ["%" + text.replace("%", "\\%").replace("_", "\\_") + "%"]
+        query += " ESCAPE '\\'"
+        if chat_id is not None:
+            query += " AND chat_id = ?"
+            params.append(chat_id)
+        query += " ORDER BY ts DESC LIMIT ?"
+        params.append(limit)
+        with self.lock:
+            return [json_loads(row[0]) for row in self.db.execute(query, params)]
+
+
+    def count(self, chat_id=None):
+        with self.lock:
+            if chat_id is None:
+                return self.db.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+            return self.db.execute("SELECT COUNT(*) FROM messages WHERE chat_id = ?", (chat_id,)).fetchone()[0]
+
+
+class MessageSync:
+
+
+    def __init__(self, client, store: MessageStore, concurrency=8, batch_size=500):
+        """
+        Syncs the chats of a session into a MessageStore.
+
+        The chat list is streamed first. Chats whose last activity is not newer than
+        what was stored by the previous run are skipped without any request; the others
+        have their messages streamed and only the ones at or after the high-water mark
+        are written. WPPConnect server has no "messages since" route, so a changed chat
+        is still downloaded, but unchanged chats (most of them, on a nightly run) cost nothing.
+
+        :Args:
+            - client (Client) - Client of the session.
+            - store (MessageStore) - Local store.
+            - concurrency (int) - Chats synced at the same time.
+            - batch_size (int) - Messages written per transaction.
+        """
+        self.client = client
+        self.store = store
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+
+
+    def sync(self, chat_ids=None, force=False):
+        """
+        Run one sync.
+
+        :Args:
+            - chat_ids (iterable) - Only sync these chats. Defaults to every chat of the session.
+            - force (bool) - Download every chat, even the ones that did not change.
+
+        :Returns:
+            - dict with the chats seen, skipped, synced and failed, the messages added and the elapsed seconds.
+        """
+        report = {"chats": 0, "skipped": 0, "synced": 0, "failed": 0, "messages": 0, "elapsed": 0.0}
+        started = monotonic()
+        wanted = set(chat_ids) if chat_ids is not None else None
+        pending = set()
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            for chat in self.client.iter_all_chats():
+                chat_id = serialized_id(chat.get("id"))
+                if wanted is not None and chat_id not in wanted:
+                    continue
+                report["chats"] += 1
+
+                state = self.store.chat_state(chat_id)
+                if not force and state is not None and (state[0] or 0) >= timestamp(chat):
+                    report["skipped"] += 1
+                    continue
+
+                pending.add(executor.submit(self.sync_chat, chat, state[1] if state else None))
+                if len(pending) >= self.concurrency:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    self.__collect(done, report)
+
+            self.__collect(wait(pending)[0], report)
+
+        report["elapsed"] = monotonic() - started
+        return report
+
+
+    def sync_chat(self, chat, hwm_ts=None):
+        """
+        Stream the messages of one chat and store the ones at or after ``hwm_ts``.
+
+        :Returns:
+            - Number of messages added.
+        """
+        chat_id = serialized_id(chat.get("id"))
+        added = 0
+        hwm = None
+        batch = []
+
+        for message in self.client.iter_all_messages_in_chat(chat_id):
+            ts = timestamp(message)
+            if hwm_ts is not None and ts < hwm_ts:
+                continue
+            batch.append(message)
+            if hwm is None or ts >= hwm[0]:
+                hwm = (ts, serialized_id(message.get("id")))
+            if len(batch) >= self.batch_size:
+                added += self.store.add_messages(chat_id, batch)
+                batch = []
+
+        if batch:
+            added += self.store.add_messages(chat_id, batch)
+        # the chat row (and its high-water mark) is written last, so an interrupted chat is retried
+        self.store.save_chat(chat, hwm)
+        return added
+
+
+    @staticmethod
+    def __collect(done, report):
+        for future in done:
+            try:
+                report["messages"] += future.result()
+                report["synced"] += 1
+            except Exception:
+                logger.exception("Chat sync failed")
+                report["failed"] += 1
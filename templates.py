@@ -0,0 +1,237 @@
+# Description: Message templates encoded once and sent to many recipients, with a cache of encoded media.
+
+from base64 import b64encode
+from collections import OrderedDict
+from hashlib import sha256
+from json import dumps as json_dumps
+from os import fspath, PathLike
+from threading import Lock
+from .media import guess_mimetype
+
+
+class MediaCache:
+
+
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        """
+        LRU cache of media encoded as JSON data URI strings, keyed by the SHA-256 of their
+        content, so the same file is encoded once however many templates use it.
+
+        :Args:
+            - max_bytes (int) - Memory bound of the encoded media.
+        """
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+
+
+    def encode(self, data: bytes, mimetype: str) -> bytes:
+        """
+        :Returns:
+            - The JSON string ``"data:<mimetype>;base64,<data>"`` as bytes.
+        """
+        key = (sha256(data).digest(), mimetype)
+        with self.lock:
+            encoded = self.entries.get(key)
+            if encoded is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return encoded
+            self.misses += 1
+
+        # base64 needs no JSON escaping, only the mimetype does
+        encoded = b'"data:' + json_dumps(mimetype)[1:-1].encode() + b";base64," + b64encode(data) + b'"'
+        if len(encoded) > self.max_bytes:
+            return encoded
+
+        with self.lock:
+            if key not in self.entries:
+                self.entries[key] = encoded
+                self.size += len(encoded)
+                while self.size > self.max_bytes:
+                    self.size -= len(self.entries.popitem(last=False)[1])
+        return encoded
+
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+
+    def stats(self):
+        with self.lock:
+            return {"entries": len(self.entries), "bytes": self.size, "hits": self.hits, "misses": self.misses}
+
+
+# Cache shared by the templates created without one.
+DEFAULT_MEDIA_CACHE = MediaCache()
+
+# Recipient fields an endpoint requires, put over those of every send: send-mentioned only sends to groups.
+RECIPIENT_FIELDS = {"send-mentioned": {"isGroup": True}}
+
+
+def read_media(file):
+    """
+    :Returns:
+        - (bytes, name) of a path, binary file object or bytes.
+    """
+    if isinstance(file, (bytes, bytearray, memoryview)):
+        return bytes(file), None
+    if isinstance(file, (str, PathLike)):
+        path = fspath(file)
+        with open(path, "rb") as f:
+            return f.read(), path
+    name = getattr(file, "name", None)
+    return file.read(), name if isinstance(name, str) else None
+
+
+class SplicedBody:
+    """
+    Request body made of byte strings sent one after the other, without joining them.
+    """
+
+    __slots__ = ("parts", "length")
+
+
+    def __init__(self, parts):
+        self.parts = parts
+        self.length = sum(len(part) for part in parts)
+
+
+    def __len__(self):
+        return self.length
+
+
+    def __iter__(self):
+        return iter(self.parts)
+
+
+class MessageTemplate:
+
+
+    def __init__(self, endpoint: str, fields: dict = None, media_field: str = None, file=None, mimetype=None, cache: MediaCache = None):
+        """
+        A message encoded to JSON once and sent to many recipients.
+
+        Only the recipient fields (phone, isGroup, mentions...) are encoded per send and
+        put in front of the shared bytes of the rest of the body; the media is encoded once,
+        through a MediaCache, and never copied. A send costs the same whatever the media size.
+
+        Prefer the constructors: ``MessageTemplate.file(...)``, ``.image(...)``, ``.text(...)``.
+
+        :Args:
+            - endpoint (str) - Endpoint of the send. Example: send-file-base64
+            - fields (dict) - Fields shared by every recipient. Example: {"message": "Caption"}
+            - media_field (str) - Field holding the media data URI. Example: base64
+            - file (str|PathLike|file object|bytes) - The media.
+            - mimetype (str) - Mimetype of the media. Guessed from the file name if not set.
+            - cache (MediaCache) - Cache of the encoded media. Defaults to DEFAULT_MEDIA_CACHE.
+        """
+        self.endpoint = endpoint
+        self.fields = dict(fields or {})
+        self.recipient_fields = RECIPIENT_FIELDS.get(endpoint, {})
+
+        # body: {<recipient fields>, <fields>, "<media_field>": "<media>"}
+        tail = json_dumps(self.fields, separators=(",", ":"))[1:-1].encode()
+        if media_field is not None:
+            data, name = read_media(file)
+            media = (cache or DEFAULT_MEDIA_CACHE).encode(data, mimetype or guess_mimetype(name))
+            tail = (tail + b"," if tail else b"") + json_dumps(media_field).encode() + b":"
+            self.parts = (tail, media, b"}")
+        else:
+            self.parts = (tail + b"}",)
+        self.shared = bool(self.fields) or media_field is not None
+
+
+    @classmethod
+    def file(cls, file, message=None, filename=None, mimetype=None, cache=None):
+        """
+        Template of send_file_base64.
+        """
+        fields = {}
+        if message:
+            fields["message"] = message
+        if filename:
+            fields["filename"] = filename
+        return cls("send-file-base64", fields, "base64", file, mimetype, cache)
+
+
+    @classmethod
+    def image(cls, file, caption=None, mimetype=None, cache=None):
+        """
+        Template of send_image.
+        """
+        return cls("send-image", {"caption": caption} if caption else {}, "path", file, mimetype, cache)
+
+
+    @classmethod
+    def voice(cls, file, mimetype=None, cache=None):
+        """
+        Template of send_voice.
+        """
+        return cls("send-voice-base64", {}, "base64Ptt", file, mimetype, cache)
+
+
+    @classmethod
+    def text(cls, message):
+        """
+        Template of send_message.
+        """
+        return cls("send-message", {"message": message})
+
+
+    @classmethod
+    def mentioned(cls, message):
+        """
+        Template of send_mentioned; give ``mentioned`` to every send. It is always sent with isGroup true.
+        """
+        return cls("send-mentioned", {"message": message})
+
+
+    @classmethod
+    def from_encoded(cls, endpoint, shared_body, shared):
+        """
+        Template rebuilt from its endpoint, ``shared_body`` (the shared part of its body, as
+        returned by ``encoded``) and ``shared``, e.g. after being stored by an Outbox.
+        """
+        template = cls.__new__(cls)
+        template.endpoint = endpoint
+        template.fields = {}
+        template.recipient_fields = RECIPIENT_FIELDS.get(endpoint, {})
+        template.parts = (shared_body,)
+        template.shared = shared
+        return template
+
+
+    def encoded(self):
+        """
+        :Returns:
+            - The shared part of the body in one bytes object.
+        """
+        return b"".join(self.parts)
+
+
+    def body(self, recipient: dict) -> SplicedBody:
+        """
+        :Args:
+            - recipient (dict) - Fields of one recipient. Example: {"phone": "5511...", "isGroup": False}
+        """
+        if self.recipient_fields:
+            recipient = {**recipient, **self.recipient_fields}
+        head = json_dumps(recipient, separators=(",", ":"))[:-1].encode()
+        if self.shared:
+            head += b","
+        return SplicedBody((head,) + self.parts)
+
+
+    @property
+    def length(self):
+        """
+        :Returns:
+            - Length of the shared part of the body in bytes.
+        """
+        return sum(len(part) for part in self.parts)
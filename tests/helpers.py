@@ -0,0 +1,137 @@
+import asyncio
+import time
+from collections import namedtuple
+from contextlib import contextmanager, asynccontextmanager
+
+from ..transport import Transport
+
+
+SUCCESS = b'{"status": "success"}'
+
+
+class FakeResponse:
+
+    def __init__(self, content=SUCCESS, status_code=200):
+        self.content = content
+        self.status_code = status_code
+
+
+# A request received by a RecordingTransport. ``data`` is the body read in full, ``chunks`` the
+# chunks of a streamed body (None for bytes).
+Call = namedtuple("Call", ["method", "url", "headers", "data", "timeout", "chunks"])
+
+
+class RecordingTransport(Transport):
+    """
+    Records the requests and answers each one with the next outcome: a FakeResponse, bytes
+    (a 200 body), a status code or an exception to raise. Once they run out, ``default`` answers.
+    Streamed bodies are read as the real transports do. ``stream`` yields the body of the
+    outcome in chunks of ``chunk_size`` bytes.
+    """
+
+    def __init__(self, *outcomes, default=SUCCESS, chunk_size=7):
+        self.outcomes = list(outcomes)
+        self.default = default
+        self.chunk_size = chunk_size
+        self.calls = []
+        self.closed = False
+
+    @property
+    def urls(self):
+        return [call.url for call in self.calls]
+
+    @property
+    def bodies(self):
+        return [call.data for call in self.calls]
+
+    def record(self, method, url, headers, data, timeout, chunks=None):
+        if chunks is not None:
+            data = b"".join(chunks)
+        self.calls.append(Call(method, url, headers, data, timeout, chunks))
+
+    def answer(self):
+        outcome = self.outcomes.pop(0) if self.outcomes else self.default
+        if isinstance(outcome, BaseException):
+            raise outcome
+        if isinstance(outcome, int):
+            return FakeResponse(status_code=outcome)
+        if isinstance(outcome, (bytes, bytearray)):
+            return FakeResponse(bytes(outcome))
+        return outcome
+
+    def request(self, method, url, headers=None, data=None, timeout=None):
+        chunks = None
+        if data is not None and not isinstance(data, (bytes, bytearray, str)):
+            chunks = [bytes(chunk) for chunk in data]
+        self.record(method, url, headers, data, timeout, chunks)
+        return self.answer()
+
+    @contextmanager
+    def stream(self, method, url, headers=None, data=None, timeout=None, chunk_size=None):
+        self.record(method, url, headers, data, timeout)
+        resp = self.answer()
+        content = resp.content
+        yield resp.status_code, iter([content[i:i + self.chunk_size] for i in range(0, len(content), self.chunk_size)])
+
+    def close(self):
+        self.closed = True
+
+
+class AsyncRecordingTransport(RecordingTransport):
+    """
+    RecordingTransport of AsyncClient. With ``block`` the requests wait until cancelled.
+    """
+
+    def __init__(self, *outcomes, block=False, **options):
+        super().__init__(*outcomes, **options)
+        self.block = block
+        self.cancelled = False
+
+    async def request(self, method, url, headers=None, data=None, timeout=None):
+        chunks = None
+        if data is not None and not isinstance(data, (bytes, bytearray, str)):
+            chunks = [bytes(chunk) async for chunk in data]
+        self.record(method, url, headers, data, timeout, chunks)
+        if self.block:
+            try:
+                await asyncio.Event().wait()
+            except asyncio.CancelledError:
+                self.cancelled = True
+                raise
+        return self.answer()
+
+    @asynccontextmanager
+    async def stream(self, method, url, headers=None, data=None, timeout=None, chunk_size=None):
+        self.record(method, url, headers, data, timeout)
+        resp = self.answer()
+        content = resp.content
+
+        async def chunks():
+            for i in range(0, len(content), self.chunk_size):
+                yield content[i:i + self.chunk_size]
+
+        yield resp.status_code, chunks()
+
+    async def close(self):
+        self.closed = True
+
+
+def wait_for(condition, timeout=5.0):
+    """
+    Polls ``condition`` until it is true or ``timeout`` seconds passed, and returns its last value.
+    """
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    return condition()
+
+
+async def until(condition, timeout=5.0):
+    """
+    asyncio version of ``wait_for``; raises AssertionError on timeout.
+    """
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not reached")
+        await asyncio.sleep(0.005)
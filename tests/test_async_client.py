@@ -0,0 +1,113 @@
+import asyncio
+import base64
+import io
+import json
+import threading
+
+import pytest
+
+from ..async_client import AsyncClient
+from ..models import Chat
+from ..templates import MessageTemplate
+from .helpers import AsyncRecordingTransport
+
+
+CHATS = [{"id": {"_serialized": "5511999999999@c.us"}, "name": "Alice"}, {"id": {"_serialized": "5511888888888@c.us"}, "name": "Bob"}]
+
+
+class ThreadRecordingFile(io.BytesIO):
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.threads = set()
+
+    def readinto(self, buffer):
+        self.threads.add(threading.get_ident())
+        return super().readinto(buffer)
+
+
+def test_endpoints_send_their_request():
+    transport = AsyncRecordingTransport()
+
+    async def main():
+        async with AsyncClient("http://h/api", "key", "bot", transport=transport) as client:
+            assert await client.send_message("5511999999999", "Hi") == {"status": "success"}
+            await client.chat_by_id("5511999999999@c.us")
+
+    asyncio.run(main())
+    assert [(call.method, call.url) for call in transport.calls] == [
+        ("POST", "http://h/api/bot/send-message"),
+        ("GET", "http://h/api/bot/chat-by-id/5511999999999@c.us"),
+    ]
+    assert json.loads(transport.bodies[0]) == {"phone": "5511999999999", "message": "Hi", "isGroup": False}
+
+
+def test_with_timeout_applies_to_the_view_only():
+    transport = AsyncRecordingTransport(default=json.dumps({"status": "success", "response": CHATS}).encode())
+
+    async def main():
+        client = AsyncClient("http://h/api", "key", "bot", transport=transport)
+        await client.with_timeout(5).all_chats()
+        await client.all_chats()
+        chats = [chat async for chat in client.with_timeout((1, 2)).iter_all_chats(models=True)]
+        assert [chat.name for chat in chats] == ["Alice", "Bob"]
+        assert isinstance(chats[0], Chat)
+
+    asyncio.run(main())
+    assert [call.timeout for call in transport.calls] == [5, None, (1, 2)]
+
+
+def test_cancelling_the_task_cancels_the_request():
+    transport = AsyncRecordingTransport(block=True)
+
+    async def main():
+        client = AsyncClient("http://h/api", "key", "bot", transport=transport)
+        task = asyncio.ensure_future(client.send_message("5511999999999", "Hi"))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    assert transport.cancelled
+
+
+def test_send_file_reads_the_file_off_the_event_loop():
+    transport = AsyncRecordingTransport()
+    data = bytes(range(256)) * 1000
+    file = ThreadRecordingFile(data)
+
+    async def main():
+        client = AsyncClient("http://h/api", "key", "bot", transport=transport)
+        await client.send_file("5511999999999", file, filename="data.bin")
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(main())
+    assert file.threads and loop_thread not in file.threads
+    body = json.loads(transport.bodies[0])
+    assert base64.b64decode(body["base64"].split(",", 1)[1]) == data
+
+
+def test_template_parts_are_sent_without_threads(monkeypatch):
+    transport = AsyncRecordingTransport()
+    template = MessageTemplate.file(b"%PDF-1.4 catalog", "Our catalog", filename="catalog.pdf", mimetype="application/pdf")
+    offloaded = []
+    to_thread = asyncio.to_thread
+
+    async def recording_to_thread(func, *args):
+        offloaded.append(func)
+        return await to_thread(func, *args)
+
+    monkeypatch.setattr(asyncio, "to_thread", recording_to_thread)
+
+    async def main():
+        client = AsyncClient("http://h/api", "key", "bot", transport=transport)
+        await client.send_template("5511999999999", template)
+        assert not offloaded
+        await client.send_file("5511999999999", io.BytesIO(b"data"), filename="data.bin")
+        assert offloaded
+
+    asyncio.run(main())
+    body = json.loads(transport.bodies[0])
+    assert body["phone"] == "5511999999999"
+    assert base64.b64decode(body["base64"].split(",", 1)[1]) == b"%PDF-1.4 catalog"
@@ -0,0 +1,173 @@
+import asyncio
+import random
+
+import pytest
+
+from .. import audience
+from ..async_client import AsyncClient
+from ..audience import Audience, AudienceError, IdSet, encode_id
+from .helpers import AsyncRecordingTransport
+
+
+def random_ids(seed, count, others=()):
+    rng = random.Random(seed)
+    return ["55%011d@c.us" % rng.randrange(10 ** 4) for _ in range(count)] + list(others)
+
+
+def as_set(ids):
+    return {str(encode_id(value)) for value in ids}
+
+
+def test_encode_id():
+    assert encode_id("5511999999999@c.us") == 5511999999999
+    assert encode_id("5511999999999@s.whatsapp.net") == 5511999999999
+    assert encode_id("5511999999999") == 5511999999999
+    assert encode_id({"_serialized": "5511999999999@c.us"}) == 5511999999999
+    assert encode_id({"user": "5511999999999", "server": "c.us"}) == 5511999999999
+    # ids that are not phone numbers keep their serialized form
+    assert encode_id("123456789-1612345678@g.us") == "123456789-1612345678@g.us"
+    assert encode_id("98765432109876@lid") == "98765432109876@lid"
+    assert encode_id("5511999999999@g.us") == "5511999999999@g.us"
+
+
+def test_from_ids_deduplicates():
+    ids = IdSet.from_ids(["5511999999999@c.us", "5511999999999", 5511999999999, "5511888888888", "1@lid", "1@lid"])
+    assert len(ids) == 3
+    assert list(ids) == ["5511888888888", "5511999999999", "1@lid"]
+    assert "5511999999999@c.us" in ids and {"_serialized": "1@lid"} in ids
+    assert "5511777777777" not in ids and "2@lid" not in ids
+    assert ids.nbytes() == 16
+
+
+@pytest.mark.parametrize("small_set", [audience.SMALL_SET, 0])
+def test_set_operations(monkeypatch, small_set):
+    # a SMALL_SET of 0 takes the sorted merge path of the large sets
+    monkeypatch.setattr(audience, "SMALL_SET", small_set)
+    a = random_ids(1, 3000, ["1@lid", "2@lid"])
+    b = random_ids(2, 2000, ["2@lid", "3@lid"])
+    c = random_ids(3, 500)
+    sa, sb, sc = IdSet.from_ids(a), IdSet.from_ids(b), IdSet.from_ids(c)
+
+    assert set(sa | sb) == as_set(a) | as_set(b)
+    assert set(IdSet.union(sa, sb, sc)) == as_set(a) | as_set(b) | as_set(c)
+    assert set(sa & sb) == as_set(a) & as_set(b)
+    assert set(sc & sa) == as_set(c) & as_set(a)
+    assert set(sa - sb) == as_set(a) - as_set(b)
+    assert set(sc - sa) == as_set(c) - as_set(a)
+    for result in (sa | sb, sa & sb, sa - sb, sc - sa):
+        assert list(result.numbers) == sorted(set(result.numbers))
+    assert len(sa - sa) == 0 and len(sa & IdSet()) == 0 and set(sa - IdSet()) == as_set(a)
+
+
+class FakeClient:
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.calls = []
+
+    def __call(self, name, *args):
+        self.calls.append((name,) + args)
+        return self.responses[(name,) + args]
+
+    def group_members_ids(self, group_id):
+        return self.__call("group_members_ids", group_id)
+
+    def all_broadcast_list(self):
+        return self.__call("all_broadcast_list")
+
+    def all_contacts(self):
+        return self.__call("all_contacts")
+
+    def blocklist(self):
+        return self.__call("blocklist")
+
+
+class FakeAsyncClient(FakeClient):
+
+    async def group_members_ids(self, group_id):
+        return FakeClient.group_members_ids(self, group_id)
+
+    async def blocklist(self):
+        return FakeClient.blocklist(self)
+
+    async def send_message(self, phone, message):
+        self.calls.append(("send_message", phone, message))
+        return {"status": "success"}
+
+
+def success(response):
+    return {"status": "success", "response": response}
+
+
+RESPONSES = {
+    ("group_members_ids", "g1@g.us"): success([{"_serialized": "5511000000001@c.us"}, {"_serialized": "5511000000002@c.us"}, "9@lid"]),
+    ("group_members_ids", "g2@g.us"): success(["5511000000002@c.us", "5511000000003@c.us"]),
+    ("blocklist",): success(["5511000000003@c.us"]),
+    ("all_broadcast_list",): success([
+        {"id": "l1@broadcast", "recipients": [{"id": "5511000000004@c.us"}]},
+        {"id": "l2@broadcast", "recipients": ["5511000000005@c.us"]},
+    ]),
+    ("all_contacts",): success([
+        {"id": {"_serialized": "5511000000006@c.us"}, "isMyContact": True},
+        {"id": {"_serialized": "5511000000007@c.us"}, "isMyContact": False},
+        {"id": {"_serialized": "g1@g.us"}, "isGroup": True},
+    ]),
+}
+
+
+def test_resolve():
+    client = FakeClient(dict(RESPONSES))
+    audience = Audience(client)
+    everyone = audience.groups("g1@g.us", "g2@g.us") | audience.broadcast_list("l1@broadcast") | audience.broadcast_list("l2@broadcast")
+    everyone = everyone | audience.contacts() | audience.ids(["5511000000008"])
+    recipients = audience.resolve(everyone - audience.blocklist())
+    assert set(recipients) == {"5511000000001", "5511000000002", "5511000000004", "5511000000005", "5511000000006", "5511000000008", "9@lid"}
+    # the two broadcast lists share one request
+    assert sorted(client.calls) == sorted(set(client.calls))
+    assert len(client.calls) == 5
+
+    assert set(audience.resolve(audience.group("g1@g.us") & audience.group("g2@g.us"))) == {"5511000000002"}
+
+
+def test_failed_source_raises():
+    responses = dict(RESPONSES)
+    responses[("blocklist",)] = {"status": "error", "message": "session closed"}
+    audience = Audience(FakeClient(responses))
+    with pytest.raises(AudienceError) as error:
+        audience.resolve(audience.group("g1@g.us") - audience.blocklist())
+    # never resolved as an empty exclusion
+    assert error.value.response == responses[("blocklist",)]
+
+    responses[("blocklist",)] = {"status": "success", "response": {"unexpected": True}}
+    with pytest.raises(AudienceError):
+        audience.resolve(audience.group("g1@g.us") - audience.blocklist())
+
+
+def test_aresolve():
+    responses = dict(RESPONSES)
+    audience = Audience(FakeAsyncClient(responses))
+    recipients = asyncio.run(audience.aresolve(audience.groups("g1@g.us", "g2@g.us") - audience.blocklist()))
+    assert set(recipients) == {"5511000000001", "5511000000002", "9@lid"}
+
+    responses[("group_members_ids", "g2@g.us")] = False
+    with pytest.raises(AudienceError):
+        asyncio.run(audience.aresolve(audience.groups("g1@g.us", "g2@g.us")))
+
+
+def test_asend():
+    client = FakeAsyncClient(dict(RESPONSES))
+    audience = Audience(client)
+
+    async def main():
+        return [result async for result in audience.asend(audience.group("g1@g.us") - audience.blocklist(), "send_message", message="Hi")]
+
+    results = asyncio.run(main())
+    assert sorted(result.recipient for result in results) == ["5511000000001", "5511000000002", "9@lid"]
+    assert all(result.ok for result in results)
+    assert sorted(call[1] for call in client.calls if call[0] == "send_message") == ["5511000000001", "5511000000002", "9@lid"]
+
+
+def test_send_rejects_an_async_client():
+    audience = Audience(AsyncClient("http://h/api", "key", "bot", transport=AsyncRecordingTransport()))
+    with pytest.raises(TypeError):
+        audience.send(audience.ids(["5511000000001"]), "send_message", message="Hi")
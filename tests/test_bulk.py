@@ -0,0 +1,23 @@
+from ..bulk import TokenBucket, session_bucket
+from ..client import Client
+from ..transport import Transport
+
+
+def test_session_bucket_is_shared_across_rates():
+    client = Client("http://127.0.0.1:1/api", "secret", "bucket-test", transport=Transport())
+    first = session_bucket(client, 10)
+    second = session_bucket(client, 5)
+    assert second is first
+    assert first.rate == 5
+    assert session_bucket(Client("http://127.0.0.1:1/api", "secret", "other", transport=Transport()), 5) is not first
+
+
+def test_token_bucket_rate():
+    bucket = TokenBucket(10, burst=2)
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == 0.0
+    assert 0.05 < bucket.reserve() <= 0.1
+    bucket.set_rate(100, burst=1)
+    assert bucket.rate == 100 and bucket.capacity == 1
+    # the token reserved at the old rate is still owed
+    assert bucket.reserve() > 0
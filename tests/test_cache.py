@@ -0,0 +1,84 @@
+from ..cache import ResponseCache, ENTRY_OVERHEAD
+
+
+PREFIX = "http://localhost:21465/api/bot/"
+
+
+def url(name):
+    return PREFIX + "group-members/" + name
+
+
+def test_lru_eviction():
+    cache = ResponseCache(max_bytes=3 * (1000 + len(url("g0")) + ENTRY_OVERHEAD))
+    for i in range(3):
+        cache.put(PREFIX, "group-members", url("g%d" % i), b"x" * 1000)
+    assert cache.get("group-members", url("g0")) is not None
+    cache.put(PREFIX, "group-members", url("g3"), b"x" * 1000)
+    # g1 was the least recently used
+    assert cache.get("group-members", url("g1")) is None
+    assert cache.get("group-members", url("g0")) is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_body_over_budget_is_skipped():
+    cache = ResponseCache(max_bytes=10000)
+    cache.put(PREFIX, "group-members", url("small"), b"x" * 100)
+    cache.put(PREFIX, "group-members", url("large"), b"x" * 20000)
+    assert cache.get("group-members", url("large")) is None
+    assert cache.get("group-members", url("small")) == b"x" * 100
+    assert cache.stats()["evictions"] == 0
+
+
+def test_invalidation():
+    cache = ResponseCache()
+    cache.put(PREFIX, "group-members", url("a"), b"[1]")
+    cache.put(PREFIX, "group-members", url("b"), b"[2]")
+    cache.invalidate(PREFIX, "group-members", "a")
+    assert cache.get("group-members", url("a")) is None
+    assert cache.get("group-members", url("b")) == b"[2]"
+
+
+def test_profile_writes_invalidate_profile_reads():
+    cache = ResponseCache()
+    pic, status = PREFIX + "profile-pic/5511999999999", PREFIX + "profile-status/5511999999999"
+    cache.put(PREFIX, "profile-pic", pic, b'{"eurl": "old"}')
+    cache.put(PREFIX, "profile-status", status, b'{"status": "old"}')
+    cache.update(PREFIX, "POST", "change-profile-image", PREFIX + "change-profile-image", {"path": "me.jpg"}, None)
+    assert cache.get("profile-pic", pic) is None
+    assert cache.get("profile-status", status) == b'{"status": "old"}'
+    cache.update(PREFIX, "POST", "change-profile-status", PREFIX + "profile-status", {"status": "new"}, None)
+    assert cache.get("profile-status", status) is None
+
+
+def test_disk_store_survives_restart(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = ResponseCache(path=path)
+    cache.put(PREFIX, "group-members", url("a"), b"[1]")
+    cache.close()
+    cache = ResponseCache(path=path)
+    assert cache.get("group-members", url("a")) == b"[1]"
+    cache.close()
+
+
+def test_disk_store_budget(tmp_path):
+    path = str(tmp_path / "cache.db")
+    budget = 20 * (1000 + len(url("g00")) + ENTRY_OVERHEAD)
+    cache = ResponseCache(max_bytes=budget, path=path)
+    for i in range(100):
+        cache.put(PREFIX, "group-members", url("g%02d" % i), b"x" * 1000)
+    count, size = cache.db.execute("SELECT COUNT(*), SUM(length(body) + length(url)) FROM cache").fetchone()
+    assert size + count * ENTRY_OVERHEAD <= budget
+    # the latest entries are kept
+    assert cache.db.execute("SELECT 1 FROM cache WHERE url = ?", (url("g99"),)).fetchone()
+    cache.close()
+
+
+def test_disk_store_purges_expired_rows(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = ResponseCache(path=path)
+    cache.put(PREFIX, "group-members", url("old"), b"[1]")
+    cache.db.execute("UPDATE cache SET expires = 0")
+    cache.purged = 0
+    cache.put(PREFIX, "group-members", url("new"), b"[2]")
+    assert [row[0] for row in cache.db.execute("SELECT url FROM cache")] == [url("new")]
+    cache.close()
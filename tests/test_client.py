@@ -0,0 +1,61 @@
+import json
+
+import pytest
+
+from ..client import Client, compile_endpoints, ENDPOINTS
+from ..templates import MessageTemplate
+from .helpers import RecordingTransport
+
+
+API = "http://localhost:21465/api"
+
+# endpoints whose URL was malformed before the dispatch was compiled: (endpoint, method, argument, path)
+FIXED_URLS = [
+    ("last-seen", "last_seen", "5511999999999@c.us", "/bot/last-seen/5511999999999@c.us"),
+    ("check-number-status", "check_number_status", "5511999999999", "/bot/check-number-status/5511999999999"),
+    ("contact", "contact", "5511999999999@c.us", "/bot/contact/5511999999999@c.us"),
+    ("profile", "profile", "5511999999999@c.us", "/bot/profile/5511999999999@c.us"),
+    ("profile-pic", "profile_pic", "5511999999999@c.us", "/bot/profile-pic/5511999999999@c.us"),
+    ("profile-status", "profile_status", "5511999999999@c.us", "/bot/profile-status/5511999999999@c.us"),
+    ("group-invite-link", "group_invite_link", "123456789@g.us", "/bot/group-invite-link/123456789@g.us"),
+    ("group-members-ids", "group_members_ids", "123456789@g.us", "/bot/group-members-ids/123456789@g.us"),
+    ("group-members", "group_members", "123456789@g.us", "/bot/group-members/123456789@g.us"),
+]
+
+
+@pytest.mark.parametrize("endpoint, name, argument, path", FIXED_URLS)
+def test_fixed_urls(endpoint, name, argument, path):
+    client = Client(API, "key", "bot", transport=RecordingTransport())
+    assert client._url(endpoint, argument) == ("GET", API + path)
+    getattr(client, name)(argument)
+    assert [(call.method, call.url) for call in client.transport.calls] == [("GET", API + path)]
+
+
+def test_every_endpoint_is_compiled():
+    endpoints = compile_endpoints(API, "key", "bot")
+    assert set(endpoints) == set(ENDPOINTS)
+    for name, endpoint in endpoints.items():
+        assert endpoint.method == ENDPOINTS[name]["method"]
+        if name != "generate-token":
+            assert endpoint.url == API + "/bot/" + ENDPOINTS[name]["url"]
+    assert endpoints["generate-token"] == ("POST", API + "/bot/key/generate-token")
+    assert endpoints["change-profile-status"] == ("POST", API + "/bot/profile-status")
+
+
+def test_session_change_recompiles_the_endpoints():
+    client = Client(API, "key", "bot", transport=RecordingTransport())
+    client.session = "other"
+    assert client._url("send-message") == ("POST", API + "/other/send-message")
+    assert client._url("chat-by-id", "5511999999999@c.us") == ("GET", API + "/other/chat-by-id/5511999999999@c.us")
+    assert client._url("generate-token") == ("POST", API + "/other/key/generate-token")
+
+
+def test_mentioned_template_is_sent_to_a_group():
+    client = Client(API, "key", "bot", transport=RecordingTransport())
+    template = MessageTemplate.mentioned("Hi @5511999999999")
+    assert b'"isGroup":true' in b"".join(template.body({"phone": "123456789@g.us", "isGroup": False}))
+    client.send_template("123456789@g.us", template, mentioned=["5511999999999"])
+    [call] = client.transport.calls
+    assert call.url == API + "/bot/send-mentioned"
+    assert b'"isGroup":true' in call.data
+    assert json.loads(call.data) == {"phone": "123456789@g.us", "isGroup": True, "mentioned": ["5511999999999"], "message": "Hi @5511999999999"}
@@ -0,0 +1,50 @@
+import sys
+import types
+
+import pytest
+
+from ..client import Client
+from ..codec import default_codec, get_codec, MsgspecCodec, OrjsonCodec, StdlibCodec
+from ..transport import Transport
+
+
+def fake_orjson():
+    module = types.ModuleType("orjson")
+    module.dumps = lambda obj: b"orjson"
+    module.loads = lambda data: "orjson"
+    return module
+
+
+def test_falls_back_to_the_stdlib_codec(monkeypatch):
+    # a None entry makes the import raise ImportError
+    monkeypatch.setitem(sys.modules, "orjson", None)
+    monkeypatch.setitem(sys.modules, "msgspec", None)
+    codec = default_codec()
+    assert isinstance(codec, StdlibCodec)
+    assert codec.dumps({"phone": "5511999999999", "isGroup": False}) == b'{"phone":"5511999999999","isGroup":false}'
+    assert codec.loads(b'{"status": "success", "name": "\xc3\xa9"}') == {"status": "success", "name": "é"}
+    assert isinstance(Client("http://h/api", "key", "bot", transport=Transport()).codec, StdlibCodec)
+
+
+def test_prefers_the_fastest_installed_codec(monkeypatch):
+    monkeypatch.setitem(sys.modules, "orjson", fake_orjson())
+    codec = default_codec()
+    assert isinstance(codec, OrjsonCodec)
+    assert codec.dumps({}) == b"orjson"
+    assert codec.loads(b"{}") == "orjson"
+
+
+def test_get_codec(monkeypatch):
+    assert isinstance(get_codec("json"), StdlibCodec)
+    monkeypatch.setitem(sys.modules, "msgspec", None)
+    with pytest.raises(ImportError):
+        get_codec(MsgspecCodec.name)
+    with pytest.raises(ValueError):
+        get_codec("simplejson")
+
+
+def test_client_uses_the_given_codec():
+    codec = StdlibCodec()
+    client = Client("http://h/api", "key", "bot", transport=Transport(), codec=codec)
+    assert client.codec is codec
+    assert client._encode_payload("POST", {"message": "Hi"}) == b'{"message":"Hi"}'
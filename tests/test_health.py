@@ -0,0 +1,170 @@
+import asyncio
+
+from ..health import HealthMonitor, CONNECTED, ERROR, QRCODE, UNKNOWN, UNREACHABLE
+from ..resilience import CircuitOpenError
+from .helpers import until
+
+
+class FakeClient:
+    """
+    AsyncClient of a session whose server state is ``self.state``: a status string, or an
+    exception raised by the requests.
+    """
+
+    def __init__(self, session, node="node1", state=CONNECTED, delay=0.0):
+        self.session = session
+        self.node = node
+        self.api = {"URL": "http://127.0.0.1:1/api"}
+        self.state = state
+        self.delay = delay
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def __answer(self, name):
+        self.calls.append(name)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if self.delay:
+                await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        if isinstance(self.state, BaseException):
+            raise self.state
+
+    async def check_connection_session(self):
+        await self.__answer("check-connection-session")
+        return {"status": self.state == CONNECTED, "message": "Connected" if self.state == CONNECTED else "Disconnected"}
+
+    async def status_session(self):
+        await self.__answer("status-session")
+        if self.state == QRCODE:
+            return {"status": "QRCODE", "qrcode": "data:image/png;base64,AAAA"}
+        return {"status": self.state}
+
+
+def monitor(clients, **options):
+    options = dict(dict(min_interval=0.01, max_interval=0.08, unhealthy_interval=0.04, jitter=0.0, node_rate=None), **options)
+    return HealthMonitor(clients, **options)
+
+
+def test_node_down_and_recovery_call_the_callbacks():
+    client = FakeClient("bot")
+    changes = []
+    async_changes = []
+
+    async def record(health, previous):
+        async_changes.append((previous, health.state))
+
+    async def main():
+        async with monitor([client], on_change=lambda health, previous: changes.append((previous, health.state))) as health_monitor:
+            health_monitor.on_change(record)
+            health = health_monitor.health("bot")
+            assert health.state == UNKNOWN
+            await until(lambda: health.connected)
+
+            client.state = ConnectionError("refused")
+            await until(lambda: health.state == UNREACHABLE)
+            await until(lambda: health.failures >= 2)
+            assert "ConnectionError" in health.error
+            assert health_monitor.states() == {UNREACHABLE: 1}
+
+            client.state = CircuitOpenError("node1", 5.0)
+            checks = health.checks
+            await until(lambda: health.checks > checks)
+            assert health.state == UNREACHABLE
+
+            client.state = CONNECTED
+            await until(lambda: health.connected)
+            assert health.failures == 0 and health.error is None
+
+            client.state = PermissionError("not a transport error")
+            await until(lambda: health.state == ERROR)
+
+    asyncio.run(main())
+    assert changes == [(UNKNOWN, CONNECTED), (CONNECTED, UNREACHABLE), (UNREACHABLE, CONNECTED), (CONNECTED, ERROR)]
+    assert async_changes == changes
+
+
+def test_connected_sessions_use_the_connection_check():
+    client = FakeClient("bot")
+
+    async def main():
+        async with monitor([client]) as health_monitor:
+            health = health_monitor.health("bot")
+            await until(lambda: health.checks >= 3)
+            client.state = QRCODE
+            await until(lambda: health.state == QRCODE)
+            assert health.qrcode == "data:image/png;base64,AAAA"
+
+    asyncio.run(main())
+    # status-session only for the first check, then when the connection check fails
+    assert client.calls[:3] == ["status-session", "check-connection-session", "check-connection-session"]
+    index = client.calls.index("status-session", 1)
+    assert client.calls[index - 1] == "check-connection-session"
+
+
+def test_interval_backs_off_until_a_change():
+    client = FakeClient("bot")
+
+    async def main():
+        async with monitor([client], backoff=2.0) as health_monitor:
+            health = health_monitor.health("bot")
+            intervals = []
+            while len(intervals) < 5:
+                checks = health.checks
+                await until(lambda: health.checks > checks)
+                intervals.append(health.interval)
+            # the first check is a change (UNKNOWN -> CONNECTED), then the interval doubles up to max_interval
+            assert intervals == [0.01, 0.02, 0.04, 0.08, 0.08]
+
+            client.state = "CLOSED"
+            await until(lambda: health.state == "CLOSED")
+            assert health.interval == 0.01
+            for _ in range(4):
+                checks = health.checks
+                await until(lambda: health.checks > checks)
+            # sessions that are not connected stay under unhealthy_interval
+            assert health.interval == 0.04
+
+    asyncio.run(main())
+
+
+def test_notify_checks_at_once():
+    client = FakeClient("bot")
+
+    async def main():
+        async with monitor([client], min_interval=0.01, max_interval=60.0, backoff=100.0) as health_monitor:
+            health = health_monitor.health("bot")
+            await until(lambda: health.checks == 2)
+            assert health.interval == 1.0
+            client.state = QRCODE
+            health_monitor.notify("bot")
+            await until(lambda: health.state == QRCODE, timeout=0.5)
+            assert health.interval == 0.01
+
+    asyncio.run(main())
+
+
+def test_node_concurrency_and_remove():
+    clients = [FakeClient("s%d" % i, delay=0.02) for i in range(6)]
+    in_flight = []
+
+    async def main():
+        async with monitor(clients, node_concurrency=2) as health_monitor:
+
+            def count():
+                in_flight.append(sum(client.in_flight for client in clients))
+                return all(health_monitor.health(client.session).checks >= 2 for client in clients)
+
+            await until(count)
+            health_monitor.remove("s0")
+            calls = len(clients[0].calls)
+            await asyncio.sleep(0.1)
+            assert health_monitor.health("s0") is None
+            assert len(clients[0].calls) <= calls + 1
+            assert set(health_monitor.snapshot(node="node1")) == {"s1", "s2", "s3", "s4", "s5"}
+
+    asyncio.run(main())
+    assert 0 < max(in_flight) <= 2
@@ -0,0 +1,125 @@
+import asyncio
+import base64
+import io
+import json
+import random
+
+import pytest
+
+from ..async_client import AsyncClient
+from ..client import Client
+from ..media import Base64Body
+from .helpers import AsyncRecordingTransport, RecordingTransport
+
+
+DATA = bytes(random.Random(7).randrange(256) for _ in range(10000))
+
+
+class ShortReadFile(io.BytesIO):
+    """
+    Binary file returning at most a few bytes per read, like a pipe or a socket.
+    """
+
+    def __init__(self, data, seed=0):
+        super().__init__(data)
+        self.random = random.Random(seed)
+
+    def readinto(self, buffer):
+        size = min(len(buffer), self.random.randint(1, 11))
+        return super().readinto(memoryview(buffer)[:size])
+
+
+class NonSeekableFile(ShortReadFile):
+
+    def seekable(self):
+        return False
+
+    def tell(self):
+        raise io.UnsupportedOperation("tell")
+
+
+def decode(body):
+    document = json.loads(b"".join(body))
+    return document, base64.b64decode(document["base64"].split(",", 1)[1])
+
+
+def test_encodes_under_short_reads():
+    for seed in range(5):
+        body = Base64Body({"phone": "5511999999999"}, "base64", ShortReadFile(DATA, seed), "application/pdf", chunk_size=30)
+        document, data = decode(body)
+        assert data == DATA
+        assert document["phone"] == "5511999999999"
+        assert document["base64"].startswith("data:application/pdf;base64,")
+
+
+def test_length_matches_the_bytes_sent(tmp_path):
+    path = tmp_path / "report.pdf"
+    path.write_bytes(DATA)
+    for size in (0, 1, 2, 3, 4, len(DATA)):
+        file = io.BytesIO(DATA[:size])
+        body = Base64Body({"phone": "5511999999999", "isGroup": False}, "base64", file, chunk_size=99)
+        sent = b"".join(body)
+        assert body.length == len(sent)
+        # a replay sends the same body
+        assert b"".join(body) == sent
+
+    body = Base64Body({}, "path", path)
+    sent = b"".join(body)
+    assert body.length == len(sent) == len(body)
+    assert json.loads(sent)["path"].startswith("data:application/pdf;base64,")
+
+
+def test_non_seekable_file_has_no_length():
+    body = Base64Body({}, "base64", NonSeekableFile(DATA))
+    assert body.length is None
+    assert decode(body)[1] == DATA
+
+
+def test_async_client_streams_the_body():
+    data = DATA * 50
+    transport = AsyncRecordingTransport()
+
+    async def main():
+        client = AsyncClient("http://h/api", "key", "bot", transport=transport)
+        await client.send_file("5511999999999", io.BytesIO(data), filename="data.bin")
+
+    asyncio.run(main())
+    # the body is sent in chunks, with the Content-Length it announced
+    [call] = transport.calls
+    assert len(call.chunks) > 2
+    assert int(call.headers["Content-Length"]) == len(call.data)
+    document, sent = decode(call.chunks)
+    assert sent == data
+    assert document["filename"] == "data.bin"
+
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 32
+
+
+@pytest.mark.parametrize("head, mimetype", [
+    (PNG, "image/png"),
+    (b"\xff\xd8\xff\xe0" + b"\x00" * 32, "image/jpeg"),
+    (b"GIF89a" + b"\x00" * 32, "image/gif"),
+    (b"RIFF\x00\x00\x00\x00WEBPVP8 " + b"\x00" * 32, "image/webp"),
+])
+def test_nameless_image_mimetype_is_sniffed(head, mimetype):
+    transport = RecordingTransport()
+    client = Client("http://h/api", "key", "bot", transport=transport)
+    client.send_image_file("5511999999999", io.BytesIO(head), caption="Hi")
+    client.send_sticker_file("5511999999999", io.BytesIO(head))
+    for call in transport.calls:
+        document = json.loads(call.data)
+        assert document["path"].startswith("data:%s;base64," % mimetype)
+        # the sniffed bytes are sent too
+        assert base64.b64decode(document["path"].split(",", 1)[1]) == head
+
+
+def test_nameless_image_of_unknown_format_is_rejected():
+    client = Client("http://h/api", "key", "bot", transport=RecordingTransport())
+    with pytest.raises(ValueError):
+        client.send_image_file("5511999999999", io.BytesIO(b"not an image"))
+    with pytest.raises(ValueError):
+        client.send_sticker_file("5511999999999", NonSeekableFile(PNG))
+    # an explicit mimetype is used as is
+    client.send_image_file("5511999999999", NonSeekableFile(PNG), mimetype="image/png")
+    assert json.loads(client.transport.calls[0].data)["path"].startswith("data:image/png;base64,")
@@ -0,0 +1,73 @@
+import pytest
+
+from ..client import Client
+from ..metrics import Metrics
+from .helpers import FakeResponse, RecordingTransport
+
+
+API = "http://localhost:21465/api"
+
+
+def test_render():
+    metrics = Metrics(buckets=(0.1, 1.0), prefix="wpp")
+    client = Client(API, "key", "bot", metrics=metrics, transport=RecordingTransport(
+        FakeResponse(b'{"status": "success"}'), FakeResponse(b'{"status": "error"}', 500), ConnectionError("refused"),
+    ))
+    client.send_message("5511999999999", "Hi")
+    client.send_message("5511999999999", "Hi")
+    with pytest.raises(ConnectionError):
+        client.send_message("5511999999999", "Hi")
+
+    text = metrics.render()
+    lines = text.splitlines()
+    labels = 'endpoint="send-message",session="bot",node="%s"' % API
+    for name, kind in (("request_duration_seconds", "histogram"), ("request_bytes_total", "counter"), ("response_bytes_total", "counter"),
+                       ("responses_total", "counter"), ("errors_total", "counter"), ("requests_in_flight", "gauge")):
+        assert any(line.startswith("# HELP wpp_%s " % name) for line in lines)
+        assert "# TYPE wpp_%s %s" % (name, kind) in lines
+
+    assert 'wpp_request_duration_seconds_bucket{%s,le="0.1"} 3' % labels in lines
+    assert 'wpp_request_duration_seconds_bucket{%s,le="+Inf"} 3' % labels in lines
+    assert 'wpp_request_duration_seconds_count{%s} 3' % labels in lines
+    assert any(line.startswith('wpp_request_duration_seconds_sum{%s} ' % labels) for line in lines)
+    assert 'wpp_response_bytes_total{%s} %d' % (labels, len(b'{"status": "success"}') + len(b'{"status": "error"}')) in lines
+    assert 'wpp_responses_total{%s,code="200"} 1' % labels in lines
+    assert 'wpp_responses_total{%s,code="500"} 1' % labels in lines
+    assert 'wpp_errors_total{%s,error="ConnectionError"} 1' % labels in lines
+    assert 'wpp_requests_in_flight{%s} 0' % labels in lines
+    assert text.endswith("\n")
+
+
+def test_label_values_are_escaped():
+    metrics = Metrics()
+    client = Client(API, "key", 'bot "1"\\', metrics=metrics, transport=RecordingTransport(FakeResponse(b"{}")))
+    client.status_session()
+    assert 'session="bot \\"1\\"\\\\"' in metrics.render()
+
+
+def test_in_flight_returns_to_zero():
+    metrics = Metrics()
+    client = Client(API, "key", "bot", metrics=metrics, transport=RecordingTransport(FakeResponse(b"{}"), TimeoutError()))
+    labels = metrics.labels(client, "status-session")
+    client.status_session()
+    assert metrics.in_flight[labels] == 0
+    with pytest.raises(TimeoutError):
+        client.status_session()
+    assert metrics.in_flight[labels] == 0
+
+
+def test_failing_hooks_do_not_fail_the_request(caplog):
+    metrics = Metrics()
+    events = []
+
+    def fail(event):
+        raise RuntimeError("tracer down")
+
+    metrics.add_hook(before=fail, after=fail)
+    metrics.add_hook(after=events.append)
+    client = Client(API, "key", "bot", metrics=metrics, transport=RecordingTransport(FakeResponse(b'{"status": "success"}')))
+    assert client.send_message("5511999999999", "Hi") == {"status": "success"}
+    assert metrics.in_flight[metrics.labels(client, "send-message")] == 0
+    # the hooks after the failing one still run
+    assert [event["status"] for event in events] == [200]
+    assert len([record for record in caplog.records if "tracer down" in str(record.exc_info)]) == 2
@@ -0,0 +1,57 @@
+import json
+
+from ..client import Client
+from ..codec import StdlibCodec
+from ..models import Chat, Group, Message, parse_models
+from .helpers import RecordingTransport
+
+
+CHATS = [
+    {"id": {"_serialized": "5511999999999@c.us"}, "name": "Alice", "isGroup": False, "t": 1655251200, "unreadCount": 2},
+    {"id": {"_serialized": "123456789-987654321@g.us"}, "name": "Team", "isGroup": True,
+     "groupMetadata": {"owner": {"_serialized": "5511999999999@c.us"}, "desc": "Hi", "participants": [{}, {}]}},
+]
+BODY = json.dumps({"status": "success", "response": CHATS}).encode()
+
+
+class CountingCodec(StdlibCodec):
+
+    name = "counting"
+
+    def __init__(self):
+        self.loads_calls = 0
+
+    def loads(self, data):
+        self.loads_calls += 1
+        return super().loads(data)
+
+
+def test_fields_are_decoded_lazily():
+    chats = parse_models(BODY, Chat)["response"]
+    assert chats[0]._values is None
+    assert (chats[0].id, chats[0].name, chats[0].is_group, chats[0].unread_count) == ("5511999999999@c.us", "Alice", False, 2)
+    assert chats[0]["t"] == 1655251200
+    assert chats[0].to_dict() == CHATS[0]
+
+
+def test_group_fields():
+    group = parse_models(BODY, Group)["response"][1]
+    assert (group.owner, group.description, group.participant_count) == ("5511999999999@c.us", "Hi", 2)
+    assert group.pinned is False
+
+
+def test_error_response():
+    assert parse_models(b'{"status": "error", "message": "Session not found"}', Message) == {"status": "error", "message": "Session not found"}
+
+
+def test_models_use_the_client_codec():
+    codec = CountingCodec()
+    client = Client("http://127.0.0.1:1/api", "secret", "bot", transport=RecordingTransport(default=BODY), codec=codec)
+
+    chats = client.all_chats(models=True)["response"]
+    assert [chat.name for chat in chats] == ["Alice", "Team"]
+    assert codec.loads_calls == 2
+
+    names = [chat.name for chat in client.iter_all_chats(models=True)]
+    assert names == ["Alice", "Team"]
+    assert codec.loads_calls == 4
@@ -0,0 +1,173 @@
+import base64
+import json
+import threading
+import time
+
+from ..client import Client
+from ..outbox import Outbox, INTERACTIVE, TRANSACTIONAL, BULK
+from ..templates import MessageTemplate
+from .helpers import RecordingTransport, wait_for
+
+
+class FakeClient:
+
+    def __init__(self, session="bot", delay=0.0):
+        self.session = session
+        self.api = {"URL": "http://127.0.0.1:1/api"}
+        self.delay = delay
+        self.sent = []
+        self.lock = threading.Lock()
+
+    def send_message(self, phone, message):
+        if self.delay:
+            time.sleep(self.delay)
+        with self.lock:
+            self.sent.append((phone, message))
+        return {"status": "success"}
+
+
+def drain(outbox, client, total, timeout=10, **options):
+    outbox.start(client, **options)
+    wait_for(lambda: len(client.sent) >= total, timeout)
+    outbox.stop()
+    return client.sent
+
+
+def test_jobs_are_sent_once_in_chat_order(tmp_path):
+    with Outbox(str(tmp_path / "outbox.db")) as outbox:
+        for i in range(30):
+            outbox.put("bot", "send_message", "chat%d" % (i % 3), BULK, message=str(i))
+        sent = drain(outbox, FakeClient(), 30, concurrency=4)
+        assert sorted(int(message) for _, message in sent) == list(range(30))
+        for chat in ("chat0", "chat1", "chat2"):
+            messages = [int(message) for phone, message in sent if phone == chat]
+            assert messages == sorted(messages)
+        assert outbox.counts("bot") == {("done", BULK): 30}
+
+
+def test_priority_classes(tmp_path):
+    with Outbox(str(tmp_path / "outbox.db")) as outbox:
+        outbox.put_many("bot", "send_message", ["bulk%d" % i for i in range(20)], message="bulk")
+        outbox.put("bot", "send_message", "vip", INTERACTIVE, message="hi")
+        sent = drain(outbox, FakeClient(), 21, concurrency=1)
+        assert sent[0] == ("vip", "hi")
+
+
+def test_long_chat_backlog_does_not_starve_other_chats(tmp_path):
+    with Outbox(str(tmp_path / "outbox.db"), prefetch=10, chat_prefetch=3) as outbox:
+        outbox.put_many("bot", "send_message", ["big"] * 100, message="x")
+        outbox.put_many("bot", "send_message", ["small%d" % i for i in range(5)], message="y")
+        sent = drain(outbox, FakeClient(), 105, concurrency=2)
+        assert len(sent) == 105
+        # round-robin: every small chat is served among the first sends, not after the 100 of "big"
+        first = [phone for phone, _ in sent[:15]]
+        assert all("small%d" % i in first for i in range(5))
+
+
+def test_resume_after_restart(tmp_path):
+    path = str(tmp_path / "outbox.db")
+    with Outbox(path) as outbox:
+        outbox.put_many("bot", "send_message", ["a", "b", "c"], message="x")
+    with Outbox(path) as outbox:
+        assert len(drain(outbox, FakeClient(), 3)) == 3
+        assert outbox.counts("bot") == {("done", BULK): 3}
+
+
+def test_reload_keeps_window_size(tmp_path):
+    with Outbox(str(tmp_path / "outbox.db"), prefetch=20, chat_prefetch=4) as outbox:
+        for i in range(40):
+            outbox.put("bot", "send_message", "chat%d" % (i % 5), BULK, message=str(i))
+        client = FakeClient(delay=0.05)
+        drainer = outbox.start(client, concurrency=2)
+        for _ in range(3):
+            time.sleep(0.08)
+            # jobs in flight are not loaded again, nor counted in the window
+            drainer.reload()
+        time.sleep(0.08)
+        with drainer.condition:
+            for priority, queue in enumerate(drainer.queues):
+                assert drainer.sizes[priority] == sum(len(jobs) for jobs in queue.values())
+        outbox.stop()
+        messages = [message for _, message in client.sent]
+        assert len(messages) == len(set(messages))
+        assert outbox.counts("bot").get(("done", BULK), 0) == len(messages)
+
+
+class TemplateClient(FakeClient):
+
+    def send_template(self, phone, template, isGroup=False, **fields):
+        body = b"".join(template.body({"phone": phone, "isGroup": isGroup, **fields}))
+        with self.lock:
+            self.sent.append((phone, json.loads(body)))
+        return {"status": "success"}
+
+
+def test_templates_are_stored_once(tmp_path):
+    path = str(tmp_path / "outbox.db")
+    template = MessageTemplate.file(b"%PDF-1.4 catalog", "Our catalog", filename="catalog.pdf", mimetype="application/pdf")
+    with Outbox(path) as outbox:
+        outbox.put_many("bot", "send_template", ["5511999999990", "5511999999991"], template=template)
+        outbox.put("bot", "send_template", "5511999999992", template=template, mentioned=["5511999999990"])
+        assert outbox.db.execute("SELECT COUNT(*) FROM templates").fetchone()[0] == 1
+        outbox.put("bot", "send_template", "123456789@g.us", template=MessageTemplate.mentioned("Hi @5511999999990"), mentioned=["5511999999990"])
+
+    # sent after a restart, the template read back from the spool
+    with Outbox(path) as outbox:
+        sent = dict(drain(outbox, TemplateClient(), 4))
+        assert sent["5511999999990"] == {
+            "phone": "5511999999990",
+            "isGroup": False,
+            "message": "Our catalog",
+            "filename": "catalog.pdf",
+            "base64": "data:application/pdf;base64," + base64.b64encode(b"%PDF-1.4 catalog").decode(),
+        }
+        assert sent["5511999999992"]["mentioned"] == ["5511999999990"]
+        # send_mentioned only sends to groups, whatever the job asked for
+        assert sent["123456789@g.us"] == {"phone": "123456789@g.us", "isGroup": True, "mentioned": ["5511999999990"], "message": "Hi @5511999999990"}
+        outbox.purge()
+        assert outbox.db.execute("SELECT COUNT(*) FROM templates").fetchone()[0] == 0
+
+
+def test_missing_media_file_fails_the_job(tmp_path):
+    transport = RecordingTransport()
+    client = Client("http://127.0.0.1:1/api", "secret", "bot", transport=transport)
+    with Outbox(str(tmp_path / "outbox.db")) as outbox:
+        job_id = outbox.put("bot", "send_file", "5511999", file=str(tmp_path / "nonexistent.pdf"))
+        outbox.put("bot", "send_message", "5511999", message="after the file")
+        outbox.start(client, concurrency=1, retry_delay=0.01)
+        # the next job of the chat is not stuck behind it
+        assert wait_for(lambda: outbox.counts("bot").get(("done", TRANSACTIONAL)) == 1)
+        outbox.stop()
+        assert outbox.counts("bot") == {("done", TRANSACTIONAL): 1, ("failed", TRANSACTIONAL): 1}
+        [(failed_id, _, _, method, _, attempts, error)] = outbox.failed("bot")
+        assert (failed_id, method, attempts) == (job_id, "send_file", 1)
+        assert "FileNotFoundError" in error
+        assert transport.urls == ["http://127.0.0.1:1/api/bot/send-message"]
+
+
+class UnreachableClient(FakeClient):
+
+    def __init__(self):
+        super().__init__()
+        self.attempts = 0
+
+    def send_message(self, phone, message):
+        self.attempts += 1
+        raise ConnectionError("connection refused")
+
+
+def test_transport_errors_fail_the_job_after_max_attempts(tmp_path):
+    client = UnreachableClient()
+    with Outbox(str(tmp_path / "outbox.db")) as outbox:
+        outbox.put("bot", "send_message", "5511999", message="Hi")
+        outbox.start(client, concurrency=1, retry_delay=0.01, max_attempts=3)
+        assert wait_for(lambda: outbox.counts("bot").get(("failed", TRANSACTIONAL)) == 1)
+        outbox.stop()
+        assert client.attempts == 3
+        assert outbox.failed("bot")[0][5] == 3
+        # a retried job gets its attempts back
+        assert outbox.retry_failed("bot") == 1
+        outbox.start(client, concurrency=1, retry_delay=0.01, max_attempts=2)
+        assert wait_for(lambda: outbox.counts("bot").get(("failed", TRANSACTIONAL)) == 1)
+        outbox.stop()
+        assert client.attempts == 5
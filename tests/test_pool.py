@@ -0,0 +1,40 @@
+import pytest
+
+from ..pool import SessionPool
+
+
+# the node transports are created by the pool
+pytest.importorskip("requests")
+
+
+NODES = {"node1": ("http://10.0.0.1:21465/api", "secret"), "node2": ("http://10.0.0.2:21465/api", "secret")}
+
+
+def test_drain_moves_only_the_node_sessions():
+    with SessionPool(NODES) as pool:
+        sessions = ["session-%d" % i for i in range(200)]
+        before = {session: pool.session(session).node for session in sessions}
+        moved = pool.drain_node("node2")
+        assert sorted(moved) == sorted(session for session, node in before.items() if node == "node2")
+        assert all(pool.session(session).node == "node1" for session in sessions)
+
+
+def test_drain_last_node_changes_nothing():
+    with SessionPool(NODES) as pool:
+        pool.drain_node("node2")
+        transport = pool.transports["node1"]
+        with pytest.raises(ValueError):
+            pool.drain_node("node1")
+        with pytest.raises(KeyError):
+            pool.drain_node("node3")
+        assert pool.transports["node1"] is transport
+        assert pool.session("customer").node == "node1"
+
+
+def test_add_existing_node_is_rejected():
+    with SessionPool(NODES) as pool:
+        transport = pool.transports["node1"]
+        with pytest.raises(ValueError):
+            pool.add_node("node1", "http://10.0.0.9:21465/api", "secret")
+        assert pool.transports["node1"] is transport
+        assert pool.nodes["node1"] == NODES["node1"]
@@ -0,0 +1,123 @@
+import threading
+import time
+
+from ..presence import PresenceCoalescer
+from .helpers import wait_for
+
+
+class FakeClient:
+
+    def __init__(self, session="bot", fail=()):
+        self.session = session
+        self.fail = set(fail)
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call(self, method, *args):
+        with self.lock:
+            self.calls.append((method,) + args)
+        if method in self.fail:
+            return {"status": "error", "message": "session closed"}
+        return {"status": "success"}
+
+    def typing(self, phone, value, isGroup=False):
+        return self.__call("typing", phone, value)
+
+    def chat_state(self, phone, chatstate):
+        return self.__call("chat_state", phone, chatstate)
+
+    def send_seen(self, phone):
+        return self.__call("send_seen", phone)
+
+
+def test_pending_state_is_replaced():
+    client = FakeClient()
+    with PresenceCoalescer(delay=0.05, resend_after=10.0) as presence:
+        presence.typing(client, "5511999999999", True)
+        presence.chat_state(client, "5511999999999", 0)
+        presence.typing(client, "5511999999999", False)
+        presence.typing(client, "5511888888888", True)
+        assert wait_for(lambda: len(client.calls) == 2)
+        time.sleep(0.1)
+        # only the last state asked for is sent, once per chat
+        assert sorted(client.calls) == [("typing", "5511888888888", True), ("typing", "5511999999999", False)]
+        stats = presence.stats()
+        assert (stats["calls"], stats["sent"], stats["superseded"]) == (4, 2, 2)
+
+
+def test_repeat_is_skipped_within_resend_after():
+    client = FakeClient()
+    with PresenceCoalescer(delay=0.01, resend_after=0.3) as presence:
+        presence.typing(client, "5511999999999", True)
+        assert wait_for(lambda: len(client.calls) == 1)
+        presence.typing(client, "5511999999999", True)
+        time.sleep(0.1)
+        assert len(client.calls) == 1
+        # past resend_after the same state is sent again
+        time.sleep(0.25)
+        presence.typing(client, "5511999999999", True)
+        assert wait_for(lambda: len(client.calls) == 2)
+        assert presence.stats()["superseded"] == 1
+
+
+def test_failed_send_keeps_the_state_to_send():
+    client = FakeClient(fail={"typing"})
+    with PresenceCoalescer(delay=0.01, resend_after=10.0) as presence:
+        presence.typing(client, "5511999999999", True)
+        assert wait_for(lambda: presence.stats()["errors"] == 1)
+        # not known to be delivered: the same state is not dropped as a repeat
+        client.fail.clear()
+        presence.typing(client, "5511999999999", True)
+        assert wait_for(lambda: len(client.calls) == 2)
+        assert client.calls == [("typing", "5511999999999", True)] * 2
+
+
+def test_send_seen_is_collapsed_per_window():
+    client = FakeClient()
+    with PresenceCoalescer(seen_window=0.2) as presence:
+        started = time.monotonic()
+        presence.send_seen(client, "5511999999999")
+        # the first one is sent at once
+        assert wait_for(lambda: len(client.calls) == 1, timeout=0.15)
+        for _ in range(4):
+            presence.send_seen(client, "5511999999999")
+        # the calls within the window are sent once, at its end
+        assert wait_for(lambda: len(client.calls) == 2)
+        assert time.monotonic() - started >= 0.2
+        time.sleep(0.25)
+        assert client.calls == [("send_seen", "5511999999999")] * 2
+        assert presence.stats()["collapsed"] == 3
+
+
+def test_idle_chats_are_forgotten():
+    client = FakeClient()
+    with PresenceCoalescer(delay=0.01, seen_window=0.05, resend_after=0.05) as presence:
+        presence.typing(client, "5511999999999", True)
+        presence.send_seen(client, "5511888888888")
+        assert wait_for(lambda: len(client.calls) == 2)
+        assert wait_for(lambda: presence.stats()["chats"] == 0)
+
+
+def test_flush_and_close():
+    client = FakeClient()
+    presence = PresenceCoalescer(delay=60.0, seen_window=60.0)
+    presence.send_seen(client, "5511999999999")
+    assert wait_for(lambda: len(client.calls) == 1)
+    presence.send_seen(client, "5511999999999")
+    presence.typing(client, "5511999999999", True)
+    # sent now, without waiting for delay and seen_window
+    assert presence.flush(timeout=2.0)
+    assert sorted(client.calls) == [("send_seen", "5511999999999")] * 2 + [("typing", "5511999999999", True)]
+
+    presence.chat_state(client, "5511888888888", 1)
+    presence.close()
+    assert client.calls[-1] == ("chat_state", "5511888888888", 1)
+    assert not presence.thread.is_alive()
+
+
+def test_close_without_flush_drops_the_queue():
+    client = FakeClient()
+    presence = PresenceCoalescer(delay=60.0)
+    presence.typing(client, "5511999999999", True)
+    presence.close(flush=False)
+    assert client.calls == []
@@ -0,0 +1,233 @@
+import asyncio
+import io
+import threading
+
+import pytest
+
+from .. import resilience
+from ..async_client import AsyncClient
+from ..client import Client
+from ..media import Base64Body, MediaReadError
+from ..resilience import CircuitBreaker, CircuitOpenError, RetryPolicy, is_replayable
+from ..templates import SplicedBody
+from .helpers import AsyncRecordingTransport, FakeResponse, RecordingTransport
+
+
+API = "http://localhost:21465/api"
+
+
+class NonSeekableFile(io.BytesIO):
+
+    def tell(self):
+        raise io.UnsupportedOperation("tell")
+
+
+class UnreadableFile(io.BytesIO):
+
+    def readinto(self, buffer):
+        raise OSError(5, "Input/output error")
+
+
+def test_unreadable_upload_does_not_open_the_breaker():
+    breaker = CircuitBreaker(failures=3)
+    transport = RecordingTransport()
+    client = Client(API, "key", "bot", transport=transport, breaker=breaker)
+    for _ in range(3):
+        with pytest.raises(MediaReadError) as error:
+            client.send_file("5511999999999", UnreadableFile(b"x" * 100), filename="report.pdf")
+        assert isinstance(error.value.__cause__, OSError)
+    assert breaker.state == "closed"
+    assert client.status_session() == {"status": "success"}
+
+
+def test_missing_media_file_is_not_transient(tmp_path):
+    path = tmp_path / "report.pdf"
+    path.write_bytes(b"x" * 100)
+    breaker = CircuitBreaker(failures=1)
+    client = Client(API, "key", "bot", transport=RecordingTransport(), breaker=breaker)
+    body_of = client._request_body
+
+    def delete_then_send(endpoint, body, payload=None):
+        # the file disappears between the Base64Body creation and the upload
+        path.unlink()
+        return body_of(endpoint, body, payload)
+
+    client._request_body = delete_then_send
+    with pytest.raises(MediaReadError):
+        client.send_file("5511999999999", str(path))
+    assert breaker.state == "closed"
+
+
+def client_with(transport, **policies):
+    return Client(API, "key", "bot", transport=transport, policies={name.replace("_", "-"): policy for name, policy in policies.items()})
+
+
+def test_idempotent_request_is_retried_on_status_and_error():
+    transport = RecordingTransport(503, ConnectionError("reset"), 200)
+    client = client_with(transport, GET=RetryPolicy(attempts=3, backoff=0))
+    assert client.status_session() == {"status": "success"}
+    assert len(transport.calls) == 3
+
+
+def test_retries_stop_after_the_last_attempt():
+    transport = RecordingTransport(TimeoutError(), TimeoutError(), TimeoutError(), 200)
+    client = client_with(transport, GET=RetryPolicy(attempts=3, backoff=0))
+    with pytest.raises(TimeoutError):
+        client.status_session()
+    assert len(transport.calls) == 3
+
+
+def test_local_errors_are_not_retried():
+    transport = RecordingTransport(PermissionError(13, "denied"), 200)
+    client = client_with(transport, GET=RetryPolicy(attempts=3, backoff=0))
+    with pytest.raises(PermissionError):
+        client.status_session()
+    assert len(transport.calls) == 1
+
+
+def test_send_is_not_replayed_after_a_server_error():
+    transport = RecordingTransport(FakeResponse(b'{"status": "error"}', 502), ConnectionError("reset"), 200)
+    client = client_with(transport, POST=RetryPolicy(attempts=3, backoff=0, idempotent=False))
+    assert client.send_message("5511999999999", "Hi") == {"status": "error"}
+    assert len(transport.calls) == 1
+    # the request may have been delivered before the connection was lost
+    with pytest.raises(ConnectionError):
+        client.send_message("5511999999999", "Hi")
+    assert len(transport.calls) == 2
+
+
+def test_send_is_retried_when_the_connection_was_refused():
+    transport = RecordingTransport(ConnectionRefusedError(111, "refused"), 200)
+    client = client_with(transport, POST=RetryPolicy(attempts=3, backoff=0, idempotent=False))
+    assert client.send_message("5511999999999", "Hi") == {"status": "success"}
+    assert len(transport.calls) == 2
+    assert transport.calls[0].data == transport.calls[1].data
+
+
+def test_unreplayable_body_is_sent_once():
+    transport = RecordingTransport(ConnectionRefusedError(111, "refused"), 200)
+    client = client_with(transport, POST=RetryPolicy(attempts=3, backoff=0, idempotent=False))
+    with pytest.raises(ConnectionRefusedError):
+        client.send_file("5511999999999", NonSeekableFile(b"x" * 100))
+    assert len(transport.calls) == 1
+
+
+def test_is_replayable():
+    assert is_replayable(None)
+    assert is_replayable(b"{}") and is_replayable(bytearray(b"{}")) and is_replayable("{}")
+    assert is_replayable(Base64Body({}, "base64", io.BytesIO(b"x")))
+    assert is_replayable(SplicedBody([b"{", b"}"]))
+    assert not is_replayable(Base64Body({}, "base64", NonSeekableFile(b"x")))
+    assert not is_replayable(iter([b"{}"]))
+
+
+class SlowFirstTransport(RecordingTransport):
+    """
+    The first request waits until released, the next ones answer at once.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Event()
+
+    def request(self, method, url, headers=None, data=None, timeout=None):
+        self.record(method, url, headers, data, timeout)
+        if len(self.calls) == 1:
+            self.release.wait(5)
+            return FakeResponse(b'{"status": "slow"}')
+        return FakeResponse(b'{"status": "fast"}')
+
+
+def test_hedge_answers_with_the_fastest_request():
+    transport = SlowFirstTransport()
+    client = client_with(transport, status_session=RetryPolicy(attempts=1, hedge=0.01))
+    try:
+        assert client.status_session() == {"status": "fast"}
+        assert len(transport.calls) == 2
+    finally:
+        transport.release.set()
+
+
+def test_hedge_is_not_sent_for_a_fast_request():
+    transport = RecordingTransport(200)
+    client = client_with(transport, status_session=RetryPolicy(attempts=1, hedge=1.0))
+    assert client.status_session() == {"status": "success"}
+    assert len(transport.calls) == 1
+
+
+def test_sends_are_never_hedged():
+    assert RetryPolicy(hedge=0.1, idempotent=False).hedge is None
+
+
+class SlowFirstAsyncTransport(AsyncRecordingTransport):
+
+    async def request(self, method, url, headers=None, data=None, timeout=None):
+        self.record(method, url, headers, data, timeout)
+        if len(self.calls) == 1:
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                self.cancelled = True
+                raise
+            return FakeResponse(b'{"status": "slow"}')
+        return FakeResponse(b'{"status": "fast"}')
+
+
+def test_async_hedge_cancels_the_slower_request():
+    transport = SlowFirstAsyncTransport()
+
+    async def main():
+        client = AsyncClient(API, "key", "bot", transport=transport, policies={"status-session": RetryPolicy(attempts=1, hedge=0.01)})
+        result = await client.status_session()
+        # let the cancellation reach the transport
+        await asyncio.sleep(0)
+        return result
+
+    assert asyncio.run(main()) == {"status": "fast"}
+    assert len(transport.calls) == 2
+    assert transport.cancelled
+
+
+def test_breaker_opens_then_half_opens_then_closes(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(resilience, "monotonic", lambda: now[0])
+    breaker = CircuitBreaker(failures=2, reset_timeout=30.0, name="node1")
+    transport = RecordingTransport(503, ConnectionError("reset"), 200)
+    client = Client(API, "key", "bot", transport=transport, breaker=breaker)
+
+    client.status_session()
+    assert breaker.state == "closed"
+    with pytest.raises(ConnectionError):
+        client.status_session()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError) as error:
+        client.status_session()
+    assert error.value.retry_after == 30.0
+    assert len(transport.calls) == 2
+
+    now[0] += 30.0
+    assert breaker.state == "half-open"
+    assert client.status_session() == {"status": "success"}
+    assert breaker.state == "closed"
+    assert len(transport.calls) == 3
+
+
+def test_failed_trial_opens_the_breaker_again(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(resilience, "monotonic", lambda: now[0])
+    breaker = CircuitBreaker(failures=1, reset_timeout=10.0)
+    breaker.failure()
+    now[0] += 10.0
+    breaker.before()
+    # a single trial request at a time
+    with pytest.raises(CircuitOpenError):
+        breaker.before()
+    breaker.record(502)
+    assert breaker.state == "open"
+    now[0] += 10.0
+    breaker.before()
+    breaker.release()
+    assert breaker.state == "half-open"
+    breaker.before()
+    breaker.record(500)
+    assert breaker.state == "closed"
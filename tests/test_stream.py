@@ -0,0 +1,150 @@
+import json
+import random
+
+import pytest
+
+from .. import stream
+from ..stream import JSONArrayStream, StreamError
+
+
+ITEMS = [
+    3.25,
+    -1e-10,
+    0,
+    -7,
+    12E+3,
+    True,
+    False,
+    None,
+    "",
+    "quote \" backslash \\ slash / brackets ]}[{ and , commas",
+    "unicode é ü 中文 😀",
+    {"id": {"_serialized": "5511999999999@c.us"}, "t": 1655251200, "pin": 1.5e3, "tags": [], "msgs": None},
+    [[1, [2.5, [-3e2]]], {}, {"a": {"b": [True, False, None]}}],
+]
+DOCUMENT = json.dumps({"status": "success", "count": 13, "response": ITEMS, "session": "bot"}, ensure_ascii=False).encode()
+
+
+def parse(chunks, **kwargs):
+    parser = JSONArrayStream(**kwargs)
+    items = []
+    for chunk in chunks:
+        items += parser.feed(chunk)
+    items += parser.close()
+    return parser, items
+
+
+def split(data, cuts):
+    cuts = sorted(set(cuts))
+    return [data[start:end] for start, end in zip([0] + cuts, cuts + [len(data)])]
+
+
+def test_whole_document():
+    parser, items = parse([DOCUMENT])
+    assert items == ITEMS
+    assert parser.envelope == {"status": "success", "count": 13, "session": "bot"}
+
+
+def test_every_split_point():
+    # splits numbers after ".", "e" and "-", strings after a backslash, and multi-byte characters
+    for cut in range(1, len(DOCUMENT)):
+        assert parse([DOCUMENT[:cut], DOCUMENT[cut:]])[1] == ITEMS, cut
+
+
+def test_byte_by_byte():
+    assert parse([DOCUMENT[i:i + 1] for i in range(len(DOCUMENT))])[1] == ITEMS
+
+
+def test_random_chunks():
+    rng = random.Random(6)
+    for _ in range(300):
+        cuts = rng.sample(range(1, len(DOCUMENT)), rng.randint(1, 30))
+        assert parse(split(DOCUMENT, cuts))[1] == ITEMS
+
+
+def test_number_split_after_dot():
+    data = b'{"response": [3.25, 10]}'
+    assert parse([data[:16], data[16:]])[1] == [3.25, 10]
+
+
+def test_number_at_end_of_chunk_is_held_back():
+    parser = JSONArrayStream()
+    assert parser.feed(b'{"response": [1, 23') == [1]
+    assert parser.feed(b"4") == []
+    assert parser.feed(b"]}") == [234]
+    assert parser.close() == []
+
+
+def test_raw_items():
+    data = b'{"response": [{"a": 1}, "x", 2.5]}'
+    for cut in range(1, len(data)):
+        assert parse([data[:cut], data[cut:]], raw=True)[1] == ['{"a": 1}', '"x"', "2.5"]
+
+
+RAW_ITEMS = [json.dumps(item, ensure_ascii=False) for item in ITEMS]
+
+
+def test_raw_items_are_not_decoded(monkeypatch):
+    decoded = []
+    raw_decode = stream.JSONDecoder.raw_decode
+    monkeypatch.setattr(stream.JSONDecoder, "raw_decode", lambda self, s, idx=0: decoded.append(s[idx]) or raw_decode(self, s, idx))
+    parser, items = parse([DOCUMENT], raw=True)
+    assert items == RAW_ITEMS
+    assert parser.envelope == {"status": "success", "count": 13, "session": "bot"}
+    # only the keys, the envelope values and the scalar items
+    assert not set("[{") & set(decoded)
+
+
+def test_raw_every_split_point():
+    for cut in range(1, len(DOCUMENT)):
+        assert parse([DOCUMENT[:cut], DOCUMENT[cut:]], raw=True)[1] == RAW_ITEMS, cut
+
+
+def test_raw_deep_item():
+    # deeper than CONTAINER: found by the scanner
+    nested = "]"
+    for _ in range(20):
+        nested = [nested]
+    item = json.dumps({"a": nested, "b": "\\"})
+    data = ('{"response": [%s, {"c": 1}]}' % item).encode()
+    assert parse([data], raw=True)[1] == [item, '{"c": 1}']
+
+
+@pytest.mark.parametrize("version", [(3, 10), (3, 11)])
+def test_container_pattern(monkeypatch, version):
+    monkeypatch.setattr(stream.sys, "version_info", version)
+    pattern = stream._container_pattern(3)
+    for text in RAW_ITEMS[-2:] + ['{"a": "}\\"{"}', '[[1, [2, {"x": 3}]], 4]']:
+        assert pattern.match(text + ", 1]").group() == text
+    # an item going on in the next chunk, or nested too deep
+    assert pattern.match('{"a": [1, {"b": "x"}') is None
+    assert pattern.match("[[[[[1]]]]]") is None
+
+
+def test_top_level_array():
+    assert parse([b"[1, ", b"[2], ", b'{"a": "]"}]'])[1] == [1, [2], {"a": "]"}]
+
+
+def test_large_item_is_scanned_once():
+    item = {"messages": [{"body": "x" * 100, "id": i} for i in range(20000)]}
+    data = json.dumps({"response": [item, 1]}).encode()
+    chunks = [data[i:i + 512] for i in range(0, len(data), 512)]
+    assert parse(chunks)[1] == [item, 1]
+
+
+def test_error_envelope():
+    with pytest.raises(StreamError) as e:
+        parse([b'{"status": "error", "message": "Session not found"}'])
+    assert e.value.envelope == {"status": "error", "message": "Session not found"}
+
+
+def test_truncated_document():
+    with pytest.raises(StreamError):
+        parse([b'{"response": [1, {"a": 2'])
+
+
+def test_invalid_value():
+    with pytest.raises(StreamError):
+        parse([b'{"response": [1, tru, 2]}'])
+    with pytest.raises(StreamError):
+        parse([b'{"response": [1, 2.5.1]}'])
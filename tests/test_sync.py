@@ -0,0 +1,73 @@
+import threading
+
+from ..sync import MessageStore, MessageSync
+
+
+def message(chat, number, ts, body=None):
+    return {"id": {"_serialized": "%s_%d" % (chat, number)}, "from": chat, "t": ts, "type": "chat", "body": body or "message %d" % number}
+
+
+class FakeClient:
+
+    def __init__(self, chats):
+        # chat id -> (last activity, messages)
+        self.chats = chats
+        self.downloads = []
+        self.lock = threading.Lock()
+
+    def iter_all_chats(self):
+        for chat_id, (activity, messages) in self.chats.items():
+            yield {"id": {"_serialized": chat_id}, "name": chat_id, "t": activity}
+
+    def iter_all_messages_in_chat(self, chat_id):
+        with self.lock:
+            self.downloads.append(chat_id)
+        if chat_id == "broken@c.us":
+            raise ConnectionError("reset")
+        return iter(self.chats[chat_id][1])
+
+
+def test_store_ignores_stored_messages_and_searches_bodies(tmp_path):
+    with MessageStore(str(tmp_path / "sync.db")) as store:
+        messages = [message("a@c.us", i, 100 + i) for i in range(5)]
+        assert store.add_messages("a@c.us", messages) == 5
+        assert store.add_messages("a@c.us", messages[3:] + [message("a@c.us", 5, 105, "50% off_now")]) == 1
+        assert store.count() == 6
+        assert [m["t"] for m in store.messages("a@c.us", since=102, until=105)] == [102, 103, 104]
+        # LIKE wildcards are matched literally
+        assert [m["body"] for m in store.search("% off_")] == ["50% off_now"]
+        assert store.search("0%") == [store.messages("a@c.us")[-1]]
+
+
+def test_sync_is_incremental(tmp_path):
+    chats = {
+        "a@c.us": (110, [message("a@c.us", i, 100 + i) for i in range(10)]),
+        "b@c.us": (200, [message("b@c.us", i, 200) for i in range(3)]),
+    }
+    client = FakeClient(chats)
+    with MessageStore(str(tmp_path / "sync.db")) as store:
+        sync = MessageSync(client, store, concurrency=2, batch_size=4)
+        report = sync.sync()
+        assert (report["chats"], report["synced"], report["skipped"], report["messages"]) == (2, 2, 0, 13)
+        assert store.chat_state("a@c.us") == (110, 109, "a@c.us_9")
+
+        # unchanged chats cost no request
+        client.downloads.clear()
+        report = sync.sync()
+        assert (report["skipped"], report["messages"], client.downloads) == (2, 0, [])
+
+        # a changed chat only adds its new messages
+        chats["a@c.us"] = (120, chats["a@c.us"][1] + [message("a@c.us", 10, 120)])
+        report = sync.sync()
+        assert (report["synced"], report["skipped"], report["messages"], client.downloads) == (1, 1, 1, ["a@c.us"])
+        assert store.chat_state("a@c.us") == (120, 120, "a@c.us_10")
+        assert store.count("a@c.us") == 11
+
+
+def test_failed_chat_is_retried_next_run(tmp_path):
+    client = FakeClient({"broken@c.us": (100, []), "a@c.us": (100, [message("a@c.us", 0, 100)])})
+    with MessageStore(str(tmp_path / "sync.db")) as store:
+        report = MessageSync(client, store).sync()
+        assert (report["synced"], report["failed"]) == (1, 1)
+        assert store.chat_state("broken@c.us") is None
+        assert [chat[0] for chat in store.chats()] == ["a@c.us"]
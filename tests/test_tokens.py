@@ -0,0 +1,108 @@
+import asyncio
+import threading
+import time
+
+from ..tokens import TokenStore
+
+
+class FakeClient:
+
+    def __init__(self, session="bot", delay=0.0, fail=False):
+        self.session = session
+        self.api = {"URL": "http://127.0.0.1:1/api"}
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def generate_token(self):
+        with self.lock:
+            self.calls += 1
+            calls = self.calls
+        if self.delay:
+            time.sleep(self.delay)
+        if self.fail:
+            return {"status": "error"}
+        return {"status": "success", "token": "token-%d" % calls}
+
+
+class AsyncFakeClient(FakeClient):
+
+    async def generate_token(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return {"status": "success", "token": "token-%d" % self.calls}
+
+
+def test_token_is_generated_once_and_persisted(tmp_path):
+    path = str(tmp_path / "tokens.db")
+    client = FakeClient()
+    with TokenStore(path) as store:
+        assert store.token(client) == "token-1"
+        assert store.token(client) == "token-1"
+    with TokenStore(path) as store:
+        assert store.token(client) == "token-1"
+        assert store.generated == 0
+    assert client.calls == 1
+
+
+def test_concurrent_refresh_of_a_stale_token_generates_once(tmp_path):
+    path = str(tmp_path / "tokens.db")
+    client = FakeClient(delay=0.05)
+    with TokenStore(path) as store:
+        store.set(*TokenStore.key(client), "stale")
+    # one store per thread, like one per process
+    stores = [TokenStore(path, poll=0.01) for _ in range(8)]
+    results = []
+    threads = [threading.Thread(target=lambda store=store: results.append(store.refresh(client, "stale"))) for store in stores]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for store in stores:
+        store.close()
+
+    assert client.calls == 1
+    assert results == ["token-1"] * 8
+
+
+def test_expired_lease_is_taken_over(tmp_path):
+    path = str(tmp_path / "tokens.db")
+    client = FakeClient()
+    with TokenStore(path, lease=0.1, poll=0.01) as store:
+        # a refresh that died holding its lease
+        store._TokenStore__claim(client, None, "dead-owner")
+        started = time.monotonic()
+        assert store.refresh(client, None) == "token-1"
+        assert 0.05 < time.monotonic() - started < 2
+
+
+def test_failed_generation_releases_the_lease(tmp_path):
+    client = FakeClient(fail=True)
+    with TokenStore(str(tmp_path / "tokens.db"), lease=60) as store:
+        assert store.token(client) is None
+        client.fail = False
+        # not left waiting for the lease of the failed refresh
+        assert store.token(client) == "token-2"
+
+
+def test_async_refresh_does_not_block_the_event_loop(tmp_path):
+    path = str(tmp_path / "tokens.db")
+    client = AsyncFakeClient()
+
+    async def main():
+        with TokenStore(path, poll=0.01) as store, TokenStore(path) as other:
+            # another process holds the write lock of the database
+            other.db.execute("BEGIN IMMEDIATE")
+            ticks = 0
+            refresh = asyncio.ensure_future(store.atoken(client))
+            while not refresh.done() and ticks < 10:
+                await asyncio.sleep(0.01)
+                ticks += 1
+            other.db.execute("COMMIT")
+            assert ticks == 10
+            assert await refresh == "token-1"
+            assert await store.arefresh(client, "token-0") == "token-1"
+
+    asyncio.run(main())
+    assert client.calls == 1
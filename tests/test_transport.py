@@ -0,0 +1,120 @@
+import asyncio
+
+import pytest
+
+from .. import async_client, client as client_module, transport as transport_module
+from ..async_client import AsyncClient
+from ..client import Client
+from ..transport import AsyncHttpxTransport, HttpxTransport, RequestsTransport, default_transport, httpx_timeout, is_transient_error
+from .helpers import AsyncRecordingTransport, RecordingTransport
+
+
+API = "http://localhost:21465/api"
+
+
+def test_owned_transport_is_closed(monkeypatch):
+    created = []
+
+    def default(**options):
+        created.append(RecordingTransport())
+        return created[-1]
+
+    monkeypatch.setattr(client_module, "default_transport", default)
+    with Client(API, "key", "bot") as client:
+        assert client.transport is created[0]
+    assert created[0].closed
+
+    client = Client(API, "key", "bot")
+    client.close()
+    assert created[1].closed
+
+
+def test_shared_transport_is_not_closed():
+    transport = RecordingTransport()
+    with Client(API, "key", "bot", transport=transport):
+        pass
+    Client(API, "key", "bot", transport=transport).close()
+    assert not transport.closed
+
+
+def test_async_owned_transport_is_closed(monkeypatch):
+    created = []
+
+    def default(**options):
+        created.append(AsyncRecordingTransport())
+        return created[-1]
+
+    monkeypatch.setattr(async_client, "AsyncHttpxTransport", default)
+    shared = AsyncRecordingTransport()
+
+    async def main():
+        async with AsyncClient(API, "key", "bot") as client:
+            # a view does not own the transport of its Client
+            await client.with_timeout(5).close()
+            assert not created[0].closed
+        assert created[0].closed
+        async with AsyncClient(API, "key", "bot", transport=shared):
+            pass
+
+    asyncio.run(main())
+    assert not shared.closed
+
+
+def test_client_options_reach_the_default_transport(monkeypatch):
+    options = []
+    monkeypatch.setattr(client_module, "default_transport", lambda **kwargs: options.append(kwargs) or RecordingTransport())
+    Client(API, "key", "bot", timeout=(3, 30), pool_size=4, http2=True)
+    assert options == [{"timeout": (3, 30), "pool_size": 4, "http2": True}]
+
+
+def test_default_transport_picks_the_backend(monkeypatch):
+    monkeypatch.setattr(transport_module, "RequestsTransport", lambda **kwargs: ("requests", kwargs))
+    monkeypatch.setattr(transport_module, "HttpxTransport", lambda **kwargs: ("httpx", kwargs))
+    assert default_transport(pool_size=4, timeout=5) == ("requests", {"pool_size": 4, "timeout": 5, "retries": 0})
+    assert default_transport(pool_size=4, timeout=5, http2=True) == ("httpx", {"pool_size": 4, "timeout": 5, "http2": True, "retries": 0})
+
+
+def test_requests_transport_configures_the_session():
+    requests = pytest.importorskip("requests")
+    with RequestsTransport(pool_size=4, timeout=(3, 30)) as transport:
+        adapter = transport.session.get_adapter("http://localhost")
+        assert adapter._pool_maxsize == 4
+        sent = []
+        transport.session.request = lambda method, url, **kwargs: sent.append(kwargs["timeout"])
+        transport.request("GET", API)
+        transport.request("GET", API, timeout=7)
+        assert sent == [(3, 30), 7]
+
+    assert is_transient_error(requests.ConnectionError()) and is_transient_error(requests.ReadTimeout())
+    # not a failure of the connection: the same request fails again
+    assert not is_transient_error(requests.exceptions.InvalidURL())
+    assert not is_transient_error(requests.exceptions.InvalidHeader())
+
+
+def test_httpx_transport_configures_the_client():
+    pytest.importorskip("httpx")
+    pytest.importorskip("h2")
+    with HttpxTransport(pool_size=4, timeout=(3, 30), http2=True) as transport:
+        assert transport.client.timeout == httpx_timeout((3, 30))
+        pool = transport.client._transport._pool
+        assert pool._max_keepalive_connections == 4
+        assert pool._http2
+    assert transport.client.is_closed
+
+    with HttpxTransport(http2=False) as transport:
+        assert not transport.client._transport._pool._http2
+
+
+def test_async_transport_rejects_with():
+    pytest.importorskip("httpx")
+
+    async def main():
+        transport = AsyncHttpxTransport()
+        with pytest.raises(TypeError):
+            with transport:
+                pass
+        async with transport:
+            pass
+        assert transport.client.is_closed
+
+    asyncio.run(main())
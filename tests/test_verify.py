@@ -0,0 +1,61 @@
+from ..verify import NumberVerifier, VerificationResult, VerificationStore, normalize_number
+
+
+class FakeClient:
+    """
+    Answers check_number_status like WPPConnect server: numbers ending in an even digit exist.
+    """
+
+    def __init__(self):
+        self.checked = []
+
+    def check_number_status(self, number):
+        self.checked.append(number)
+        return {"status": "success", "response": {"numberExists": int(number[-1]) % 2 == 0}}
+
+
+def test_normalize_number():
+    assert normalize_number("+55 (11) 99999-9999") == "5511999999999"
+    assert normalize_number("0055 11 99999-9999") == "5511999999999"
+    assert normalize_number("(11) 99999-9999", "55") == "5511999999999"
+    assert normalize_number("011 99999-9999", "55") == "5511999999999"
+    assert normalize_number("5511999999999", "55") == "5511999999999"
+    assert normalize_number("123") is None
+
+
+def test_national_number_starting_with_country_code():
+    # area code 55 in Brazil: the number is national, not international
+    assert normalize_number("(55) 99999-9999", "55") == "5555999999999"
+    assert normalize_number("(55) 3333-4444", "55") == "555533334444"
+    assert normalize_number("55 55 99999-9999", "55") == "5555999999999"
+    assert normalize_number("+55 99999-9999", "55") == "55999999999"
+
+
+def test_store_keeps_leading_zeros(tmp_path):
+    with VerificationStore(str(tmp_path / "numbers.db")) as store:
+        store.save([VerificationResult("0123456789", True, False, None, None), VerificationResult("123456789", False, False, None, None)])
+        assert store.get("0123456789", 3600, 3600) is True
+        assert store.get("123456789", 3600, 3600) is False
+        assert store.count() == 2
+
+
+def test_store_negative_ttl(tmp_path):
+    with VerificationStore(str(tmp_path / "numbers.db")) as store:
+        store.save([VerificationResult("5511999999999", False, False, None, None)])
+        assert store.get("5511999999999", 3600, 3600) is False
+        assert store.get("5511999999999", 3600, -1) is None
+
+
+def test_verifier_resumes_from_store(tmp_path):
+    client = FakeClient()
+    numbers = ["5511999999990", "5511999999991", "+55 11 99999-9990", "bad", "05511999999992"]
+    with VerificationStore(str(tmp_path / "numbers.db")) as store:
+        verifier = NumberVerifier(client, store, concurrency=2)
+        results = {result.number: result.exists for result in verifier.verify(numbers)}
+        assert results == {"5511999999990": True, "5511999999991": False, "05511999999992": True}
+        assert verifier.stats()["duplicates"] == 1
+        assert verifier.stats()["invalid"] == 1
+
+        again = NumberVerifier(client, store)
+        assert all(result.cached for result in again.verify(numbers))
+        assert len(client.checked) == 3
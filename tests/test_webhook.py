@@ -0,0 +1,139 @@
+import asyncio
+import json
+
+import pytest
+
+from ..webhook import WebhookServer
+from .helpers import until
+
+
+async def request(port, data):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(data)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    return response
+
+
+def post(body, headers=b""):
+    return b"POST / HTTP/1.1\r\nHost: x\r\nConnection: close\r\n" + headers + b"\r\n" + body
+
+
+def run(scenario):
+    async def main():
+        server = WebhookServer(host="127.0.0.1", port=0, workers=1)
+        events = []
+        server.add_handler(events.append)
+        async with server:
+            result = await scenario(server.port)
+        return result, events, server.stats()
+    return asyncio.run(main())
+
+
+def test_event_is_dispatched():
+    body = json.dumps({"event": "onmessage", "session": "bot", "body": "Hi"}).encode()
+
+    async def scenario(port):
+        return await request(port, post(body, b"Content-Length: %d\r\n" % len(body)))
+
+    response, events, stats = run(scenario)
+    assert response.startswith(b"HTTP/1.1 200")
+    assert [(event.event, event.session, event["body"]) for event in events] == [("onmessage", "bot", "Hi")]
+    assert stats["dispatched"] == 1
+
+
+def test_chunked_body():
+    body = json.dumps({"event": "onack", "session": "bot"}).encode()
+    chunked = b"%x\r\n%s\r\n0\r\n\r\n" % (len(body), body)
+
+    async def scenario(port):
+        return await request(port, post(chunked, b"Transfer-Encoding: chunked\r\n"))
+
+    response, events, _ = run(scenario)
+    assert response.startswith(b"HTTP/1.1 200")
+    assert events[0].event == "onack"
+
+
+def test_malformed_content_length():
+    async def scenario(port):
+        return [
+            await request(port, post(b"{}", b"Content-Length: abc\r\n")),
+            await request(port, post(b"{}", b"Content-Length: -2\r\n")),
+        ]
+
+    responses, events, _ = run(scenario)
+    assert all(response.startswith(b"HTTP/1.1 400") for response in responses)
+    assert events == []
+
+
+def test_malformed_chunk_size():
+    async def scenario(port):
+        return await request(port, post(b"zz\r\n{}\r\n0\r\n\r\n", b"Transfer-Encoding: chunked\r\n"))
+
+    response, events, _ = run(scenario)
+    assert response.startswith(b"HTTP/1.1 400")
+
+
+def test_body_too_large():
+    async def scenario(port):
+        return await request(port, post(b"", b"Content-Length: %d\r\n" % (1 << 40)))
+
+    response, _, _ = run(scenario)
+    assert response.startswith(b"HTTP/1.1 413")
+
+
+def test_invalid_json():
+    async def scenario(port):
+        return await request(port, post(b"not json", b"Content-Length: 8\r\n"))
+
+    response, _, stats = run(scenario)
+    assert response.startswith(b"HTTP/1.1 400")
+    assert stats["errors"] == 1
+
+
+@pytest.mark.parametrize("event, session, expected", [
+    ("onmessage", "bot", ["onmessage bot", "onmessage", "* bot", "*"]),
+    ("onmessage", "other", ["onmessage", "*"]),
+    ("onack", "bot", ["* bot", "*"]),
+    ("onack", None, ["*"]),
+    ("onmessage", None, ["onmessage", "*"]),
+])
+def test_handlers_for(event, session, expected):
+    server = WebhookServer()
+    for name, key in (("*", ("*", None)), ("* bot", ("*", "bot")), ("onmessage", ("onmessage", None)), ("onmessage bot", ("onmessage", "bot"))):
+        server.add_handler(lambda event, name=name: name, *key)
+    # the most specific first, each handler once
+    assert [handler(None) for handler, _ in server.handlers_for(event, session)] == expected
+
+
+def test_full_queue_stops_reading_the_requests():
+    body = json.dumps({"event": "onmessage", "session": "bot"}).encode()
+    one = post(body, b"Content-Length: %d\r\n" % len(body)).replace(b"Connection: close", b"Connection: keep-alive")
+
+    async def main():
+        server = WebhookServer(host="127.0.0.1", port=0, workers=1, queue_size=2)
+        release = asyncio.Event()
+        handled = []
+
+        async def slow(event):
+            await release.wait()
+            handled.append(event)
+
+        server.add_handler(slow)
+        async with server:
+            reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+            writer.write(one * 5)
+            await writer.drain()
+            # one event held by the worker, two queued: the fourth request waits for a slot
+            await until(lambda: server.stats()["received"] == 4)
+            await asyncio.sleep(0.05)
+            assert server.stats()["received"] == 4 and server.stats()["queued"] == 2
+            release.set()
+            await until(lambda: len(handled) == 5)
+            responses = await reader.readexactly(len(b"HTTP/1.1 200 OK\r\nContent-Length: 0\r\n\r\n") * 5)
+            writer.close()
+        return responses
+
+    responses = asyncio.run(main())
+    assert responses.count(b"HTTP/1.1 200 OK") == 5
@@ -0,0 +1,211 @@
+# Description: Session tokens persisted in SQLite and shared by processes, refreshed once when they expire.
+
+import asyncio
+import sqlite3
+from os import getpid
+from threading import Lock, get_ident
+from time import sleep, time
+from uuid import uuid4
+from .utils import is_success
+
+
+class TokenStore:
+
+
+    def __init__(self, path, lease=30.0, poll=0.05):
+        """
+        Bearer tokens of the sessions, in a SQLite (WAL) file shared by every process of the host.
+
+        Clients given the store load the token of their session on their first request,
+        generating it only if no process did before. When a request is answered HTTP 401 the
+        token is refreshed once and the request replayed. A refresh takes a lease on the session
+        (in a BEGIN IMMEDIATE transaction), so when N processes or threads see the same expired
+        token only one of them calls generate-token; the others wait for its result.
+
+        :Args:
+            - path (str) - SQLite database file.
+            - lease (float) - Seconds a refresh may take before another process may start its own.
+            - poll (float) - Seconds between two checks while waiting for another refresh.
+        """
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30.0)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS tokens (api_url TEXT, session TEXT, token TEXT, updated_at REAL, "
+            "lease_owner TEXT, lease_until REAL, PRIMARY KEY (api_url, session))"
+        )
+        self.lock = Lock()
+        self.lease = lease
+        self.poll = poll
+        self.tokens = {}
+        self.generated = 0
+
+
+    def close(self):
+        self.db.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+    @staticmethod
+    def key(client):
+        return client.api["URL"], client.session
+
+
+    def get(self, api_url, session):
+        """
+        :Returns:
+            - The stored token of a session, or None.
+        """
+        token = self.tokens.get((api_url, session))
+        if token is not None:
+            return token
+        with self.lock:
+            row = self.db.execute("SELECT token FROM tokens WHERE api_url = ? AND session = ?", (api_url, session)).fetchone()
+        if row is not None and row[0]:
+            self.tokens[(api_url, session)] = row[0]
+            return row[0]
+        return None
+
+
+    def set(self, api_url, session, token):
+        with self.lock:
+            self.db.execute(
+                "INSERT INTO tokens (api_url, session, token, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (api_url, session) DO UPDATE SET token = excluded.token, updated_at = excluded.updated_at",
+                (api_url, session, token, time()),
+            )
+        self.tokens[(api_url, session)] = token
+
+
+    def forget(self, api_url, session):
+        with self.lock:
+            self.db.execute("DELETE FROM tokens WHERE api_url = ? AND session = ?", (api_url, session))
+        self.tokens.pop((api_url, session), None)
+
+
+    def token(self, client):
+        """
+        :Returns:
+            - The token of the client's session: from memory, else from the store, else generated.
+        """
+        return self.get(*self.key(client)) or self.refresh(client, None)
+
+
+    def refresh(self, client, stale):
+        """
+        Replace the token ``stale`` of the client's session, unless another thread or process
+        already did, and return the current one (None if it could not be generated).
+        """
+        owner = "%d-%d-%s" % (getpid(), get_ident(), uuid4().hex)
+        while True:
+            state, value = self.__claim(client, stale, owner)
+            if state != "wait":
+                break
+            sleep(self.poll)
+        if state == "token":
+            return value
+        try:
+            response = client.generate_token()
+        except BaseException:
+            self.__release(client, owner)
+            raise
+        return self.__finish(client, owner, response)
+
+
+    async def atoken(self, client):
+        """
+        asyncio version of ``token`` for AsyncClient. The store is read in a thread,
+        off the event loop.
+        """
+        key = self.key(client)
+        return self.tokens.get(key) or await asyncio.to_thread(self.get, *key) or await self.arefresh(client, None)
+
+
+    async def arefresh(self, client, stale):
+        """
+        asyncio version of ``refresh`` for AsyncClient. The SQLite calls, which can wait
+        on the lock of another process, run in a thread, off the event loop.
+        """
+        owner = "%d-%d-%s" % (getpid(), get_ident(), uuid4().hex)
+        while True:
+            state, value = await asyncio.to_thread(self.__claim, client, stale, owner)
+            if state != "wait":
+                break
+            await asyncio.sleep(self.poll)
+        if state == "token":
+            return value
+        try:
+            response = await client.generate_token()
+        except BaseException:
+            await asyncio.to_thread(self.__release, client, owner)
+            raise
+        return await asyncio.to_thread(self.__finish, client, owner, response)
+
+
+    def __claim(self, client, stale, owner):
+        """
+        :Returns:
+            - ("token", token) if the session has a token other than ``stale``,
+              ("wait", None) if another refresh holds the lease, else ("lease", None).
+        """
+        api_url, session = self.key(client)
+        now = time()
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.db.execute("SELECT token, lease_owner, lease_until FROM tokens WHERE api_url = ? AND session = ?", (api_url, session)).fetchone()
+                if row is not None and row[0] and row[0] != stale:
+                    result = ("token", row[0])
+                elif row is not None and row[1] and row[2] > now:
+                    result = ("wait", None)
+                else:
+                    self.db.execute(
+                        "INSERT INTO tokens (api_url, session, token, lease_owner, lease_until) VALUES (?, ?, NULL, ?, ?) "
+                        "ON CONFLICT (api_url, session) DO UPDATE SET lease_owner = excluded.lease_owner, lease_until = excluded.lease_until",
+                        (api_url, session, owner, now + self.lease),
+                    )
+                    result = ("lease", None)
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+        if result[0] == "token":
+            self.tokens[(api_url, session)] = result[1]
+        return result
+
+
+    def __finish(self, client, owner, response):
+        """
+        Store the token of a generate-token response and end the lease.
+
+        :Returns:
+            - The new token, or None if the response has none.
+        """
+        if not (is_success(response) and isinstance(response, dict) and response.get("token")):
+            self.__release(client, owner)
+            return None
+        token = response["token"]
+        api_url, session = self.key(client)
+        with self.lock:
+            self.generated += 1
+            self.db.execute(
+                "UPDATE tokens SET token = ?, updated_at = ?, lease_owner = NULL, lease_until = NULL WHERE api_url = ? AND session = ?",
+                (token, time(), api_url, session),
+            )
+        self.tokens[(api_url, session)] = token
+        return token
+
+
+    def __release(self, client, owner):
+        with self.lock:
+            self.db.execute(
+                "UPDATE tokens SET lease_owner = NULL, lease_until = NULL WHERE api_url = ? AND session = ? AND lease_owner = ?",
+                self.key(client) + (owner,),
+            )
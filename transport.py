@@ -0,0 +1,245 @@
+# Description: HTTP transports used by the WPPConnect Client. A transport owns a
+#              keep-alive connection pool and is shared by every request a Client makes.
+
+from contextlib import contextmanager, asynccontextmanager
+
+try:
+    from requests import Session, ConnectTimeout, Timeout, ConnectionError as RequestsConnectionError
+    from requests.adapters import HTTPAdapter
+    from urllib3.exceptions import NewConnectionError
+    from urllib3.util.retry import Retry
+except ImportError:  # pragma: no cover
+    Session = None
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover
+    httpx = None
+
+
+DEFAULT_TIMEOUT = (10, 120)
+DEFAULT_POOL_SIZE = 10
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+
+# Errors of the transports meaning the request may succeed if tried again (connection, timeout, protocol).
+# Not OSError: a local file that cannot be read (e.g. a missing upload) fails the same way every time.
+TRANSIENT_ERRORS = (ConnectionError, TimeoutError)
+# Errors raised before the request reached the server, so even a send can be replayed.
+CONNECT_ERRORS = (ConnectionRefusedError,)
+if Session is not None:
+    TRANSIENT_ERRORS += (RequestsConnectionError, Timeout)
+    CONNECT_ERRORS += (ConnectTimeout,)
+if httpx is not None:
+    TRANSIENT_ERRORS += (httpx.TransportError,)
+    CONNECT_ERRORS += (httpx.ConnectError, httpx.ConnectTimeout)
+
+
+def is_transient_error(error):
+    return isinstance(error, TRANSIENT_ERRORS)
+
+
+def is_connect_error(error):
+    """
+    :Returns:
+        - True if the request failed while connecting, before any byte of it was sent.
+    """
+    if isinstance(error, CONNECT_ERRORS):
+        return True
+    if Session is not None and isinstance(error, RequestsConnectionError):
+        # requests wraps the urllib3 error: ConnectionError(MaxRetryError(reason=NewConnectionError))
+        reason = error.args[0] if error.args else None
+        reason = getattr(reason, "reason", reason)
+        return isinstance(reason, NewConnectionError)
+    return False
+
+
+class Transport:
+    """
+    Base class of the HTTP transports.
+
+    ``request`` must return an object exposing ``status_code`` and ``content`` (bytes),
+    like the responses of requests and httpx. ``stream`` is a context manager that
+    yields ``(status_code, chunks)`` where chunks iterates over the body as it arrives.
+    """
+
+
+    def request(self, method, url, headers=None, data=None, timeout=None):
+        raise NotImplementedError
+
+
+    def stream(self, method, url, headers=None, data=None, timeout=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        raise NotImplementedError
+
+
+    def close(self):
+        pass
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class RequestsTransport(Transport):
+
+
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, pool_connections=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT, retries=0):
+        """
+        Transport backed by a requests Session with a keep-alive connection pool.
+
+        :Args:
+            - pool_size (int) - Maximum number of connections kept alive per host.
+            - pool_connections (int) - Number of hosts to keep pools for.
+            - timeout (float|tuple) - Default (connect, read) timeout in seconds.
+            - retries (int) - Retries on connection errors (requests are never replayed after being sent).
+        """
+        if Session is None:
+            raise ImportError("RequestsTransport requires the 'requests' package")
+
+        self.timeout = timeout
+        self.session = Session()
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_size,
+            max_retries=Retry(total=retries, connect=retries, read=0, redirect=0, status=0),
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+
+    def request(self, method, url, headers=None, data=None, timeout=None):
+        return self.session.request(method, url, headers=headers, data=data, timeout=timeout or self.timeout)
+
+
+    @contextmanager
+    def stream(self, method, url, headers=None, data=None, timeout=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        resp = self.session.request(method, url, headers=headers, data=data, timeout=timeout or self.timeout, stream=True)
+        try:
+            yield resp.status_code, resp.iter_content(chunk_size)
+        finally:
+            resp.close()
+
+
+    def close(self):
+        self.session.close()
+
+
+class HttpxTransport(Transport):
+
+
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT, http2=True, retries=0):
+        """
+        Transport backed by an httpx Client, with optional HTTP/2.
+
+        :Args:
+            - pool_size (int) - Maximum number of connections kept alive per host.
+            - timeout (float|tuple) - Default (connect, read) timeout in seconds.
+            - http2 (bool) - Negotiate HTTP/2 when the server supports it (requires the 'h2' package).
+            - retries (int) - Retries on connection errors.
+        """
+        if httpx is None:
+            raise ImportError("HttpxTransport requires the 'httpx' package")
+
+        self.timeout = timeout
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=pool_size)
+        self.client = httpx.Client(
+            timeout=httpx_timeout(timeout),
+            transport=httpx.HTTPTransport(http2=http2, limits=limits, retries=retries),
+        )
+
+
+    def request(self, method, url, headers=None, data=None, timeout=None):
+        if timeout is None:
+            return self.client.request(method, url, headers=headers, content=data)
+        return self.client.request(method, url, headers=headers, content=data, timeout=httpx_timeout(timeout))
+
+
+    @contextmanager
+    def stream(self, method, url, headers=None, data=None, timeout=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        options = {} if timeout is None else {"timeout": httpx_timeout(timeout)}
+        with self.client.stream(method, url, headers=headers, content=data, **options) as resp:
+            yield resp.status_code, resp.iter_bytes(chunk_size)
+
+
+    def close(self):
+        self.client.close()
+
+
+def httpx_timeout(timeout):
+    """
+    Converts a requests style timeout (a number or a (connect, read) tuple) to httpx.Timeout.
+    """
+    if isinstance(timeout, tuple):
+        connect, read = timeout
+        return httpx.Timeout(read, connect=connect)
+    return httpx.Timeout(timeout)
+
+
+def default_transport(pool_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT, http2=False, retries=0):
+    """
+    Returns the transport used when a Client is created without one.
+
+    HTTP/2 is served by httpx, everything else by requests.
+    """
+    if http2:
+        return HttpxTransport(pool_size=pool_size, timeout=timeout, http2=True, retries=retries)
+    return RequestsTransport(pool_size=pool_size, timeout=timeout, retries=retries)
+
+
+class AsyncHttpxTransport(Transport):
+
+
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT, http2=False, retries=0, max_connections=None):
+        """
+        Asyncio transport backed by an httpx AsyncClient. One instance can be shared by
+        any number of AsyncClient sessions, so they all run on the same connection pool.
+
+        :Args:
+            - pool_size (int) - Maximum number of connections kept alive per host.
+            - timeout (float|tuple) - Default (connect, read) timeout in seconds.
+            - http2 (bool) - Negotiate HTTP/2 when the server supports it (requires the 'h2' package).
+            - retries (int) - Retries on connection errors.
+            - max_connections (int) - Upper bound of concurrent connections, None for no limit.
+        """
+        if httpx is None:
+            raise ImportError("AsyncHttpxTransport requires the 'httpx' package")
+
+        self.timeout = timeout
+        limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=pool_size)
+        self.client = httpx.AsyncClient(
+            timeout=httpx_timeout(timeout),
+            transport=httpx.AsyncHTTPTransport(http2=http2, limits=limits, retries=retries),
+        )
+
+
+    async def request(self, method, url, headers=None, data=None, timeout=None):
+        if timeout is None:
+            return await self.client.request(method, url, headers=headers, content=data)
+        return await self.client.request(method, url, headers=headers, content=data, timeout=httpx_timeout(timeout))
+
+
+    @asynccontextmanager
+    async def stream(self, method, url, headers=None, data=None, timeout=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        options = {} if timeout is None else {"timeout": httpx_timeout(timeout)}
+        async with self.client.stream(method, url, headers=headers, content=data, **options) as resp:
+            yield resp.status_code, resp.aiter_bytes(chunk_size)
+
+
+    async def close(self):
+        await self.client.aclose()
+
+
+    async def __aenter__(self):
+        return self
+
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+
+    def __enter__(self):
+        raise TypeError("Use 'async with' with AsyncHttpxTransport")
@@ -0,0 +1,21 @@
+# Description: Helpers to read the responses of WPPConnect server.
+
+
+def serialized_id(value):
+    """
+    Returns the serialized form of a WhatsApp id, given as a string or as {"_serialized": ...}.
+    """
+    if isinstance(value, dict):
+        return value.get("_serialized") or "%s@%s" % (value.get("user"), value.get("server"))
+    return value
+
+
+def is_success(response):
+    """
+    Returns True if a WPPConnect response does not report an error.
+    """
+    if response is False or response is None:
+        return False
+    if isinstance(response, dict):
+        return response.get("status") not in ("error", "Error", False)
+    return True
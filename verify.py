@@ -0,0 +1,285 @@
+# Description: Bulk phone number verification on top of check_number_status, with a persistent result store.
+
+import csv
+import sqlite3
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from json import dumps as json_dumps
+from threading import Lock
+from time import time, monotonic
+from .bulk import session_bucket
+from .utils import is_success
+
+
+VerificationResult = namedtuple("VerificationResult", ["number", "exists", "cached", "response", "error"])
+
+
+# Lengths of the national numbers (without trunk prefix) of countries where they are fixed, telling
+# a national number that starts with the digits of the country code from an international one.
+NATIONAL_LENGTHS = {
+    "1": (10,),
+    "27": (9,),
+    "33": (9,),
+    "34": (9,),
+    "44": (10,),
+    "52": (10,),
+    "54": (10,),
+    "55": (10, 11),
+    "56": (9,),
+    "57": (10,),
+    "58": (10,),
+    "91": (10,),
+    "234": (10,),
+    "351": (9,),
+}
+
+
+def normalize_number(number, default_country=None):
+    """
+    Normalizes a phone number to its international digits, e.g. "+55 (11) 99999-9999" -> "5511999999999".
+
+    Numbers of another country than ``default_country`` need their "+" or "00" prefix. A number
+    without it that starts with the country code is taken as international, unless the country
+    is in NATIONAL_LENGTHS and the number has the length of a national one: with "55", the
+    Brazilian number "55 99999-9999" of area code 55 gives "555599999999". For the other
+    countries such a national number is taken as international.
+
+    :Args:
+        - number (str|int) - Phone number in any common format.
+        - default_country (str) - Country code prepended to numbers without one. Example: "55"
+
+    :Returns:
+        - The digits of the number, or None if it cannot be a valid number.
+    """
+    raw = str(number).strip()
+    digits = "".join(char for char in raw if char.isdigit())
+    if raw.startswith("00"):
+        digits = digits[2:]
+    elif default_country and not raw.startswith("+"):
+        national = digits.lstrip("0")
+        if len(national) in NATIONAL_LENGTHS.get(default_country, ()) or not digits.startswith(default_country):
+            digits = default_country + national
+    if not 8 <= len(digits) <= 15:
+        return None
+    return digits
+
+
+def read_numbers(path, column=0, skip_header=False):
+    """
+    Yields the numbers of a column of a CSV file, without loading the file in memory.
+
+    :Args:
+        - path (str) - CSV file.
+        - column (int|str) - Column index, or column name (the first row is then the header).
+        - skip_header (bool) - Skip the first row when column is an index.
+    """
+    with open(path, newline="") as f:
+        if isinstance(column, str):
+            for row in csv.DictReader(f):
+                yield row[column]
+        else:
+            rows = csv.reader(f)
+            if skip_header:
+                next(rows, None)
+            for row in rows:
+                if len(row) > column:
+                    yield row[column]
+
+
+class VerificationStore:
+
+
+    def __init__(self, path):
+        """
+        SQLite (WAL) store of the verification results, negative ones included.
+
+        :Args:
+            - path (str) - SQLite database file.
+        """
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS numbers (number TEXT PRIMARY KEY, registered INTEGER, checked_at REAL, response TEXT)")
+        self.lock = Lock()
+
+
+    def close(self):
+        self.db.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+    def get(self, number, ttl, negative_ttl):
+        """
+        :Returns:
+            - True/False if the number was checked within its TTL, else None.
+        """
+        with self.lock:
+            row = self.db.execute("SELECT registered, checked_at FROM numbers WHERE number = ?", (str(number),)).fetchone()
+        if row is None:
+            return None
+        exists, checked_at = bool(row[0]), row[1]
+        if checked_at + (ttl if exists else negative_ttl) < time():
+            return None
+        return exists
+
+
+    def save(self, results):
+        """
+        Store a batch of VerificationResult in one transaction.
+        """
+        rows = [(str(result.number), int(result.exists), time(), json_dumps(result.response)) for result in results]
+        with self.lock:
+            self.db.execute("BEGIN")
+            try:
+                self.db.executemany("INSERT OR REPLACE INTO numbers VALUES (?, ?, ?, ?)", rows)
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+
+
+    def count(self, exists=None):
+        with self.lock:
+            if exists is None:
+                return self.db.execute("SELECT COUNT(*) FROM numbers").fetchone()[0]
+            return self.db.execute("SELECT COUNT(*) FROM numbers WHERE registered = ?", (int(exists),)).fetchone()[0]
+
+
+def number_exists(response):
+    """
+    Reads the result of check_number_status.
+
+    :Returns:
+        - True/False, or None if the response is an error.
+    """
+    if not is_success(response) or not isinstance(response, dict):
+        return None
+    status = response.get("response")
+    if not isinstance(status, dict):
+        return None
+    if "numberExists" in status:
+        return bool(status["numberExists"])
+    return bool(status.get("canReceiveMessage"))
+
+
+class NumberVerifier:
+
+
+    def __init__(self, client, store: VerificationStore, concurrency=8, rate=None, ttl=30 * 86400, negative_ttl=7 * 86400, default_country=None, batch_size=100):
+        """
+        Verifies streams of phone numbers with check_number_status.
+
+        Numbers are normalized and deduplicated; numbers with a result younger than their
+        TTL are answered from the store without a request. Results, negative ones included,
+        are persisted in batches as they arrive, so an interrupted run resumes where it stopped.
+
+        :Args:
+            - client (Client) - Client of the session.
+            - store (VerificationStore) - Result store.
+            - concurrency (int) - Checks in flight.
+            - rate (float) - Maximum checks per second of the session, None for no limit.
+            - ttl (float) - Seconds a positive result stays valid.
+            - negative_ttl (float) - Seconds a negative result stays valid.
+            - default_country (str) - Country code prepended to numbers without one.
+            - batch_size (int) - Results written per transaction.
+        """
+        self.client = client
+        self.store = store
+        self.concurrency = concurrency
+        self.bucket = session_bucket(client, rate) if rate else None
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.default_country = default_country
+        self.batch_size = batch_size
+        self.counters = {"checked": 0, "cached": 0, "invalid": 0, "duplicates": 0, "errors": 0}
+        self.started = None
+
+
+    def verify(self, numbers):
+        """
+        Verify numbers, yielding a VerificationResult(number, exists, cached, response, error)
+        for every valid, unique number as soon as it is known. Invalid and duplicate
+        numbers are only counted.
+
+        :Args:
+            - numbers (iterable) - Numbers, e.g. a list, a generator or read_numbers("numbers.csv").
+        """
+        self.started = monotonic()
+        seen = set()
+        pending = set()
+        batch = []
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            try:
+                for number in numbers:
+                    number = normalize_number(number, self.default_country)
+                    if number is None:
+                        self.counters["invalid"] += 1
+                        continue
+                    if number in seen:
+                        self.counters["duplicates"] += 1
+                        continue
+                    seen.add(number)
+
+                    exists = self.store.get(number, self.ttl, self.negative_ttl)
+                    if exists is not None:
+                        self.counters["cached"] += 1
+                        yield VerificationResult(number, exists, True, None, None)
+                        continue
+
+                    if self.bucket:
+                        self.bucket.acquire()
+                    pending.add(executor.submit(self.__check, number))
+                    if len(pending) >= self.concurrency:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        yield from self.__collect(done, batch)
+
+                yield from self.__collect(wait(pending)[0], batch)
+            finally:
+                if batch:
+                    self.store.save(batch)
+
+
+    def stats(self):
+        """
+        :Returns:
+            - dict with the counters of the current run and its throughput in numbers/sec.
+        """
+        stats = dict(self.counters)
+        elapsed = monotonic() - self.started if self.started else 0.0
+        processed = stats["checked"] + stats["cached"] + stats["errors"]
+        stats["elapsed"] = elapsed
+        stats["rate"] = processed / elapsed if elapsed else 0.0
+        return stats
+
+
+    def __check(self, number):
+        try:
+            response = self.client.check_number_status(number)
+        except Exception as e:
+            return VerificationResult(number, None, False, None, e)
+        exists = number_exists(response)
+        if exists is None:
+            return VerificationResult(number, None, False, response, response)
+        return VerificationResult(number, exists, False, response, None)
+
+
+    def __collect(self, done, batch):
+        for future in done:
+            result = future.result()
+            if result.error is not None:
+                self.counters["errors"] += 1
+            else:
+                self.counters["checked"] += 1
+                batch.append(result)
+                if len(batch) >= self.batch_size:
+                    self.store.save(batch)
+                    batch.clear()
+            yield result
@@ -0,0 +1,297 @@
+# Description: asyncio server receiving the webhook events of WPPConnect server.
+
+import asyncio
+import logging
+from .codec import default_codec
+
+
+logger = logging.getLogger(__name__)
+
+
+MAX_BODY_SIZE = 64 * 1024 * 1024
+
+RESPONSES = {
+    200: b"HTTP/1.1 200 OK\r\nContent-Length: 0\r\n\r\n",
+    400: b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\nConnection: close\r\n\r\n",
+    404: b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\n\r\n",
+    405: b"HTTP/1.1 405 Method Not Allowed\r\nContent-Length: 0\r\n\r\n",
+    413: b"HTTP/1.1 413 Payload Too Large\r\nContent-Length: 0\r\nConnection: close\r\n\r\n",
+}
+
+
+class WebhookEvent:
+    """
+    An event posted by WPPConnect server. ``data`` is the whole decoded body.
+    """
+
+    __slots__ = ("event", "session", "data")
+
+
+    def __init__(self, event, session, data):
+        self.event = event
+        self.session = session
+        self.data = data
+
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+
+    def __repr__(self):
+        return "WebhookEvent(event=%r, session=%r)" % (self.event, self.session)
+
+
+class WebhookServer:
+
+
+    def __init__(self, host="0.0.0.0", port=8000, path="/", codec=None, queue_size=10000, workers=4, max_body_size=MAX_BODY_SIZE):
+        """
+        Receives the events that WPPConnect server POSTs to the webhook of the sessions
+        (see Client.start_session(webhook=...)) and dispatches them to handlers.
+
+        Events go through a bounded queue: when the handlers fall behind and the queue
+        is full, the server stops reading from the connections, which slows the sender
+        down instead of buffering without limit.
+
+        :Args:
+            - host (str) - Address to listen on.
+            - port (int) - Port to listen on.
+            - path (str) - Only POSTs whose path starts with it are accepted.
+            - codec (JSONCodec) - JSON codec of the bodies. Defaults to the fastest one installed.
+            - queue_size (int) - Maximum number of events waiting for a handler.
+            - workers (int) - Number of tasks running the handlers.
+            - max_body_size (int) - Larger bodies are rejected with 413.
+        """
+        self.host = host
+        self.port = port
+        self.path = path.encode()
+        self.codec = codec or default_codec()
+        self.queue_size = queue_size
+        self.workers = workers
+        self.max_body_size = max_body_size
+        self.handlers = {}
+        self.server = None
+        self.queue = None
+        self.tasks = []
+        self.received = 0
+        self.dispatched = 0
+        self.errors = 0
+
+
+    def on(self, event="*", session=None):
+        """
+        Decorator registering a handler for an event type ("onmessage", "onack", ...)
+        and optionally a single session. "*" matches every event. Handlers receive a
+        WebhookEvent and can be functions or coroutine functions.
+
+        Example:
+            @server.on("onmessage")
+            async def message(event):
+                print(event.session, event["body"])
+        """
+        def decorator(handler):
+            self.add_handler(handler, event, session)
+            return handler
+        return decorator
+
+
+    def add_handler(self, handler, event="*", session=None):
+        self.handlers.setdefault((event, session), []).append((handler, asyncio.iscoroutinefunction(handler)))
+
+
+    def handlers_for(self, event, session):
+        """
+        :Returns:
+            - Handlers matching the event and session, the most specific first.
+        """
+        handlers = []
+        # dict.fromkeys drops the keys that repeat (session or event of None, event "*")
+        for key in dict.fromkeys(((event, session), (event, None), ("*", session), ("*", None))):
+            handlers.extend(self.handlers.get(key, ()))
+        return handlers
+
+
+    async def start(self):
+        self.queue = asyncio.Queue(self.queue_size)
+        self.tasks = [asyncio.ensure_future(self.__worker()) for _ in range(self.workers)]
+        self.server = await asyncio.start_server(self.__handle_connection, self.host, self.port, backlog=1024)
+        if not self.port:
+            self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+
+    async def stop(self):
+        """
+        Stop accepting events, wait for the queued ones to be handled and stop the workers.
+        """
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+        if self.queue is not None:
+            await self.queue.join()
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+
+    async def __aenter__(self):
+        return await self.start()
+
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+
+    async def serve_forever(self):
+        await self.start()
+        try:
+            await self.server.serve_forever()
+        finally:
+            await self.stop()
+
+
+    def run(self):
+        """
+        Blocking helper: runs the server in a new event loop until interrupted.
+        """
+        try:
+            asyncio.run(self.serve_forever())
+        except KeyboardInterrupt:
+            pass
+
+
+    def stats(self):
+        return {
+            "received": self.received,
+            "dispatched": self.dispatched,
+            "errors": self.errors,
+            "queued": self.queue.qsize() if self.queue is not None else 0,
+        }
+
+
+    async def __handle_connection(self, reader, writer):
+        try:
+            while True:
+                status, keep_alive = await self.__handle_request(reader)
+                if status is None:
+                    break
+                writer.write(RESPONSES[status])
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except asyncio.LimitOverrunError:
+            writer.write(RESPONSES[400])
+        finally:
+            writer.close()
+
+
+    async def __handle_request(self, reader):
+        """
+        Reads one HTTP/1.1 request and queues its event.
+
+        :Returns:
+            - (status, keep_alive), or (None, False) when the connection was closed.
+        """
+        head = await reader.readuntil(b"\r\n\r\n")
+        lines = head.split(b"\r\n")
+        try:
+            method, target, version = lines[0].split(b" ", 2)
+        except ValueError:
+            return 400, False
+
+        length = 0
+        chunked = False
+        keep_alive = version == b"HTTP/1.1"
+        for line in lines[1:]:
+            name, _, value = line.partition(b":")
+            name = name.strip().lower()
+            if name == b"content-length":
+                try:
+                    length = int(value)
+                except ValueError:
+                    return 400, False
+                if length < 0:
+                    return 400, False
+            elif name == b"transfer-encoding":
+                chunked = b"chunked" in value.lower()
+            elif name == b"connection":
+                value = value.strip().lower()
+                keep_alive = value == b"keep-alive" or (keep_alive and value != b"close")
+
+        if length > self.max_body_size:
+            return 413, False
+
+        if chunked:
+            try:
+                body = await self.__read_chunked(reader)
+            except ValueError:
+                # malformed chunk size
+                return 400, False
+            if body is None:
+                return 413, False
+        else:
+            body = await reader.readexactly(length) if length else b""
+
+        if method != b"POST":
+            return 405, keep_alive
+        if not target.startswith(self.path):
+            return 404, keep_alive
+
+        try:
+            data = self.codec.loads(body)
+        except Exception:
+            self.errors += 1
+            return 400, keep_alive
+        if not isinstance(data, dict):
+            self.errors += 1
+            return 400, keep_alive
+
+        self.received += 1
+        # backpressure: waits here while the queue is full, so no more requests are read
+        await self.queue.put(WebhookEvent(data.get("event"), data.get("session"), data))
+        return 200, keep_alive
+
+
+    async def __read_chunked(self, reader):
+        parts = []
+        size = 0
+        while True:
+            line = await reader.readuntil(b"\r\n")
+            chunk_size = int(line.split(b";", 1)[0], 16)
+            if chunk_size < 0:
+                raise ValueError("Negative chunk size")
+            if not chunk_size:
+                await reader.readuntil(b"\r\n")
+                return b"".join(parts)
+            size += chunk_size
+            if size > self.max_body_size:
+                return None
+            parts.append(await reader.readexactly(chunk_size))
+            await reader.readexactly(2)
+
+
+    async def __worker(self):
+        queue = self.queue
+        while True:
+            event = await queue.get()
+            try:
+                for handler, is_coroutine in self.handlers_for(event.event, event.session):
+                    try:
+                        if is_coroutine:
+                            await handler(event)
+                        else:
+                            handler(event)
+                    except Exception:
+                        self.errors += 1
+                        logger.exception("Webhook handler %r failed on %r", handler, event)
+                self.dispatched += 1
+            finally:
+                queue.task_done()